@@ -12,6 +12,8 @@ from django.utils.dateparse import parse_datetime
 from common.slugs import slugify_translit
 from django.views.decorators.http import require_http_methods
 
+from main.catalog_bounds import defer_catalog_bounds_refresh
+from main.catalog_cache import defer_catalog_version_bump
 from main.models import Category, Product
 from orders.models import Order
 
@@ -217,6 +219,9 @@ def upsert_single_product(payload):
     barcode = clean_identifier(payload.get('barcode'))
     if barcode is not None:
         product.barcode = barcode
+    authors = clean_identifier(payload.get('authors'))
+    if authors is not None:
+        product.authors = authors
     offer_id = clean_identifier(payload.get('offer_id'))
     if offer_id:
         product.offer_id = offer_id
@@ -281,21 +286,23 @@ def products_bulk_upsert(request):
         return error_response('validation_error', f'Batch size limit is {BATCH_LIMIT}')
     results = []
     errors = []
-    for index, item in enumerate(items):
-        try:
-            product, status = upsert_single_product(item)
-            results.append({
-                'sku': product.sku or item.get('sku'),
-                'shop_product_id': str(product.pk),
-                'status': status,
-            })
-        except Exception as exc:  # pylint: disable=broad-except
-            logger.exception('Product upsert failed: %s', exc)
-            errors.append({
-                'index': index,
-                'sku': item.get('sku'),
-                'message': str(exc),
-            })
+    # Версия каталога и границы фильтров пересчитываются один раз на пакет.
+    with defer_catalog_version_bump(), defer_catalog_bounds_refresh():
+        for index, item in enumerate(items):
+            try:
+                product, status = upsert_single_product(item)
+                results.append({
+                    'sku': product.sku or item.get('sku'),
+                    'shop_product_id': str(product.pk),
+                    'status': status,
+                })
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.exception('Product upsert failed: %s', exc)
+                errors.append({
+                    'index': index,
+                    'sku': item.get('sku'),
+                    'message': str(exc),
+                })
     return JsonResponse({'results': results, 'errors': errors})
 
 
@@ -314,28 +321,29 @@ def stocks_bulk_update(request):
         return error_response('validation_error', 'Field "items" must be a non-empty array')
     results = []
     errors = []
-    for index, item in enumerate(items):
-        if not isinstance(item, dict):
-            errors.append({'index': index, 'message': 'Each item must be an object'})
-            continue
-        sku = clean_identifier(item.get('sku'))
-        quantity = item.get('quantity')
-        if not sku:
-            errors.append({'index': index, 'message': 'Field sku is required'})
-            continue
-        try:
-            qty_value = int(quantity)
-        except (TypeError, ValueError):
-            errors.append({'index': index, 'sku': sku, 'message': 'Field quantity must be an integer'})
-            continue
-        product = Product.objects.filter(sku=sku).first()
-        if not product:
-            errors.append({'index': index, 'sku': sku, 'message': 'Product not found'})
-            continue
-        product.stock_qty = max(qty_value, 0)
-        product.in_stock = qty_value > 0
-        product.save(update_fields=['stock_qty', 'in_stock', 'updated_at'])
-        results.append({'sku': sku, 'quantity': product.stock_qty, 'status': 'updated'})
+    with defer_catalog_version_bump(), defer_catalog_bounds_refresh():
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors.append({'index': index, 'message': 'Each item must be an object'})
+                continue
+            sku = clean_identifier(item.get('sku'))
+            quantity = item.get('quantity')
+            if not sku:
+                errors.append({'index': index, 'message': 'Field sku is required'})
+                continue
+            try:
+                qty_value = int(quantity)
+            except (TypeError, ValueError):
+                errors.append({'index': index, 'sku': sku, 'message': 'Field quantity must be an integer'})
+                continue
+            product = Product.objects.filter(sku=sku).first()
+            if not product:
+                errors.append({'index': index, 'sku': sku, 'message': 'Product not found'})
+                continue
+            product.stock_qty = max(qty_value, 0)
+            product.in_stock = qty_value > 0
+            product.save(update_fields=['stock_qty', 'in_stock', 'updated_at'])
+            results.append({'sku': sku, 'quantity': product.stock_qty, 'status': 'updated'})
     return JsonResponse({'warehouse_code': warehouse_code, 'results': results, 'errors': errors})
 
 
@@ -45,6 +45,8 @@ CSRF_TRUSTED_ORIGINS = [
 
 SESSION_COOKIE_AGE = 86400 #30 дней
 SESSION_SAVE_EVERY_REQUEST = True
+# Движок сессий выбирается ниже, после CACHES.
+SESSION_REFRESH_INTERVAL = int(os.getenv('SESSION_REFRESH_INTERVAL', str(15 * 60)))
 # CSRF_COOKIE_SECURE = True
 # SESSION_COOKIE_SECURE = True
 # SECURE_BROWSER_XSS_FILTER = True
@@ -60,6 +62,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'ckeditor',
     'api',
     'main',
@@ -122,6 +125,38 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Версии каталога и фрагменты должны быть общими для web-процессов и
+# management-команд, поэтому в проде нужен разделяемый backend
+# (memcached/redis/database) через CACHE_BACKEND и CACHE_LOCATION.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Срок неизменённой сессии продлевается не чаще раза в
+# SESSION_REFRESH_INTERVAL секунд. Сессии читаются из кэша только при общем
+# backend: с кэшем в памяти процесса другие воркеры видели бы устаревшую
+# копию, поэтому тогда сессии хранятся только в БД.
+SESSION_ENGINE = (
+    'common.sessions.cached_db'
+    if CACHES['default']['BACKEND'] not in (
+        'django.core.cache.backends.locmem.LocMemCache',
+        'django.core.cache.backends.dummy.DummyCache',
+    )
+    else 'common.sessions.db'
+)
+
+CATALOG_FRAGMENT_CACHE_TIMEOUT = int(os.getenv('CATALOG_FRAGMENT_CACHE_TIMEOUT', '600'))
+CATEGORY_TREE_CACHE_TIMEOUT = int(os.getenv('CATEGORY_TREE_CACHE_TIMEOUT', '3600'))
+CART_SUMMARY_CACHE_TIMEOUT = int(os.getenv('CART_SUMMARY_CACHE_TIMEOUT', '300'))
+FAVORITES_CACHE_TIMEOUT = int(os.getenv('FAVORITES_CACHE_TIMEOUT', '3600'))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -184,6 +219,43 @@ DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY')
 DEEPSEEK_API_URL = os.getenv('DEEPSEEK_API_URL')
 DEEPSEEK_MODEL = os.getenv('DEEPSEEK_MODEL')
 DEEPSEEK_TIMEOUT = 30
+# Через сколько секунд сохранённая рецензия считается устаревшей (0 — никогда)
+# и как часто её можно перегенерировать по запросу посетителя.
+DEEPSEEK_REVIEW_TTL = int(os.getenv('DEEPSEEK_REVIEW_TTL', str(30 * 24 * 3600)))
+DEEPSEEK_REVIEW_REGENERATE_AFTER = int(os.getenv('DEEPSEEK_REVIEW_REGENERATE_AFTER', str(24 * 3600)))
+DEEPSEEK_PROMPT_CACHE_TIMEOUT = int(os.getenv('DEEPSEEK_PROMPT_CACHE_TIMEOUT', '300'))
+# Фоновая генерация рецензий (команда process_ai_reviews).
+DEEPSEEK_WORKER_CONCURRENCY = int(os.getenv('DEEPSEEK_WORKER_CONCURRENCY', '2'))
+DEEPSEEK_RATE_LIMIT_PER_MINUTE = int(os.getenv('DEEPSEEK_RATE_LIMIT_PER_MINUTE', '30'))
+DEEPSEEK_JOB_MAX_ATTEMPTS = int(os.getenv('DEEPSEEK_JOB_MAX_ATTEMPTS', '3'))
+DEEPSEEK_POLL_INTERVAL = int(os.getenv('DEEPSEEK_POLL_INTERVAL', '2'))
+# Воркер читает ответ DeepSeek потоком и публикует текст в задании, страница
+# показывает его через server-sent events. SSE держит соединение до конца
+# генерации, поэтому поток отдаётся только под ASGI (например,
+# gunicorn -k uvicorn.workers.UvicornWorker bookstore.asgi:application);
+# под WSGI страница опрашивает статус и видит тот же текст через HTMX.
+DEEPSEEK_STREAM_REVIEWS = os.getenv('DEEPSEEK_STREAM_REVIEWS', 'False') == 'True'
+# Цена за миллион токенов (USD) для оценки стоимости generate_ai_reviews.
+DEEPSEEK_INPUT_PRICE_PER_MILLION = float(os.getenv('DEEPSEEK_INPUT_PRICE_PER_MILLION', '0.27'))
+DEEPSEEK_OUTPUT_PRICE_PER_MILLION = float(os.getenv('DEEPSEEK_OUTPUT_PRICE_PER_MILLION', '1.10'))
+
+# Счётчик просмотров товаров: буфер в памяти сбрасывается не чаще раза
+# в PRODUCT_VIEWS_FLUSH_INTERVAL секунд или при PRODUCT_VIEWS_MAX_PENDING товарах.
+PRODUCT_VIEWS_FLUSH_INTERVAL = int(os.getenv('PRODUCT_VIEWS_FLUSH_INTERVAL', '5'))
+PRODUCT_VIEWS_MAX_PENDING = int(os.getenv('PRODUCT_VIEWS_MAX_PENDING', '500'))
+# Веса оценки популярности (команда refresh_popularity).
+POPULARITY_VIEW_WEIGHT = float(os.getenv('POPULARITY_VIEW_WEIGHT', '0.1'))
+POPULARITY_FAVORITE_WEIGHT = float(os.getenv('POPULARITY_FAVORITE_WEIGHT', '3'))
+POPULARITY_ORDER_WEIGHT = float(os.getenv('POPULARITY_ORDER_WEIGHT', '10'))
+POPULARITY_ORDER_DAYS = int(os.getenv('POPULARITY_ORDER_DAYS', '90'))
+
+# Запросы, для которых CartMiddleware не ищет корзину (request.cart — пустая).
+CART_EXCLUDED_PATHS = ('/api/', '/admin/', '/orders/youkassa/webhook/', '/static/', '/media/')
+CART_EXCLUDED_METHODS = ('HEAD', 'OPTIONS')
+CART_EXCLUDED_USER_AGENTS = os.getenv(
+    'CART_EXCLUDED_USER_AGENTS',
+    r'bot|crawl|spider|slurp|curl|wget|python-requests|httpx',
+)
 
 AUTH_USER_MODEL = 'users.CustomUser'
 
@@ -217,6 +289,10 @@ ERP_PRODUCTS_PAGE_SIZE = int(os.getenv('ERP_PRODUCTS_PAGE_SIZE', '1000'))
 ERP_DEFAULT_CURRENCY = os.getenv('ERP_DEFAULT_CURRENCY', 'RUB')
 ERP_DEFAULT_COUNTRY = os.getenv('ERP_DEFAULT_COUNTRY', 'Россия')
 ERP_INTEGRATION_ENABLED = os.getenv('ERP_INTEGRATION_ENABLED', os.getenv('INTERNET_SHOP_ENABLED', 'True')) == 'True'
+ERP_IMAGE_MIRROR_WORKERS = int(os.getenv('ERP_IMAGE_MIRROR_WORKERS', '8'))
+ERP_IMAGE_MIRROR_TIMEOUT = int(os.getenv('ERP_IMAGE_MIRROR_TIMEOUT', '15'))
+ERP_IMAGE_MIRROR_RECHECK_HOURS = int(os.getenv('ERP_IMAGE_MIRROR_RECHECK_HOURS', '24'))
+ERP_IMAGE_MIRROR_MAX_BYTES = int(os.getenv('ERP_IMAGE_MIRROR_MAX_BYTES', str(15 * 1024 * 1024)))
 
 # Mail logging
 LOGGING = {
@@ -1,13 +1,19 @@
 from django.utils.deprecation import MiddlewareMixin
-from .models import Cart
+from django.utils.functional import SimpleLazyObject
+
+from .services import EmptyCart, is_cart_excluded, load_cart
 
 
 class CartMiddleware(MiddlewareMixin):
-    def process_request(self, request):
-        if not request.session.session_key:
-            request.session.create()
+    """
+    request.cart — ленивая корзина: запрос в БД идёт при первом обращении,
+    а сессия и строка Cart создаются только при первой записи
+    (get_or_create_cart). Исключённым запросам достаётся EmptyCart.
+    """
 
-        request.cart, created = Cart.objects.get_or_create(
-            session_key=request.session.session_key
-        )
-        return None
\ No newline at end of file
+    def process_request(self, request):
+        if is_cart_excluded(request):
+            request.cart = EmptyCart()
+        else:
+            request.cart = SimpleLazyObject(lambda: load_cart(request))
+        return None
@@ -0,0 +1,153 @@
+import re
+from decimal import Decimal
+from typing import Any, Dict, Optional, Union
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Cart, CartItem
+
+CART_VERSION_KEY_PREFIX = 'cart:version'
+CART_SUMMARY_KEY_PREFIX = 'cart:summary'
+
+
+class EmptyCart:
+    """
+    Корзина посетителя, у которого её ещё нет в БД (по аналогии с
+    AnonymousUser). Чтение отвечает пустыми значениями без запросов,
+    строку Cart создаёт только get_or_create_cart при первой записи.
+    """
+
+    id = None
+    pk = None
+    session_key = None
+    total_items = 0
+    subtotal = 0
+
+    def __str__(self):
+        return 'Empty cart'
+
+    @property
+    def items(self):
+        return CartItem.objects.none()
+
+    def clear_cart_items(self):
+        pass
+
+
+def is_cart_excluded(request) -> bool:
+    """
+    Запросы, которым корзина не нужна: API, админка, вебхуки, HEAD и
+    обходы ботов. Списки задаются в CART_EXCLUDED_PATHS,
+    CART_EXCLUDED_METHODS и CART_EXCLUDED_USER_AGENTS.
+    """
+    if request.method in getattr(settings, 'CART_EXCLUDED_METHODS', ()):
+        return True
+    if request.path.startswith(tuple(getattr(settings, 'CART_EXCLUDED_PATHS', ()))):
+        return True
+    pattern = getattr(settings, 'CART_EXCLUDED_USER_AGENTS', '')
+    user_agent = request.META.get('HTTP_USER_AGENT', '')
+    return bool(pattern and user_agent and re.search(pattern, user_agent, re.IGNORECASE))
+
+
+def load_cart(request) -> Union[Cart, EmptyCart]:
+    """
+    Корзина текущей сессии без создания сессии и строки в БД.
+    """
+    session_key = request.session.session_key
+    if session_key:
+        cart = Cart.objects.filter(session_key=session_key).first()
+        if cart is not None:
+            return cart
+    return EmptyCart()
+
+
+def get_existing_cart(request) -> Optional[Cart]:
+    cart = getattr(request, 'cart', None)
+    if cart is None:
+        cart = load_cart(request)
+    return cart if cart.pk is not None else None
+
+
+def get_or_create_cart(request) -> Cart:
+    """
+    Корзина для записи: при необходимости создаёт сессию и строку Cart
+    и подменяет ею ленивую request.cart.
+    """
+    cart = get_existing_cart(request)
+    if cart is not None:
+        return cart
+    if not request.session.session_key:
+        request.session.create()
+    cart, _ = Cart.objects.get_or_create(session_key=request.session.session_key)
+    request.cart = cart
+    return cart
+
+
+def empty_cart_summary() -> Dict[str, Any]:
+    return {'items': {}, 'total_items': 0, 'subtotal': 0}
+
+
+def get_cart_version(cart_id: int) -> int:
+    return cache.get(f'{CART_VERSION_KEY_PREFIX}:{cart_id}', 1)
+
+
+def bump_cart_version(cart_id: int) -> None:
+    key = f'{CART_VERSION_KEY_PREFIX}:{cart_id}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 2, timeout=None)
+
+
+def invalidate_cart_summary(request, cart: Cart) -> None:
+    """
+    Сбрасывает сводку корзины. Версия поднимается после коммита: до него
+    другие запросы видят старые позиции при старой версии. Сам запрос до
+    конца считает сводку заново и в кэш её не кладёт.
+    """
+    cart_id = cart.pk
+    request._cart_summary = None
+    request._cart_changed = True
+    transaction.on_commit(lambda: bump_cart_version(cart_id))
+
+
+def collect_cart_summary(cart_id: int) -> Dict[str, Any]:
+    """
+    Позиции, количество и сумма корзины одним запросом с ценой товара.
+    """
+    summary = empty_cart_summary()
+    subtotal = Decimal('0')
+    rows = CartItem.objects.filter(cart_id=cart_id).values_list('id', 'product_id', 'quantity', 'product__price')
+    for item_id, product_id, quantity, price in rows:
+        summary['items'][product_id] = {'cart_item_id': item_id, 'quantity': quantity}
+        summary['total_items'] += quantity
+        subtotal += Decimal(str(price)) * quantity
+    if summary['items']:
+        summary['subtotal'] = subtotal
+    return summary
+
+
+def get_cart_summary(request) -> Dict[str, Any]:
+    """
+    Сводка корзины для шапки и карточек товаров. Кэшируется по версии
+    корзины (её поднимают изменяющие корзину представления) и живёт не
+    дольше CART_SUMMARY_CACHE_TIMEOUT, чтобы подхватить новые цены.
+    """
+    cached = getattr(request, '_cart_summary', None)
+    if cached is not None:
+        return cached
+    cart = get_existing_cart(request)
+    if cart is None:
+        summary = empty_cart_summary()
+    elif getattr(request, '_cart_changed', False):
+        summary = collect_cart_summary(cart.pk)
+    else:
+        key = f'{CART_SUMMARY_KEY_PREFIX}:{cart.pk}:v{get_cart_version(cart.pk)}'
+        summary = cache.get(key)
+        if summary is None:
+            summary = collect_cart_summary(cart.pk)
+            cache.set(key, summary, getattr(settings, 'CART_SUMMARY_CACHE_TIMEOUT', 300))
+    request._cart_summary = summary
+    return summary
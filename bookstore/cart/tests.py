@@ -1,3 +1,136 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from cart.context_processors import cart_processor
+from cart.models import Cart
+from cart.services import EmptyCart, get_cart_summary, is_cart_excluded
+from favorites.context_processors import favorites_processor
+from main.models import Category, Product
+
+
+class LazyCartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Книги')
+        self.product = Product.objects.create(
+            erp_product_id='lazy-cart-1',
+            name='Книга',
+            slug='lazy-cart-book',
+            price=Decimal('500'),
+            stock_qty=5,
+            in_stock=True,
+            category=self.category,
+            is_published=True,
+        )
+
+    def test_browsing_creates_neither_session_nor_cart(self):
+        response = self.client.get(reverse('cart:cart_count'))
+
+        self.assertEqual(response.json(), {'total_items': 0, 'subtotal': 0.0})
+        self.assertFalse(Cart.objects.exists())
+        self.assertFalse(Session.objects.exists())
+
+    def test_first_add_creates_cart(self):
+        response = self.client.post(
+            reverse('cart:add_to_cart', args=[self.product.slug]),
+            {'quantity': 2},
+        )
+
+        self.assertTrue(response.json()['success'])
+        cart = Cart.objects.get()
+        self.assertEqual(cart.session_key, self.client.session.session_key)
+        self.assertEqual(cart.items.get().quantity, 2)
+
+        response = self.client.get(reverse('cart:cart_count'))
+        self.assertEqual(response.json()['total_items'], 2)
+        self.assertEqual(Cart.objects.count(), 1)
+
+    def test_context_processors_skip_db_without_cart(self):
+        request = RequestFactory().get('/')
+        request.session = SessionStore()
+        request.user = AnonymousUser()
+        request.cart = EmptyCart()
+
+        with self.assertNumQueries(0):
+            cart_context = cart_processor(request)
+            favorites_context = favorites_processor(request)
+
+        self.assertEqual(cart_context['cart_total_items'], 0)
+        self.assertEqual(cart_context['cart_items_map'], {})
+        self.assertEqual(favorites_context['favorite_total_items'], 0)
+
+    @override_settings(
+        CART_EXCLUDED_PATHS=('/api/',),
+        CART_EXCLUDED_METHODS=('HEAD',),
+        CART_EXCLUDED_USER_AGENTS=r'bot|spider',
+    )
+    def test_excluded_requests(self):
+        factory = RequestFactory()
+
+        self.assertTrue(is_cart_excluded(factory.get('/api/v1/orders/')))
+        self.assertTrue(is_cart_excluded(factory.head('/')))
+        self.assertTrue(is_cart_excluded(factory.get('/', HTTP_USER_AGENT='Mozilla/5.0 (compatible; YandexBot/3.0)')))
+        self.assertFalse(is_cart_excluded(factory.get('/', HTTP_USER_AGENT='Mozilla/5.0 Firefox/130.0')))
+
+
+class CartSummaryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Книги')
+        self.products = [
+            Product.objects.create(
+                erp_product_id=f'summary-{index}',
+                name=f'Книга {index}',
+                slug=f'summary-book-{index}',
+                price=Decimal('300') * (index + 1),
+                stock_qty=10,
+                in_stock=True,
+                category=self.category,
+                is_published=True,
+            )
+            for index in range(3)
+        ]
+        self.cart = Cart.objects.create(session_key='summary-session')
+        for index, product in enumerate(self.products):
+            self.cart.items.create(product=product, quantity=index + 1)
+
+    def make_request(self):
+        request = RequestFactory().get('/')
+        request.session = SessionStore(session_key='summary-session')
+        request.cart = self.cart
+        return request
+
+    def test_summary_is_one_query_and_cached(self):
+        with self.assertNumQueries(1):
+            summary = get_cart_summary(self.make_request())
+
+        self.assertEqual(summary['total_items'], 6)
+        self.assertEqual(summary['subtotal'], Decimal('300') * 1 + Decimal('600') * 2 + Decimal('900') * 3)
+        item = self.cart.items.get(product=self.products[1])
+        self.assertEqual(summary['items'][self.products[1].pk], {'cart_item_id': item.pk, 'quantity': 2})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_cart_summary(self.make_request()), summary)
+
+    def test_cart_views_invalidate_summary(self):
+        session = self.client.session
+        session.save()
+        self.cart.session_key = session.session_key
+        self.cart.save()
+        url = reverse('cart:cart_count')
+        self.assertEqual(self.client.get(url).json()['total_items'], 6)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('cart:add_to_cart', args=[self.products[0].slug]), {'quantity': 2})
+        self.assertEqual(self.client.get(url).json()['total_items'], 8)
+
+        item = self.cart.items.get(product=self.products[2])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('cart:remove_item', args=[item.pk]))
+        self.assertEqual(self.client.get(url).json(), {'total_items': 5, 'subtotal': 2100.0})
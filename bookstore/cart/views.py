@@ -9,24 +9,23 @@ from django.contrib import messages
 from django.db import transaction
 from .models import Cart, CartItem
 from .forms import AddToCartForm, UpdateCartForm
+from .services import get_cart_summary, get_or_create_cart, invalidate_cart_summary, load_cart
 import json
 
 from main.models import Product
 
 
 class CartMixin:
-    def get_cart(self, request):
+    def get_cart(self, request, create=False):
+        """
+        Корзина запроса. Для чтения хватает ленивой request.cart (без
+        корзины в БД это EmptyCart), запись передаёт create=True.
+        """
+        if create:
+            return get_or_create_cart(request)
         if hasattr(request, 'cart'):
             return request.cart
-
-        if not request.session.session_key:
-            request.session.create()
-
-        cart, created = Cart.objects.get_or_create(session_key=request.session.session_key)
-
-        request.session['card_id'] = cart.id
-        request.session.modified = True
-        return cart
+        return load_cart(request)
 
 
 class CartModalView(CartMixin,View):
@@ -44,7 +43,6 @@ class CartModalView(CartMixin,View):
 class AddToCartView(CartMixin,View):
     @transaction.atomic()
     def post(self, request, slug):
-        cart = self.get_cart(request)
         product = get_object_or_404(Product, slug=slug)
         form = AddToCartForm(request.POST, product=product)
 
@@ -61,7 +59,7 @@ class AddToCartView(CartMixin,View):
                 'error': 'Not enough stock',
             })
 
-        existing_item = cart.items.filter(
+        existing_item = self.get_cart(request).items.filter(
             product=product,
         ).first()
 
@@ -72,7 +70,9 @@ class AddToCartView(CartMixin,View):
                     'error': f'Добавлено максимальное количество доступных экземпляров.',
                 })
 
+        cart = self.get_cart(request, create=True)
         cart_item = cart.add_product(product, quantity)
+        invalidate_cart_summary(request, cart)
 
         request.session['cart_id'] = cart.id
         request.session.modified = True
@@ -93,7 +93,7 @@ class UpdateCartItemView(CartMixin,View):
     @transaction.atomic()
     def post(self, request, item_id):
         cart = self.get_cart(request)
-        cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
+        cart_item = get_object_or_404(cart.items, id=item_id)
         product = cart_item.product
         cart_item_id = cart_item.id
         new_quantity = cart_item.quantity
@@ -120,6 +120,7 @@ class UpdateCartItemView(CartMixin,View):
             cart_item.save()
             new_quantity = cart_item.quantity
             message = f'Количество «{product.name}» обновлено.'
+        invalidate_cart_summary(request, cart)
 
         request.session['cart_id'] = cart.id
         request.session.modified = True
@@ -165,6 +166,7 @@ class RemoveCartItemView(CartMixin,View):
             product = cart_item.product
             cart_item_id = cart_item.id
             cart_item.delete()
+            invalidate_cart_summary(request, cart)
 
             request.session['cart_id'] = cart.id
             request.session.modified = True
@@ -203,17 +205,19 @@ class RemoveCartItemView(CartMixin,View):
 
 class CartCountView(CartMixin,View):
     def get(self, request):
-        cart = self.get_cart(request)
+        summary = get_cart_summary(request)
         return JsonResponse({
-            'total_items': cart.total_items,
-            'subtotal': float(cart.subtotal),
+            'total_items': summary['total_items'],
+            'subtotal': float(summary['subtotal']),
         })
 
 
 class ClearCartView(CartMixin,View):
     def post(self, request):
         cart = self.get_cart(request)
-        cart.clear()
+        cart.clear_cart_items()
+        if cart.pk is not None:
+            invalidate_cart_summary(request, cart)
         request.session['cart_id'] = cart.id
         request.session.modified = True
 
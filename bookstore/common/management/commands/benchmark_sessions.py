@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from common.session_benchmark import SESSION_ENGINES, count_session_queries
+
+
+class Command(BaseCommand):
+    help = (
+        'Count django_session INSERT/UPDATE/SELECT statements for each session engine. '
+        'Requests go through SessionMiddleware inside a rolled-back transaction.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=1000,
+            help='Requests per engine.',
+        )
+        parser.add_argument(
+            '--visitors',
+            type=int,
+            default=1,
+            help='Number of visitors the requests are split between.',
+        )
+
+    def handle(self, *args, **options):
+        requests = max(options.get('requests') or 1000, 1)
+        visitors = min(max(options.get('visitors') or 1, 1), requests)
+        for engine in SESSION_ENGINES:
+            counts = count_session_queries(engine, requests=requests, visitors=visitors)
+            self.stdout.write(
+                f"{engine}: insert={counts['INSERT']} update={counts['UPDATE']} select={counts['SELECT']}"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f'Session benchmark finished: requests={requests} visitors={visitors}')
+        )
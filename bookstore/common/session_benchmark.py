@@ -0,0 +1,51 @@
+from collections import Counter
+from typing import Dict
+
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+SESSION_ENGINES = (
+    'django.contrib.sessions.backends.db',
+    'common.sessions.db',
+    'common.sessions.cached_db',
+)
+
+
+def _visit(request):
+    # Первый запрос посетителя меняет сессию (как добавление в корзину),
+    # остальные только читают её.
+    if not request.session.get('visited'):
+        request.session['visited'] = True
+    return HttpResponse()
+
+
+def count_session_queries(engine: str, *, requests: int = 1000, visitors: int = 1) -> Dict[str, int]:
+    """
+    Прогоняет requests запросов через SessionMiddleware с движком engine,
+    поровну на visitors посетителей, и считает запросы к django_session по
+    типу (INSERT/UPDATE/SELECT). Всё выполняется в откатываемой транзакции.
+    """
+    factory = RequestFactory()
+    counts = Counter({'INSERT': 0, 'UPDATE': 0, 'SELECT': 0})
+    with override_settings(SESSION_ENGINE=engine), transaction.atomic():
+        middleware = SessionMiddleware(_visit)
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(visitors):
+                session_key = None
+                for _ in range(max(requests // visitors, 1)):
+                    request = factory.get('/')
+                    if session_key:
+                        request.COOKIES[settings.SESSION_COOKIE_NAME] = session_key
+                    response = middleware(request)
+                    cookie = response.cookies.get(settings.SESSION_COOKIE_NAME)
+                    if cookie is not None:
+                        session_key = cookie.value
+        transaction.set_rollback(True)
+    for query in queries:
+        if 'django_session' in query['sql']:
+            counts[query['sql'].split()[0]] += 1
+    return dict(counts)
@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+
+REFRESHED_AT_KEY = '_refreshed_at'
+
+
+class ThrottledRefreshMixin:
+    """
+    При SESSION_SAVE_EVERY_REQUEST Django сохраняет сессию на каждом
+    запросе только ради продления срока. Здесь неизменённая сессия
+    пишется не чаще раза в SESSION_REFRESH_INTERVAL секунд; срок в
+    хранилище отстаёт от cookie не больше чем на этот интервал.
+    """
+
+    def refresh_due(self) -> bool:
+        interval = int(getattr(settings, 'SESSION_REFRESH_INTERVAL', 15 * 60))
+        return time.time() - self._session.get(REFRESHED_AT_KEY, 0) >= interval
+
+    def save(self, must_create=False):
+        if not must_create and not self.modified and self.session_key is not None:
+            if not self.refresh_due():
+                return
+        self._session[REFRESHED_AT_KEY] = int(time.time())
+        super().save(must_create)
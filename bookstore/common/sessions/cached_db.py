@@ -0,0 +1,11 @@
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+from . import ThrottledRefreshMixin
+
+
+class SessionStore(ThrottledRefreshMixin, CachedDBStore):
+    """
+    Сессии в кэше с записью насквозь в django_session (cached_db): чтение
+    идёт из кэша, БД — запасной источник после его сброса. Срок
+    неизменённой сессии продлевается редко, как в common.sessions.db.
+    """
@@ -0,0 +1,9 @@
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+
+from . import ThrottledRefreshMixin
+
+
+class SessionStore(ThrottledRefreshMixin, DBStore):
+    """
+    Сессии в django_session с редким продлением срока неизменённой сессии.
+    """
@@ -0,0 +1,64 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from common.sessions import REFRESHED_AT_KEY
+from common.sessions.cached_db import SessionStore as CachedDBSessionStore
+from common.sessions.db import SessionStore as DBSessionStore
+
+
+@override_settings(SESSION_REFRESH_INTERVAL=600)
+class ThrottledSessionStoreTests(TestCase):
+    store = CachedDBSessionStore
+
+    def setUp(self):
+        cache.clear()
+        self.session = self.store()
+        self.session['cart_id'] = 1
+        self.session.save()
+
+    def test_unchanged_session_is_refreshed_once_per_interval(self):
+        refreshed_at = self.session[REFRESHED_AT_KEY]
+        session = self.store(session_key=self.session.session_key)
+        self.assertEqual(session['cart_id'], 1)
+
+        with self.assertNumQueries(0):
+            session.save()
+
+        with mock.patch('common.sessions.time.time', return_value=refreshed_at + 601):
+            with CaptureQueriesContext(connection) as queries:
+                session.save()
+        self.assertEqual([q['sql'].split()[0] for q in queries if 'django_session' in q['sql']], ['UPDATE'])
+        self.assertEqual(session[REFRESHED_AT_KEY], refreshed_at + 601)
+
+    def test_modified_session_is_written_through(self):
+        session = self.store(session_key=self.session.session_key)
+        session['cart_id'] = 2
+        session.save()
+
+        cache.clear()
+        stored = Session.objects.get(session_key=self.session.session_key).get_decoded()
+        self.assertEqual(stored['cart_id'], 2)
+        self.assertEqual(self.store(session_key=self.session.session_key)['cart_id'], 2)
+
+
+class ThrottledDBSessionStoreTests(ThrottledSessionStoreTests):
+    store = DBSessionStore
+
+
+class BenchmarkSessionsCommandTests(TestCase):
+    def test_throttled_engines_skip_refresh_writes(self):
+        out = StringIO()
+        call_command('benchmark_sessions', '--requests', '20', '--visitors', '2', stdout=out)
+        output = out.getvalue()
+
+        self.assertIn('django.contrib.sessions.backends.db: insert=2 update=18 select=20', output)
+        self.assertIn('common.sessions.db: insert=2 update=0 select=20', output)
+        self.assertIn('common.sessions.cached_db: insert=2 update=0 select=2', output)
+        self.assertFalse(Session.objects.exists())
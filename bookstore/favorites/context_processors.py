@@ -1,16 +1,12 @@
-from .services import resolve_favorite_list
+from .services import get_favorite_ids
 
 
 def favorites_processor(request):
-    favorite_list = resolve_favorite_list(request)
-    favorite_items_map = {}
-    if favorite_list:
-        for item in favorite_list.items.select_related('product'):
-            favorite_items_map[item.product_id] = {
-                'favorite_item_id': item.id,
-            }
-
+    favorite_ids = get_favorite_ids(request)
     return {
-        'favorite_items_map': favorite_items_map,
-        'favorite_total_items': favorite_list.total_items if favorite_list else 0,
+        'favorite_items_map': {
+            product_id: {'favorite_item_id': item_id}
+            for product_id, item_id in favorite_ids.items()
+        },
+        'favorite_total_items': len(favorite_ids),
     }
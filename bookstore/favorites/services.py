@@ -1,9 +1,15 @@
-from typing import Optional
+from typing import Dict, Optional
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
 
 from .models import FavoriteItem, FavoriteList
 
+FAVORITES_VERSION_KEY_PREFIX = 'favorites:version'
+FAVORITES_IDS_KEY_PREFIX = 'favorites:ids'
+FAVORITE_LIST_SESSION_KEY = 'favorite_list_id'
+
 
 def _ensure_session_key(request) -> str:
     if not request.session.session_key:
@@ -27,8 +33,17 @@ def _get_or_create_session_list(session_key: str) -> FavoriteList:
 
 
 def merge_session_favorites(request, user) -> FavoriteList:
+    """
+    Переносит анонимное избранное в список пользователя; вызывается при
+    входе. login() меняет ключ сессии, поэтому анонимный список ищется
+    по id, сохранённому в данных сессии.
+    """
     session_key = _ensure_session_key(request)
-    session_list = _get_existing_session_list(session_key)
+    list_id = request.session.pop(FAVORITE_LIST_SESSION_KEY, None)
+    if list_id:
+        session_list = FavoriteList.objects.filter(pk=list_id, user=None).first()
+    else:
+        session_list = _get_existing_session_list(session_key)
     user_list, _ = FavoriteList.objects.get_or_create(user=user)
 
     if session_list and session_list != user_list:
@@ -39,17 +54,85 @@ def merge_session_favorites(request, user) -> FavoriteList:
                     product=item.product,
                 )
         session_list.delete()
+        invalidate_favorite_ids(request, user_list)
 
     request.favorite_list = user_list
     return user_list
 
 
 def resolve_favorite_list(request) -> FavoriteList:
-    session_key = _ensure_session_key(request)
-
+    """
+    Список для записи: создаёт его при необходимости. Сессионное
+    избранное переносится в список пользователя один раз — при входе.
+    """
     if request.user.is_authenticated:
-        return merge_session_favorites(request, request.user)
-
-    favorite_list = _get_or_create_session_list(session_key)
+        favorite_list, _ = FavoriteList.objects.get_or_create(user=request.user)
+    else:
+        favorite_list = _get_or_create_session_list(_ensure_session_key(request))
+        request.session[FAVORITE_LIST_SESSION_KEY] = favorite_list.pk
     request.favorite_list = favorite_list
     return favorite_list
+
+
+def find_favorite_list_id(request) -> Optional[int]:
+    """
+    id списка избранного без записи в БД и без создания сессии.
+    """
+    if request.user.is_authenticated:
+        lists = FavoriteList.objects.filter(user=request.user)
+    elif request.session.session_key:
+        lists = FavoriteList.objects.filter(session_key=request.session.session_key, user=None)
+    else:
+        return None
+    return lists.values_list('id', flat=True).first()
+
+
+def get_favorites_version(list_id: int) -> int:
+    return cache.get(f'{FAVORITES_VERSION_KEY_PREFIX}:{list_id}', 1)
+
+
+def invalidate_favorite_ids(request, favorite_list: FavoriteList) -> None:
+    """
+    Как и сводка корзины: версия поднимается после коммита, а текущий
+    запрос дальше читает избранное из БД в обход кэша.
+    """
+    list_id = favorite_list.pk
+    request._favorite_ids = None
+    request._favorites_changed = True
+
+    def bump():
+        key = f'{FAVORITES_VERSION_KEY_PREFIX}:{list_id}'
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 2, timeout=None)
+
+    transaction.on_commit(bump)
+
+
+def collect_favorite_ids(list_id: int) -> Dict[int, int]:
+    return dict(FavoriteItem.objects.filter(favorite_list_id=list_id).values_list('product_id', 'id'))
+
+
+def get_favorite_ids(request) -> Dict[int, int]:
+    """
+    Избранное текущего посетителя: {product_id: favorite_item_id}.
+    Кэшируется по версии списка, которую поднимают ToggleFavoriteView
+    и перенос при входе; сам запрос только читает.
+    """
+    cached = getattr(request, '_favorite_ids', None)
+    if cached is not None:
+        return cached
+    list_id = find_favorite_list_id(request)
+    if list_id is None:
+        favorite_ids = {}
+    elif getattr(request, '_favorites_changed', False):
+        favorite_ids = collect_favorite_ids(list_id)
+    else:
+        key = f'{FAVORITES_IDS_KEY_PREFIX}:{list_id}:v{get_favorites_version(list_id)}'
+        favorite_ids = cache.get(key)
+        if favorite_ids is None:
+            favorite_ids = collect_favorite_ids(list_id)
+            cache.set(key, favorite_ids, getattr(settings, 'FAVORITES_CACHE_TIMEOUT', 3600))
+    request._favorite_ids = favorite_ids
+    return favorite_ids
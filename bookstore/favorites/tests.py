@@ -0,0 +1,78 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from favorites.context_processors import favorites_processor
+from favorites.models import FavoriteItem, FavoriteList
+from favorites.services import get_favorite_ids, merge_session_favorites, resolve_favorite_list
+from main.models import Category, Product
+
+
+class FavoritesReadPathTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Книги')
+        self.products = [
+            Product.objects.create(
+                erp_product_id=f'favorite-{index}',
+                name=f'Книга {index}',
+                slug=f'favorite-book-{index}',
+                price=Decimal('400'),
+                category=self.category,
+                is_published=True,
+            )
+            for index in range(2)
+        ]
+
+    def make_request(self, session, user=None):
+        request = RequestFactory().get('/')
+        request.session = session
+        request.user = user or AnonymousUser()
+        return request
+
+    def test_processor_does_not_write(self):
+        session = SessionStore()
+        session.create()
+
+        with self.assertNumQueries(1):
+            context = favorites_processor(self.make_request(session))
+
+        self.assertEqual(context, {'favorite_items_map': {}, 'favorite_total_items': 0})
+        self.assertFalse(FavoriteList.objects.exists())
+
+    def test_favorite_ids_are_cached_and_invalidated_by_toggle(self):
+        toggle_url = reverse('favorites:toggle', args=[self.products[0].slug])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(toggle_url)
+        session = SessionStore(session_key=self.client.session.session_key)
+        item = FavoriteItem.objects.get()
+
+        self.assertEqual(get_favorite_ids(self.make_request(session)), {self.products[0].pk: item.pk})
+        with self.assertNumQueries(1):
+            self.assertEqual(get_favorite_ids(self.make_request(session)), {self.products[0].pk: item.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(toggle_url)
+        self.assertEqual(get_favorite_ids(self.make_request(session)), {})
+
+    def test_merge_after_login_finds_list_of_previous_session(self):
+        session = SessionStore()
+        session.create()
+        request = self.make_request(session)
+        FavoriteItem.objects.create(favorite_list=resolve_favorite_list(request), product=self.products[1])
+        session.cycle_key()
+        user = get_user_model().objects.create(phone='+79990002233', first_name='Анна')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user_list = merge_session_favorites(self.make_request(session, user), user)
+
+        self.assertEqual(list(user_list.items.values_list('product_id', flat=True)), [self.products[1].pk])
+        self.assertEqual(FavoriteList.objects.count(), 1)
+        self.assertEqual(get_favorite_ids(self.make_request(session, user)), {
+            self.products[1].pk: user_list.items.get().pk,
+        })
@@ -7,7 +7,7 @@ from django.views import View
 from main.models import Product
 
 from .models import FavoriteItem
-from .services import resolve_favorite_list
+from .services import invalidate_favorite_ids, resolve_favorite_list
 
 
 class FavoriteMixin:
@@ -32,6 +32,7 @@ class ToggleFavoriteView(FavoriteMixin, View):
             FavoriteItem.objects.get_or_create(favorite_list=favorite_list, product=product)
             is_favorite = True
             message = f'«{product.name}» добавлена в избранное.'
+        invalidate_favorite_ids(request, favorite_list)
 
         request.session.modified = True
 
@@ -48,11 +49,13 @@ class ToggleFavoriteView(FavoriteMixin, View):
 class FavoriteListView(FavoriteMixin, View):
     def get(self, request):
         favorite_list = self.get_favorite_list(request)
-        favorite_items = favorite_list.items.select_related('product').order_by('-added_at')
-        products = [item.product for item in favorite_items]
+        products = list(
+            Product.objects.cards()
+            .filter(favoriteitem__favorite_list=favorite_list)
+            .order_by('-favoriteitem__added_at')
+        )
 
         context = {
-            'favorite_items': favorite_items,
             'products': products,
             'has_favorites': bool(products),
         }
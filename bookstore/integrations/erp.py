@@ -14,6 +14,8 @@ from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 from common.slugs import slugify_translit
 
+from main.catalog_bounds import defer_catalog_bounds_refresh
+from main.catalog_cache import defer_catalog_version_bump
 from main.models import Category, Genre, Product, ErpProductSyncState
 from orders.models import Order
 
@@ -257,21 +259,24 @@ def sync_erp_products(
     processed = 0
     max_updated_at: Optional[datetime] = None
 
-    for page_items in client.list_products(updated_since=updated_since_param, page_size=page_size):
-        for payload in page_items:
+    # Версия каталога и границы фильтров обновляются один раз за прогон,
+    # а не на каждый товар.
+    with defer_catalog_version_bump(), defer_catalog_bounds_refresh():
+        for page_items in client.list_products(updated_since=updated_since_param, page_size=page_size):
+            for payload in page_items:
+                if limit and processed >= limit:
+                    break
+                try:
+                    _, status, updated_at = upsert_product_from_erp(payload, dry_run=dry_run)
+                    stats[status] += 1
+                    if updated_at and (max_updated_at is None or updated_at > max_updated_at):
+                        max_updated_at = updated_at
+                except Exception:
+                    stats['errors'] += 1
+                    logger.exception('ERP product sync failed for payload: %s', payload)
+                processed += 1
             if limit and processed >= limit:
                 break
-            try:
-                _, status, updated_at = upsert_product_from_erp(payload, dry_run=dry_run)
-                stats[status] += 1
-                if updated_at and (max_updated_at is None or updated_at > max_updated_at):
-                    max_updated_at = updated_at
-            except Exception:
-                stats['errors'] += 1
-                logger.exception('ERP product sync failed for payload: %s', payload)
-            processed += 1
-        if limit and processed >= limit:
-            break
 
     if not dry_run and write_state:
         if not state:
@@ -0,0 +1,299 @@
+import hashlib
+import logging
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+from io import BytesIO
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+from urllib import error, request
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image
+
+from main.catalog_cache import bump_catalog_version, defer_catalog_version_bump
+from main.models import MirroredImage, Product
+from main.renditions import RENDITION_ERRORS, build_renditions, save_once
+
+logger = logging.getLogger(__name__)
+
+MIRROR_DIR = 'mirror'
+MIRROR_USER_AGENT = 'BookStore image mirror'
+# urlopen умеет file:// и ftp://, а из ERP должны приходить только веб-адреса.
+MIRROR_URL_SCHEMES = {'http', 'https'}
+IMAGE_EXTENSIONS = {
+    'JPEG': '.jpg',
+    'PNG': '.png',
+    'WEBP': '.webp',
+    'GIF': '.gif',
+}
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: str
+    content_hash: str = ''
+    name: str = ''
+    etag: str = ''
+    last_modified: str = ''
+    renditions: Dict[str, Any] = field(default_factory=dict)
+    error: str = ''
+
+
+@dataclass
+class MirrorStats:
+    products: int = 0
+    products_updated: int = 0
+    urls: int = 0
+    downloaded: int = 0
+    deduplicated: int = 0
+    not_modified: int = 0
+    unchanged: int = 0
+    skipped: int = 0
+    failed: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(self.__dict__)
+
+
+def product_external_urls(product: Product) -> List[str]:
+    urls = []
+    if product.external_image_url:
+        urls.append(product.external_image_url)
+    urls.extend(image['url'] for image in product.external_images_sorted)
+    return list(dict.fromkeys(url for url in urls if url))
+
+
+def iter_products_with_external_images(batch_size: int) -> Iterator[List[Product]]:
+    queryset = (
+        Product.objects.filter(~Q(external_image_url='') | ~Q(external_images=[]))
+        .only(
+            'id',
+            'main_image',
+            'external_image_url',
+            'external_images',
+            'mirrored_images',
+            'image_renditions',
+            'primary_image_url',
+            'card_image_urls',
+        )
+        .order_by('pk')
+    )
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_id)[:batch_size])
+        if not batch:
+            return
+        last_id = batch[-1].pk
+        yield batch
+
+
+def fetch_image(
+    url: str,
+    *,
+    etag: str = '',
+    last_modified: str = '',
+    known_hash: str = '',
+    timeout: int = 15,
+    max_bytes: int = 15 * 1024 * 1024,
+    storage=default_storage,
+) -> FetchResult:
+    """
+    Скачивает изображение с условными заголовками. Выполняется в потоках
+    пула и к БД не обращается: файл сохраняется в хранилище под именем
+    из хэша содержимого, там же строятся уменьшенные версии.
+    """
+    if urlsplit(url).scheme.lower() not in MIRROR_URL_SCHEMES:
+        return FetchResult(url=url, status='failed', error='Unsupported URL scheme.')
+    req = request.Request(url, method='GET')
+    req.add_header('User-Agent', MIRROR_USER_AGENT)
+    if etag:
+        req.add_header('If-None-Match', etag)
+    if last_modified:
+        req.add_header('If-Modified-Since', last_modified)
+    try:
+        with request.urlopen(req, timeout=timeout) as response:
+            data = response.read(max_bytes + 1)
+            headers = response.headers
+    except error.HTTPError as exc:
+        if exc.code == 304:
+            return FetchResult(url=url, status='not_modified', etag=etag, last_modified=last_modified)
+        return FetchResult(url=url, status='failed', error=f'HTTP {exc.code}')
+    except (error.URLError, OSError) as exc:
+        return FetchResult(url=url, status='failed', error=str(getattr(exc, 'reason', exc))[:255])
+    if len(data) > max_bytes:
+        return FetchResult(url=url, status='failed', error='Image is too large.')
+
+    result = FetchResult(
+        url=url,
+        status='downloaded',
+        content_hash=hashlib.sha256(data).hexdigest(),
+        etag=headers.get('ETag', ''),
+        last_modified=headers.get('Last-Modified', ''),
+    )
+    if result.content_hash == known_hash:
+        result.status = 'unchanged'
+        return result
+    try:
+        with Image.open(BytesIO(data)) as image:
+            image_format = image.format
+            image.verify()
+    except RENDITION_ERRORS as exc:
+        result.status = 'failed'
+        result.error = f'Not an image: {exc}'[:255]
+        return result
+
+    extension = IMAGE_EXTENSIONS.get(image_format) or _guess_extension(url, headers)
+    name = f'{MIRROR_DIR}/{result.content_hash[:2]}/{result.content_hash}{extension}'
+    name, created = save_once(name, ContentFile(data), storage)
+    if not created:
+        result.status = 'deduplicated'
+    result.name = name
+    try:
+        result.renditions = {
+            'source': name,
+            'url': storage.url(name),
+            **build_renditions(data, storage),
+        }
+    except RENDITION_ERRORS as exc:
+        logger.warning('Could not build renditions for %s: %s', url, exc)
+        result.renditions = {'source': name, 'url': storage.url(name), 'sizes': []}
+    return result
+
+
+def _guess_extension(url: str, headers) -> str:
+    content_type = (headers.get('Content-Type') or '').split(';')[0].strip()
+    extension = mimetypes.guess_extension(content_type) if content_type else None
+    if not extension:
+        path = urlsplit(url).path
+        extension = path[path.rfind('.'):] if '.' in path.rsplit('/', 1)[-1] else ''
+    return extension[:10]
+
+
+def mirror_external_images(
+    *,
+    workers: Optional[int] = None,
+    batch_size: int = 200,
+    force: bool = False,
+    recheck_after: Optional[timedelta] = None,
+) -> Dict[str, int]:
+    """
+    Зеркалирует внешние изображения товаров в MEDIA_ROOT и переписывает
+    primary_image_url/card_image_urls/mirrored_images на локальные URL.
+
+    Загрузки идут в пуле из workers потоков, запись в БД — в основном
+    потоке после каждой порции товаров. URL, проверенные не раньше
+    recheck_after назад, пропускаются без запроса; остальные запрашиваются
+    с If-None-Match/If-Modified-Since, а совпадение хэша содержимого
+    считается отсутствием изменений.
+    """
+    workers = workers or int(getattr(settings, 'ERP_IMAGE_MIRROR_WORKERS', 8))
+    timeout = int(getattr(settings, 'ERP_IMAGE_MIRROR_TIMEOUT', 15))
+    max_bytes = int(getattr(settings, 'ERP_IMAGE_MIRROR_MAX_BYTES', 15 * 1024 * 1024))
+    if recheck_after is None:
+        recheck_after = timedelta(hours=int(getattr(settings, 'ERP_IMAGE_MIRROR_RECHECK_HOURS', 24)))
+
+    stats = MirrorStats()
+    processed_urls: Set[str] = set()
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool, defer_catalog_version_bump():
+        for products in iter_products_with_external_images(batch_size):
+            stats.products += len(products)
+            urls = list(dict.fromkeys(
+                url for product in products for url in product_external_urls(product)
+            ))
+            records = {
+                record.source_url: record
+                for record in MirroredImage.objects.filter(source_url__in=urls)
+            }
+            stale_before = timezone.now() - recheck_after
+            to_fetch = []
+            for url in urls:
+                if url in processed_urls:
+                    continue
+                processed_urls.add(url)
+                record = records.get(url)
+                if (
+                    not force
+                    and record is not None
+                    and record.checked_at
+                    and record.checked_at >= stale_before
+                ):
+                    stats.skipped += 1
+                    continue
+                to_fetch.append(url)
+            stats.urls += len(to_fetch)
+
+            futures = [
+                pool.submit(
+                    fetch_image,
+                    url,
+                    etag=records[url].etag if url in records and records[url].image else '',
+                    last_modified=records[url].last_modified if url in records and records[url].image else '',
+                    known_hash=records[url].content_hash if url in records and records[url].image else '',
+                    timeout=timeout,
+                    max_bytes=max_bytes,
+                )
+                for url in to_fetch
+            ]
+            for future in futures:
+                result = future.result()
+                records[result.url] = _store_result(records.get(result.url), result, stats)
+
+            stats.products_updated += _rewrite_products(products, records)
+    return stats.as_dict()
+
+
+def _store_result(record: Optional[MirroredImage], result: FetchResult, stats: MirrorStats) -> MirroredImage:
+    if record is None:
+        record = MirroredImage(source_url=result.url)
+    record.checked_at = timezone.now()
+    if result.status == 'failed':
+        stats.failed += 1
+        record.last_error = result.error
+        logger.warning('Image mirror failed for %s: %s', result.url, result.error)
+    elif result.status in ('not_modified', 'unchanged'):
+        stats.not_modified += result.status == 'not_modified'
+        stats.unchanged += result.status == 'unchanged'
+        record.last_error = ''
+        record.etag = result.etag or record.etag
+        record.last_modified = result.last_modified or record.last_modified
+    else:
+        stats.downloaded += result.status == 'downloaded'
+        stats.deduplicated += result.status == 'deduplicated'
+        record.image.name = result.name
+        record.image_renditions = result.renditions
+        record.content_hash = result.content_hash
+        record.etag = result.etag
+        record.last_modified = result.last_modified
+        record.last_error = ''
+    # Версии уже построены в потоке загрузки, save() их не пересобирает.
+    record.save()
+    return record
+
+
+def _rewrite_products(products: Iterable[Product], records: Dict[str, MirroredImage]) -> int:
+    changed = []
+    for product in products:
+        mirrored = {}
+        for url in product_external_urls(product):
+            record = records.get(url)
+            if record is not None and record.image:
+                mirrored[url] = {'url': record.image.url, 'renditions': record.image_renditions}
+        if mirrored == (product.mirrored_images or {}):
+            continue
+        product.mirrored_images = mirrored
+        product.refresh_card_images()
+        changed.append(product)
+    if changed:
+        Product.objects.bulk_update(
+            changed,
+            ['mirrored_images', 'primary_image_url', 'card_image_urls'],
+        )
+        bump_catalog_version()
+    return len(changed)
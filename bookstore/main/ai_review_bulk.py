@@ -0,0 +1,237 @@
+import hashlib
+import json
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .ai_reviews import build_product_prompt, copy_review, is_retryable_error, is_review_expired
+from .deepseek import DeepSeekAPIError, DeepSeekReviewService
+from .models import AIReview, AIReviewBulkRun, Product
+from .rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед первым повтором; дальше удваивается. Retry-After из ответа
+# DeepSeek, если он больше, важнее.
+BULK_RETRY_DELAY = 2.0
+
+
+@dataclass
+class CompletionResult:
+    text: str = ''
+    usage: Dict[str, int] = field(default_factory=dict)
+    retries: int = 0
+    error: str = ''
+
+
+@dataclass
+class BulkStats:
+    products: int = 0
+    skipped: int = 0
+    copied: int = 0
+    generated: int = 0
+    failed: int = 0
+    retries: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(self.__dict__)
+
+    def merged(self, totals: Dict[str, int]) -> Dict[str, int]:
+        return {name: value + int(totals.get(name, 0)) for name, value in self.as_dict().items()}
+
+
+def estimate_cost(prompt_tokens: int, completion_tokens: int, input_price: float, output_price: float) -> float:
+    """
+    Стоимость по цене за миллион входных и выходных токенов.
+    """
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+def run_key(filters: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(filters, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def start_bulk_run(filters: Dict[str, Any], *, restart: bool = False) -> AIReviewBulkRun:
+    """
+    Чекпойнт для набора фильтров. Незавершённый запуск продолжается,
+    завершённый (или при restart=True) начинается заново.
+    """
+    run, created = AIReviewBulkRun.objects.get_or_create(key=run_key(filters), defaults={'filters': filters})
+    if not created and (restart or run.finished_at is not None):
+        run.last_product_id = 0
+        run.failed_product_ids = []
+        run.stats = {}
+        run.started_at = timezone.now()
+        run.finished_at = None
+        run.save()
+    return run
+
+
+def request_completion(
+    service: DeepSeekReviewService,
+    prompt: str,
+    *,
+    bucket: TokenBucket,
+    max_retries: int,
+    sleep: Callable[[float], None] = time.sleep,
+) -> CompletionResult:
+    """
+    Вызов DeepSeek из потока пула, без обращений к БД. Ошибки сети, 429
+    и 5xx повторяются с удвоением паузы, каждый повтор снова берёт токен.
+    """
+    attempt = 0
+    while True:
+        bucket.acquire()
+        try:
+            text, usage = service.complete_with_usage(prompt)
+            return CompletionResult(text=text, usage=usage, retries=attempt)
+        except DeepSeekAPIError as exc:
+            if not is_retryable_error(exc) or attempt >= max_retries:
+                return CompletionResult(retries=attempt, error=str(exc) or 'DeepSeek API error.')
+            delay = max(BULK_RETRY_DELAY * 2 ** attempt, exc.retry_after or 0)
+            logger.info('DeepSeek request failed (%s), retrying in %.1fs', exc.status_code, delay)
+            sleep(delay)
+            attempt += 1
+
+
+def iter_candidate_batches(
+    products: QuerySet,
+    after_id: int,
+    batch_size: int,
+    retry_ids: Iterable[int] = (),
+) -> Iterator[List[Product]]:
+    queryset = products.select_related('genre').order_by('pk')
+    retry_ids = sorted(retry_ids)
+    for start in range(0, len(retry_ids), batch_size):
+        batch = list(queryset.filter(pk__in=retry_ids[start:start + batch_size]))
+        if batch:
+            yield batch
+    while True:
+        batch = list(queryset.filter(pk__gt=after_id)[:batch_size])
+        if not batch:
+            return
+        after_id = batch[-1].pk
+        yield batch
+
+
+def generate_missing_reviews(
+    service: DeepSeekReviewService,
+    products: QuerySet,
+    run: AIReviewBulkRun,
+    *,
+    workers: int = 4,
+    rate_per_minute: float = 30,
+    batch_size: int = 50,
+    max_retries: int = 3,
+    limit: Optional[int] = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> BulkStats:
+    """
+    Генерирует рецензии товарам, у которых нет актуальной. Порция товаров
+    разбирается в основном потоке: актуальные пропускаются, рецензии других
+    товаров с тем же prompt_hash копируются, одинаковые промпты порции
+    запрашиваются один раз. Запросы идут в пуле из workers потоков через
+    общий TokenBucket, запись в БД и чекпойнт — после каждой порции.
+    Товары, запрос для которых не удался, запоминаются в чекпойнте и
+    повторяются первыми при следующем запуске; пока они есть, запуск не
+    считается завершённым. limit ограничивает число обращений к API за запуск.
+    """
+    stats = BulkStats()
+    totals = dict(run.stats or {})
+    bucket = TokenBucket.per_minute(rate_per_minute, capacity=workers)
+    remaining = limit
+    # Товар мог выпасть из выборки (снят с публикации) — его не ждём.
+    failed_ids = set(products.filter(pk__in=run.failed_product_ids or []).values_list('pk', flat=True))
+    batches = iter_candidate_batches(products, run.last_product_id, batch_size, retry_ids=failed_ids)
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        for batch in batches:
+            prompts = {product.pk: build_product_prompt(service, product) for product in batch}
+            hashes = {pk: service.prompt_hash(prompt) for pk, prompt in prompts.items()}
+            own = {
+                (review.product_id, review.prompt_hash): review
+                for review in AIReview.objects.filter(
+                    product_id__in=prompts, prompt_hash__in=set(hashes.values())
+                )
+            }
+            shared = {}
+            for review in AIReview.objects.filter(prompt_hash__in=set(hashes.values())).order_by('generated_at'):
+                shared[review.prompt_hash] = review
+
+            pending = defaultdict(list)
+            last_id = run.last_product_id
+            for product in batch:
+                prompt_hash = hashes[product.pk]
+                if prompt_hash not in pending and remaining is not None and remaining <= 0:
+                    break
+                # Порция повторов идёт до чекпойнта и не должна его сдвигать назад.
+                last_id = max(last_id, product.pk)
+                failed_ids.discard(product.pk)
+                stats.products += 1
+                current = own.get((product.pk, prompt_hash))
+                if current is not None and not is_review_expired(current):
+                    stats.skipped += 1
+                    continue
+                source = shared.get(prompt_hash)
+                if source is not None and not is_review_expired(source):
+                    copy_review(source, product)
+                    stats.copied += 1
+                    continue
+                if prompt_hash not in pending and remaining is not None:
+                    remaining -= 1
+                pending[prompt_hash].append(product)
+
+            futures = {
+                prompt_hash: pool.submit(
+                    request_completion,
+                    service,
+                    prompts[group[0].pk],
+                    bucket=bucket,
+                    max_retries=max_retries,
+                    sleep=sleep,
+                )
+                for prompt_hash, group in pending.items()
+            }
+            for prompt_hash, future in futures.items():
+                result = future.result()
+                group = pending[prompt_hash]
+                stats.retries += result.retries
+                if result.error:
+                    stats.failed += len(group)
+                    failed_ids.update(product.pk for product in group)
+                    logger.warning('AI review for products %s failed: %s', [p.pk for p in group], result.error)
+                    continue
+                stats.generated += 1
+                stats.copied += len(group) - 1
+                stats.prompt_tokens += result.usage.get('prompt_tokens', 0)
+                stats.completion_tokens += result.usage.get('completion_tokens', 0)
+                generated_at = timezone.now()
+                for product in group:
+                    AIReview.objects.update_or_create(
+                        product=product,
+                        prompt_hash=prompt_hash,
+                        defaults={'model': service.model, 'text': result.text, 'generated_at': generated_at},
+                    )
+
+            run.last_product_id = last_id
+            run.failed_product_ids = sorted(failed_ids)
+            run.stats = stats.merged(totals)
+            run.save(update_fields=['last_product_id', 'failed_product_ids', 'stats', 'updated_at'])
+            if remaining is not None and remaining <= 0:
+                if products.filter(pk__gt=last_id).exists():
+                    # Лимит исчерпан: запуск остаётся незавершённым и
+                    # следующий продолжит с чекпойнта.
+                    return stats
+                break
+    if failed_ids:
+        return stats
+    run.finished_at = timezone.now()
+    run.save(update_fields=['finished_at', 'updated_at'])
+    return stats
@@ -0,0 +1,339 @@
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .deepseek import DeepSeekAPIError, DeepSeekReviewService
+from .models import AIReview, AIReviewJob, Product
+from .rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Запас к таймауту DeepSeek: задание в работе дольше этого считается
+# брошенным упавшим воркером и возвращается в очередь.
+AI_REVIEW_STALE_GRACE = 10
+# Пауза перед повтором задания: 30 с, 60 с, 120 с...
+AI_REVIEW_RETRY_DELAY = 30
+# Как часто воркер при потоковом ответе сохраняет текст и продлевает
+# started_at, чтобы requeue_stale_jobs не счёл задание брошенным.
+AI_REVIEW_PROGRESS_INTERVAL = 1.0
+
+
+def build_product_prompt(service: DeepSeekReviewService, product: Product) -> str:
+    return service.build_prompt(
+        title=product.name,
+        authors=product.authors,
+        year=product.year,
+        genre=product.genre.name if product.genre else None,
+    )
+
+
+def is_review_expired(review: AIReview, now=None) -> bool:
+    ttl = int(getattr(settings, 'DEEPSEEK_REVIEW_TTL', 0) or 0)
+    if not ttl:
+        return False
+    now = now or timezone.now()
+    return review.generated_at <= now - timedelta(seconds=ttl)
+
+
+def can_regenerate_review(review: AIReview, now=None) -> bool:
+    regenerate_after = int(getattr(settings, 'DEEPSEEK_REVIEW_REGENERATE_AFTER', 0) or 0)
+    now = now or timezone.now()
+    return review.generated_at <= now - timedelta(seconds=regenerate_after)
+
+
+def find_usable_review(
+    product: Product,
+    prompt_hash: str,
+    *,
+    regenerate: bool = False,
+) -> Tuple[Optional[AIReview], Optional[AIReview]]:
+    """
+    Возвращает пару (рецензия, которую можно отдать без DeepSeek; сохранённая
+    рецензия товара). Вторая нужна как запасной вариант, если API недоступен.
+    """
+    stored = AIReview.objects.filter(product=product, prompt_hash=prompt_hash).first()
+    if stored is not None:
+        wants_new = regenerate and can_regenerate_review(stored)
+        if not wants_new and not is_review_expired(stored):
+            return stored, stored
+        return None, stored
+    shared = find_shared_review(prompt_hash, exclude_product=product)
+    if shared is not None:
+        return copy_review(shared, product), None
+    return None, None
+
+
+def find_shared_review(prompt_hash: str, *, exclude_product=None, since=None) -> Optional[AIReview]:
+    reviews = AIReview.objects.filter(prompt_hash=prompt_hash)
+    if exclude_product is not None:
+        reviews = reviews.exclude(product=exclude_product)
+    if since is not None:
+        reviews = reviews.filter(generated_at__gte=since)
+    review = reviews.order_by('-generated_at').first()
+    if review is None or (since is None and is_review_expired(review)):
+        return None
+    return review
+
+
+def copy_review(source: AIReview, product: Product) -> AIReview:
+    if source.product_id == product.pk:
+        return source
+    review, _ = AIReview.objects.update_or_create(
+        product=product,
+        prompt_hash=source.prompt_hash,
+        defaults={
+            'model': source.model,
+            'text': source.text,
+            'generated_at': source.generated_at,
+        },
+    )
+    return review
+
+
+def enqueue_ai_review(
+    product: Product,
+    service: DeepSeekReviewService,
+    *,
+    regenerate: bool = False,
+) -> Tuple[Optional[AIReview], Optional[AIReviewJob]]:
+    """
+    Рецензия для товара без обращения к DeepSeek: сохранённая (или
+    скопированная у товара с тем же prompt_hash), если она не устарела,
+    иначе — активное задание для воркера process_ai_reviews. Задание на
+    prompt_hash одно, повторные запросы получают уже существующее.
+    """
+    prompt = build_product_prompt(service, product)
+    prompt_hash = service.prompt_hash(prompt)
+    usable, _ = find_usable_review(product, prompt_hash, regenerate=regenerate)
+    if usable is not None:
+        return usable, None
+    active = AIReviewJob.objects.filter(prompt_hash=prompt_hash, status__in=AIReviewJob.ACTIVE_STATUSES)
+    job = active.first()
+    if job is not None:
+        return None, job
+    try:
+        with transaction.atomic():
+            job = AIReviewJob.objects.create(product=product, prompt_hash=prompt_hash, prompt=prompt)
+    except IntegrityError:
+        # Параллельный запрос успел поставить задание первым.
+        job = active.first()
+        if job is None:
+            raise
+    return None, job
+
+
+def find_product_job(product: Product, job_id: int, service: DeepSeekReviewService) -> Optional[AIReviewJob]:
+    """
+    Задание, рецензию которого можно отдать товару: поставленное им самим
+    или другим изданием с тем же текущим prompt_hash. Чужие задания не
+    находятся, иначе get_job_review скопировал бы чужую рецензию.
+    """
+    prompt_hash = service.prompt_hash(build_product_prompt(service, product))
+    return (
+        AIReviewJob.objects.select_related('review')
+        .filter(Q(product=product) | Q(prompt_hash=prompt_hash), pk=job_id)
+        .first()
+    )
+
+
+def get_job_review(job: AIReviewJob, product: Product) -> Optional[AIReview]:
+    """
+    Рецензия выполненного задания для товара. Задание могло быть поставлено
+    другим товаром с тем же prompt_hash — тогда рецензия копируется.
+    """
+    if job.status != AIReviewJob.STATUS_DONE or job.review is None:
+        return None
+    return copy_review(job.review, product)
+
+
+def requeue_stale_jobs(stale_after: timedelta) -> int:
+    """
+    Возвращает в очередь задания, чей воркер завис или был остановлен.
+    """
+    return AIReviewJob.objects.filter(
+        status=AIReviewJob.STATUS_RUNNING,
+        started_at__lt=timezone.now() - stale_after,
+    ).update(status=AIReviewJob.STATUS_PENDING, available_at=timezone.now())
+
+
+def claim_ai_review_job() -> Optional[AIReviewJob]:
+    """
+    Забирает самое старое готовое к запуску задание. SKIP LOCKED не даёт
+    потокам и процессам воркера взять одно задание дважды.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        job = AIReviewJob.objects.select_for_update(skip_locked=True).filter(
+            status=AIReviewJob.STATUS_PENDING,
+            available_at__lte=now,
+        ).order_by('available_at', 'pk').first()
+        if job is None:
+            return None
+        AIReviewJob.objects.filter(pk=job.pk).update(
+            status=AIReviewJob.STATUS_RUNNING,
+            started_at=now,
+            attempts=F('attempts') + 1,
+            partial_text='',
+        )
+    job.refresh_from_db()
+    return job
+
+
+def is_retryable_error(exc: DeepSeekAPIError) -> bool:
+    status_code = exc.status_code
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+def run_ai_review_job(job: AIReviewJob, service: DeepSeekReviewService, *, stream: bool = False) -> AIReviewJob:
+    """
+    Выполняет задание. Ошибки сети, 429 и 5xx повторяются с растущей паузой
+    до DEEPSEEK_JOB_MAX_ATTEMPTS попыток, остальные сразу завершают задание.
+    """
+    try:
+        if stream:
+            text = stream_ai_review_job(job, service)
+        else:
+            text = service.complete(job.prompt)
+    except DeepSeekAPIError as exc:
+        return fail_ai_review_job(job, exc)
+    return complete_ai_review_job(job, service.model, text)
+
+
+def stream_ai_review_job(job: AIReviewJob, service: DeepSeekReviewService) -> str:
+    """
+    Читает ответ DeepSeek потоком и раз в AI_REVIEW_PROGRESS_INTERVAL секунд
+    сохраняет полученный текст в partial_text, откуда его забирают опрос
+    статуса и SSE-представление. Вместе с текстом продлевается started_at.
+    """
+    parts = []
+    published_at = time.monotonic()
+    for chunk in service.stream(job.prompt):
+        parts.append(chunk)
+        if time.monotonic() - published_at >= AI_REVIEW_PROGRESS_INTERVAL:
+            publish_ai_review_progress(job, ''.join(parts))
+            published_at = time.monotonic()
+    text = ''.join(parts).strip()
+    if not text:
+        raise DeepSeekAPIError('DeepSeek не вернул текст рецензии.')
+    return text
+
+
+def publish_ai_review_progress(job: AIReviewJob, text: str) -> None:
+    job.partial_text = text
+    job.started_at = timezone.now()
+    AIReviewJob.objects.filter(pk=job.pk, status=AIReviewJob.STATUS_RUNNING).update(
+        partial_text=job.partial_text,
+        started_at=job.started_at,
+    )
+
+
+def complete_ai_review_job(job: AIReviewJob, model: str, text: str) -> AIReviewJob:
+    review, _ = AIReview.objects.update_or_create(
+        product_id=job.product_id,
+        prompt_hash=job.prompt_hash,
+        defaults={
+            'model': model,
+            'text': text,
+            'generated_at': timezone.now(),
+        },
+    )
+    job.review = review
+    job.status = AIReviewJob.STATUS_DONE
+    job.error = ''
+    job.partial_text = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['review', 'status', 'error', 'partial_text', 'finished_at'])
+    return job
+
+
+def fail_ai_review_job(job: AIReviewJob, exc: DeepSeekAPIError) -> AIReviewJob:
+    max_attempts = int(getattr(settings, 'DEEPSEEK_JOB_MAX_ATTEMPTS', 3))
+    job.error = (str(exc) or 'DeepSeek API error.')[:255]
+    job.partial_text = ''
+    if is_retryable_error(exc) and job.attempts < max_attempts:
+        job.status = AIReviewJob.STATUS_PENDING
+        delay = max(AI_REVIEW_RETRY_DELAY * 2 ** (job.attempts - 1), exc.retry_after or 0)
+        job.available_at = timezone.now() + timedelta(seconds=delay)
+    else:
+        job.status = AIReviewJob.STATUS_FAILED
+        job.finished_at = timezone.now()
+    logger.warning('AI review job %s failed (attempt %s): %s', job.pk, job.attempts, exc)
+    job.save(update_fields=['status', 'error', 'partial_text', 'available_at', 'finished_at'])
+    return job
+
+
+def process_ai_review_jobs(
+    service: DeepSeekReviewService,
+    *,
+    concurrency: int = 1,
+    rate_per_minute: float = 30,
+    once: bool = False,
+    poll_interval: float = 1.0,
+    stream: bool = False,
+    stop_event: Optional[threading.Event] = None,
+) -> Dict[str, int]:
+    """
+    Цикл воркера: concurrency потоков забирают задания и вызывают DeepSeek,
+    общий TokenBucket держит не больше rate_per_minute запросов в минуту.
+    С stream=True ответ читается потоком и публикуется в задании по частям.
+    С once=True выходит, когда готовых к запуску заданий не осталось.
+    """
+    stop_event = stop_event or threading.Event()
+    bucket = TokenBucket.per_minute(rate_per_minute, capacity=concurrency)
+    stale_after = timedelta(seconds=int(service.timeout) + AI_REVIEW_STALE_GRACE)
+    stats = Counter()
+    stats_lock = threading.Lock()
+
+    def work(threaded: bool):
+        while not stop_event.is_set():
+            if threaded:
+                # Долгоживущий поток: соединение, оборванное во время
+                # ожидания ответа DeepSeek, не должно ронять воркер.
+                close_old_connections()
+            requeue_stale_jobs(stale_after)
+            # Токен берётся до захвата задания, чтобы ожидание не засчитывалось
+            # во время выполнения и задание не вернулось в очередь как зависшее.
+            bucket.acquire()
+            job = claim_ai_review_job()
+            if job is None:
+                if once:
+                    return
+                stop_event.wait(poll_interval)
+                continue
+            job = run_ai_review_job(job, service, stream=stream)
+            with stats_lock:
+                stats[job.status] += 1
+
+    if concurrency <= 1:
+        work(threaded=False)
+    else:
+        def thread_work():
+            try:
+                work(threaded=True)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(thread_work) for _ in range(concurrency)]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                # Ctrl+C или ошибка в потоке: остальные потоки доделывают
+                # текущее задание и выходят, иначе пул ждал бы их вечно.
+                stop_event.set()
+                raise
+    return {
+        'done': stats[AIReviewJob.STATUS_DONE],
+        'retried': stats[AIReviewJob.STATUS_PENDING],
+        'failed': stats[AIReviewJob.STATUS_FAILED],
+    }
@@ -5,3 +5,6 @@ class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
     verbose_name = 'Каталог'
+
+    def ready(self):
+        from . import signals  # noqa: F401
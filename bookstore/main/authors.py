@@ -0,0 +1,112 @@
+import re
+from typing import Iterable, List
+
+from django.db.models import Case, Count, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import Author, Product, normalize_author_name
+
+AUTHOR_SEPARATORS_RE = re.compile(r'[,;/]')
+# После этих символов в имени начинается слово: «Лев Толстой», «Салтыков-Щедрин».
+AUTHOR_WORD_SEPARATORS = (' ', '-', '.')
+AuthorProduct = Author.products.through
+
+
+def split_authors(value: str) -> List[str]:
+    """
+    Делит строку Product.authors на отдельных авторов по «,», «;» и «/»,
+    без повторов и с сохранением порядка.
+    """
+    names = []
+    seen = set()
+    for part in AUTHOR_SEPARATORS_RE.split(value or ''):
+        name = ' '.join(part.split())[:255]
+        key = normalize_author_name(name)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        names.append(name)
+    return names
+
+
+def get_or_create_authors(names: Iterable[str]) -> List[Author]:
+    by_key = {normalize_author_name(name): name for name in names}
+    by_key.pop('', None)
+    if not by_key:
+        return []
+    existing = {
+        author.name_lower: author
+        for author in Author.objects.filter(name_lower__in=list(by_key))
+    }
+    missing = [
+        Author(name=name, name_lower=key)
+        for key, name in by_key.items()
+        if key not in existing
+    ]
+    if missing:
+        Author.objects.bulk_create(missing, ignore_conflicts=True)
+        existing = {
+            author.name_lower: author
+            for author in Author.objects.filter(name_lower__in=list(by_key))
+        }
+    return [existing[key] for key in by_key if key in existing]
+
+
+def refresh_author_counts(author_ids: Iterable[int]) -> int:
+    """
+    Пересчитывает products_count (опубликованные товары) у указанных авторов.
+    """
+    author_ids = list(author_ids)
+    if not author_ids:
+        return 0
+    published = (
+        AuthorProduct.objects.filter(author_id=OuterRef('pk'), product__is_published=True)
+        .order_by()
+        .values('author_id')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Author.objects.filter(pk__in=author_ids).update(
+        products_count=Coalesce(Subquery(published), Value(0)),
+    )
+
+
+def sync_product_authors(product: Product) -> None:
+    """
+    Приводит связи товара с авторами в соответствие со строкой product.authors
+    и обновляет счётчики затронутых авторов.
+    """
+    previous_ids = set(
+        AuthorProduct.objects.filter(product_id=product.pk).values_list('author_id', flat=True)
+    )
+    authors = get_or_create_authors(split_authors(product.authors))
+    product.author_records.set(authors)
+    refresh_author_counts(previous_ids | {author.pk for author in authors})
+
+
+def suggest_authors(query: str, limit: int) -> List[str]:
+    """
+    Подсказки по авторам: поиск по началу любого слова имени без учёта
+    регистра («толст» находит «Лев Толстой»). Совпадения с начала имени
+    идут первыми, внутри групп — самые «богатые» авторы.
+    """
+    authors = Author.objects.filter(products_count__gt=0)
+    order = ['-products_count', 'name_lower']
+    key = normalize_author_name(query)
+    if key:
+        word_start = Q()
+        for separator in AUTHOR_WORD_SEPARATORS:
+            word_start |= Q(name_lower__contains=f'{separator}{key}')
+        authors = authors.filter(Q(name_lower__startswith=key) | word_start).alias(
+            name_prefix=Case(When(name_lower__startswith=key, then=Value(0)), default=Value(1)),
+        )
+        order.insert(0, 'name_prefix')
+    return list(authors.order_by(*order).values_list('name', flat=True)[:limit])
+
+
+def author_products_condition(names: Iterable[str]):
+    """
+    Подзапрос id товаров, у которых есть хотя бы один из указанных авторов.
+    """
+    keys = [normalize_author_name(name) for name in names]
+    return AuthorProduct.objects.filter(author__name_lower__in=keys).values('product_id')
@@ -0,0 +1,113 @@
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Optional
+
+from django.db.models import Count, Max, Min
+
+from .models import CatalogBounds, Category, Product
+from .services import (
+    PRICE_PRESETS,
+    CatalogFilterState,
+    build_year_presets,
+    make_year_bounds,
+    price_preset_condition,
+)
+
+# Поля товара, от которых зависят сохранённые границы.
+CATALOG_BOUNDS_PRODUCT_FIELDS = ('is_published', 'category_id', 'price', 'year')
+# Фильтры, при которых границы всё ещё можно брать из таблицы: фильтр цены
+# не влияет ни на границы, ни на счётчики ценовых пресетов.
+CATALOG_BOUNDS_COMPATIBLE_FACETS = frozenset({'price'})
+
+_deferred = threading.local()
+
+
+def collect_catalog_bounds(category_id: Optional[int]) -> Dict[str, Any]:
+    """
+    Считает границы и счётчики ценовых пресетов по опубликованным товарам
+    категории (или всего каталога) одним агрегатом.
+    """
+    products = Product.objects.filter(is_published=True)
+    if category_id is not None:
+        products = products.filter(category_id=category_id)
+    aggregates = products.aggregate(
+        products_count=Count('id'),
+        min_price=Min('price'),
+        max_price=Max('price'),
+        min_year=Min('year'),
+        max_year=Max('year'),
+        **{
+            preset['key']: Count('id', filter=price_preset_condition(preset))
+            for preset in PRICE_PRESETS
+        },
+    )
+    year_bounds = make_year_bounds(aggregates['min_year'], aggregates['max_year'])
+    return {
+        'products_count': aggregates['products_count'],
+        'min_price': aggregates['min_price'],
+        'max_price': aggregates['max_price'],
+        'min_year': aggregates['min_year'],
+        'max_year': aggregates['max_year'],
+        'price_preset_counts': {
+            preset['key']: aggregates[preset['key']] for preset in PRICE_PRESETS
+        },
+        'year_presets': build_year_presets(year_bounds),
+    }
+
+
+def refresh_catalog_bounds(category_ids: Iterable[Optional[int]]) -> int:
+    category_ids = set(category_ids)
+    existing = set(
+        Category.objects.filter(pk__in=[pk for pk in category_ids if pk is not None])
+        .values_list('pk', flat=True)
+    )
+    refreshed = 0
+    for category_id in category_ids:
+        if category_id is not None and category_id not in existing:
+            continue
+        CatalogBounds.objects.update_or_create(
+            category_id=category_id,
+            defaults=collect_catalog_bounds(category_id),
+        )
+        refreshed += 1
+    return refreshed
+
+
+def mark_catalog_bounds_dirty(category_ids: Iterable[Optional[int]]) -> None:
+    """
+    Пересчитывает границы затронутых категорий и всего каталога. Внутри
+    defer_catalog_bounds_refresh() пересчёт откладывается до выхода.
+    """
+    category_ids = set(category_ids) | {None}
+    if getattr(_deferred, 'depth', 0):
+        _deferred.pending.update(category_ids)
+        return
+    refresh_catalog_bounds(category_ids)
+
+
+@contextmanager
+def defer_catalog_bounds_refresh():
+    depth = getattr(_deferred, 'depth', 0)
+    if not depth:
+        _deferred.pending = set()
+    _deferred.depth = depth + 1
+    try:
+        yield
+    finally:
+        _deferred.depth = depth
+        if not depth and _deferred.pending:
+            pending, _deferred.pending = _deferred.pending, set()
+            refresh_catalog_bounds(pending)
+
+
+def can_use_catalog_bounds(state: CatalogFilterState) -> bool:
+    return not state.query and CATALOG_BOUNDS_COMPATIBLE_FACETS.issuperset(state.conditions())
+
+
+def get_catalog_bounds(category: Optional[Category]) -> CatalogBounds:
+    category_id = category.pk if category else None
+    bounds = CatalogBounds.objects.filter(category_id=category_id).first()
+    if bounds is None:
+        refresh_catalog_bounds([category_id])
+        bounds = CatalogBounds.objects.get(category_id=category_id)
+    return bounds
@@ -0,0 +1,152 @@
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import QueryDict
+
+from favorites.services import get_favorite_ids
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_FRAGMENT_KEY_PREFIX = 'catalog:fragment'
+CATALOG_FRAGMENT_HITS_KEY = 'catalog:fragment:hits'
+CATALOG_FRAGMENT_MISSES_KEY = 'catalog:fragment:misses'
+CATALOG_LIST_PARAMS = frozenset({'genre', 'author', 'directtion'})
+CATALOG_IGNORED_PARAMS = frozenset({
+    'cursor',
+    'show_search',
+    'reset_search',
+    'show_filter',
+    'reset_filter',
+})
+
+_deferred = threading.local()
+
+
+def get_catalog_version() -> int:
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version() -> None:
+    """
+    Инвалидирует все закэшированные фрагменты каталога. Внутри
+    defer_catalog_version_bump() версия поднимается один раз на выходе.
+    Версия поднимается после коммита текущей транзакции: иначе параллельный
+    запрос закэширует фрагмент из старых строк уже под новой версией.
+    """
+    if getattr(_deferred, 'depth', 0):
+        _deferred.pending = True
+        return
+    transaction.on_commit(_increment_catalog_version)
+
+
+def _increment_catalog_version() -> None:
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOG_VERSION_KEY, 2, timeout=None)
+
+
+@contextmanager
+def defer_catalog_version_bump():
+    """
+    Копит изменения каталога (например, за весь прогон синхронизации ERP)
+    и поднимает версию один раз в конце.
+    """
+    depth = getattr(_deferred, 'depth', 0)
+    if not depth:
+        _deferred.pending = False
+    _deferred.depth = depth + 1
+    try:
+        yield
+    finally:
+        _deferred.depth = depth
+        if not depth and _deferred.pending:
+            _deferred.pending = False
+            bump_catalog_version()
+
+
+def normalize_catalog_params(params: QueryDict) -> Dict[str, str]:
+    """
+    Приводит query-параметры к каноническому виду: без пустых значений и
+    служебных флагов, списки (жанры, авторы, направления) отсортированы.
+    """
+    normalized = {}
+    for key in params.keys():
+        if key in CATALOG_IGNORED_PARAMS:
+            continue
+        values = [value.strip() for value in params.getlist(key)]
+        if key in CATALOG_LIST_PARAMS:
+            items = {
+                item.strip()
+                for value in values
+                for item in value.split(',')
+                if item.strip()
+            }
+            value = ','.join(sorted(items))
+        else:
+            value = next((value for value in reversed(values) if value), '')
+        if value:
+            normalized[key] = value
+    return normalized
+
+
+def build_catalog_fragment_key(category_slug: Optional[str], params: QueryDict) -> str:
+    normalized = normalize_catalog_params(params)
+    raw = '&'.join(f'{key}={normalized[key]}' for key in sorted(normalized))
+    digest = hashlib.md5(f'{category_slug or ""}?{raw}'.encode()).hexdigest()
+    return f'{CATALOG_FRAGMENT_KEY_PREFIX}:v{get_catalog_version()}:{digest}'
+
+
+def is_fragment_cacheable(request) -> bool:
+    """
+    Фрагмент каталога одинаков для всех, у кого нет товаров в корзине
+    и избранном: только такие запросы читают и пишут кэш.
+    """
+    if request.user.is_authenticated:
+        return False
+    cart = getattr(request, 'cart', None)
+    if cart is not None and cart.items.exists():
+        return False
+    if get_favorite_ids(request):
+        return False
+    return True
+
+
+def get_catalog_fragment(key: str) -> Optional[bytes]:
+    content = cache.get(key)
+    _count(CATALOG_FRAGMENT_MISSES_KEY if content is None else CATALOG_FRAGMENT_HITS_KEY)
+    return content
+
+
+def set_catalog_fragment(key: str, content: bytes) -> None:
+    timeout = getattr(settings, 'CATALOG_FRAGMENT_CACHE_TIMEOUT', 600)
+    cache.set(key, content, timeout)
+
+
+def get_catalog_fragment_stats() -> Dict[str, int]:
+    values = cache.get_many([CATALOG_FRAGMENT_HITS_KEY, CATALOG_FRAGMENT_MISSES_KEY])
+    return {
+        'hits': values.get(CATALOG_FRAGMENT_HITS_KEY, 0),
+        'misses': values.get(CATALOG_FRAGMENT_MISSES_KEY, 0),
+        'version': get_catalog_version(),
+    }
+
+
+def reset_catalog_fragment_stats() -> None:
+    cache.delete_many([CATALOG_FRAGMENT_HITS_KEY, CATALOG_FRAGMENT_MISSES_KEY])
+
+
+def _count(key: str) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
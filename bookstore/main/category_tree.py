@@ -0,0 +1,112 @@
+import copy
+import threading
+import time
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Category
+from .selectors import get_categories_with_products
+
+CATEGORY_TREE_VERSION_KEY = 'category_tree:version'
+CATEGORY_TREE_KEY_PREFIX = 'category_tree:data'
+CATEGORY_TREE_LOCK_KEY_PREFIX = 'category_tree:lock'
+CATEGORY_TREE_LOCK_TIMEOUT = 30
+CATEGORY_TREE_WAIT_ATTEMPTS = 20
+CATEGORY_TREE_WAIT_INTERVAL = 0.05
+# Поля товара, от которых зависит дерево: публикация и принадлежность категории.
+CATEGORY_TREE_PRODUCT_FIELDS = ('is_published', 'category_id', 'genre_id')
+
+
+class _ProcessCopy:
+    def __init__(self):
+        self.version: Optional[int] = None
+        self.tree: List[Category] = []
+        self.lock = threading.Lock()
+
+
+_process_copy = _ProcessCopy()
+
+
+def get_category_tree_version() -> int:
+    version = cache.get(CATEGORY_TREE_VERSION_KEY)
+    if version is None:
+        # Начальная версия от времени, чтобы после сброса кэша не совпасть
+        # со старой копией в памяти процесса.
+        cache.add(CATEGORY_TREE_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATEGORY_TREE_VERSION_KEY)
+    return version
+
+
+def bump_category_tree_version() -> None:
+    try:
+        cache.incr(CATEGORY_TREE_VERSION_KEY)
+    except ValueError:
+        get_category_tree_version()
+
+
+def get_category_tree() -> List[Category]:
+    """
+    Категории с опубликованными товарами (products_count) и их жанрами
+    (genre_list). Копия в памяти процесса сверяется с версией в общем кэше;
+    при промахе дерево строит один процесс, остальные ждут его результата.
+    Вызывающий получает поверхностные копии: объекты копии в памяти общие
+    для всех запросов и потоков, менять их нельзя.
+    """
+    return [_copy_category(category) for category in _get_shared_tree()]
+
+
+def get_tree_category(slug: str) -> Optional[Category]:
+    for category in _get_shared_tree():
+        if category.slug == slug:
+            return _copy_category(category)
+    return None
+
+
+def _copy_category(category: Category) -> Category:
+    clone = copy.copy(category)
+    clone.genre_list = [copy.copy(genre) for genre in category.genre_list]
+    return clone
+
+
+def _get_shared_tree() -> List[Category]:
+    version = get_category_tree_version()
+    if _process_copy.version == version:
+        return _process_copy.tree
+    with _process_copy.lock:
+        if _process_copy.version != version:
+            _process_copy.tree = _load_shared_tree(version)
+            _process_copy.version = version
+        return _process_copy.tree
+
+
+def _load_shared_tree(version: int) -> List[Category]:
+    data_key = f'{CATEGORY_TREE_KEY_PREFIX}:{version}'
+    tree = cache.get(data_key)
+    if tree is not None:
+        return tree
+    lock_key = f'{CATEGORY_TREE_LOCK_KEY_PREFIX}:{version}'
+    if not cache.add(lock_key, 1, timeout=CATEGORY_TREE_LOCK_TIMEOUT):
+        for _ in range(CATEGORY_TREE_WAIT_ATTEMPTS):
+            time.sleep(CATEGORY_TREE_WAIT_INTERVAL)
+            tree = cache.get(data_key)
+            if tree is not None:
+                return tree
+        # Не дождались: строим для себя, блокировку и кэш оставляем её
+        # владельцу.
+        return _build_tree()
+    try:
+        tree = _build_tree()
+        timeout = getattr(settings, 'CATEGORY_TREE_CACHE_TIMEOUT', 3600)
+        cache.set(data_key, tree, timeout)
+    finally:
+        cache.delete(lock_key)
+    return tree
+
+
+def _build_tree() -> List[Category]:
+    categories = list(get_categories_with_products().prefetch_related('genres'))
+    for category in categories:
+        category.genre_list = list(category.genres.all())
+    return categories
@@ -1,9 +1,12 @@
+import hashlib
 import json
 import logging
 from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
 from urllib import error, request
 
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import AppRegistryNotReady
 from django.db import DatabaseError
 
@@ -19,6 +22,11 @@ DEFAULT_PROMPT_TEMPLATE = (
     'делай акцент на идеях и стиле произведения. Не пересказывай сюжет подробно и уложись примерно в 1200 символов.\n'
     f'{DETAILS_PLACEHOLDER}'
 )
+SYSTEM_PROMPT = (
+    'Ты опытный литературный обозреватель. Пиши живым языком, не скатывайся в рекламные клише '
+    'и отвечай только на русском.'
+)
+PROMPT_CACHE_KEY = 'deepseek:prompt'
 
 
 class DeepSeekConfigurationError(RuntimeError):
@@ -34,10 +42,12 @@ class DeepSeekAPIError(RuntimeError):
         *,
         status_code: Optional[int] = None,
         response_body: Optional[str] = None,
+        retry_after: Optional[float] = None,
     ) -> None:
         super().__init__(message)
         self.status_code = status_code
         self.response_body = response_body
+        self.retry_after = retry_after
 
 
 @dataclass
@@ -68,12 +78,31 @@ class DeepSeekReviewService:
         """
         Builds prompt and requests literary review text from DeepSeek API.
         """
-        prompt = self._build_prompt(title=title, authors=authors, year=year, genre=genre)
+        prompt = self.build_prompt(title=title, authors=authors, year=year, genre=genre)
+        return self.complete(prompt)
+
+    def complete(self, prompt: str) -> str:
+        return self.complete_with_usage(prompt)[0]
+
+    def complete_with_usage(self, prompt: str) -> Tuple[str, Dict[str, int]]:
+        """
+        Текст ответа и расход токенов (prompt_tokens/completion_tokens).
+        """
         payload = self._build_payload(prompt)
         response_data = self._perform_request(payload)
-        return self._extract_content(response_data)
+        return self._extract_content(response_data), self._extract_usage(response_data)
+
+    def prompt_hash(self, prompt: str) -> str:
+        """
+        Ключ сохранённой рецензии: всё, от чего зависит ответ модели.
+        """
+        key = json.dumps(
+            [self.model, SYSTEM_PROMPT, prompt, self.temperature, self.max_tokens],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
 
-    def _build_prompt(
+    def build_prompt(
         self,
         *,
         title: str,
@@ -103,10 +132,7 @@ class DeepSeekReviewService:
             'messages': [
                 {
                     'role': 'system',
-                    'content': (
-                        'Ты опытный литературный обозреватель. Пиши живым языком, не скатывайся в рекламные клише '
-                        'и отвечай только на русском.'
-                    ),
+                    'content': SYSTEM_PROMPT,
                 },
                 {
                     'role': 'user',
@@ -117,15 +143,41 @@ class DeepSeekReviewService:
             'max_tokens': self.max_tokens,
         }
 
-    def _perform_request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+    def stream(self, prompt: str) -> Iterator[str]:
+        """
+        Запрос с stream: true: отдаёт фрагменты текста по мере того, как
+        DeepSeek присылает server-sent events, не дожидаясь конца ответа.
+        """
+        payload = self._build_payload(prompt)
+        payload['stream'] = True
+        with self._open_request(payload) as response:
+            events = iter_sse_data(response)
+            while True:
+                try:
+                    data = next(events, '[DONE]')
+                except OSError as exc:
+                    logger.error('DeepSeek API stream was interrupted: %s', exc)
+                    raise DeepSeekAPIError('Соединение с DeepSeek API прервалось.') from exc
+                if data == '[DONE]':
+                    return
+                try:
+                    chunk = json.loads(data)
+                except json.JSONDecodeError as exc:
+                    logger.error('DeepSeek API returned invalid stream chunk: %s', exc)
+                    raise DeepSeekAPIError('Не удалось обработать ответ DeepSeek API.') from exc
+                choices = chunk.get('choices') or []
+                delta = (choices[0].get('delta') or {}) if choices else {}
+                content = delta.get('content')
+                if content:
+                    yield content
+
+    def _open_request(self, payload: Dict[str, Any]):
         data = json.dumps(payload).encode('utf-8')
         req = request.Request(self.api_url, data=data, method='POST')
         req.add_header('Authorization', f'Bearer {self.api_key}')
         req.add_header('Content-Type', 'application/json')
         try:
-            with request.urlopen(req, timeout=self.timeout) as response:
-                charset = response.headers.get_content_charset() or 'utf-8'
-                body = response.read().decode(charset)
+            return request.urlopen(req, timeout=self.timeout)
         except error.HTTPError as exc:
             detail = self._read_error_body(exc)
             logger.warning('DeepSeek API responded with %s: %s', exc.code, detail or 'no body')
@@ -133,10 +185,16 @@ class DeepSeekReviewService:
                 'DeepSeek API вернул ошибку.',
                 status_code=exc.code,
                 response_body=detail,
+                retry_after=self._parse_retry_after(exc.headers),
             ) from exc
         except error.URLError as exc:
             logger.error('DeepSeek API connection error: %s', exc.reason)
             raise DeepSeekAPIError('Не удалось связаться с DeepSeek API.') from exc
+
+    def _perform_request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        with self._open_request(payload) as response:
+            charset = response.headers.get_content_charset() or 'utf-8'
+            body = response.read().decode(charset)
         try:
             return json.loads(body)
         except json.JSONDecodeError as exc:
@@ -153,8 +211,30 @@ class DeepSeekReviewService:
             raise DeepSeekAPIError('DeepSeek не вернул текст рецензии.')
         return content
 
+    @staticmethod
+    def _extract_usage(payload: Dict[str, Any]) -> Dict[str, int]:
+        usage = payload.get('usage') or {}
+        return {
+            'prompt_tokens': int(usage.get('prompt_tokens') or 0),
+            'completion_tokens': int(usage.get('completion_tokens') or 0),
+        }
+
+    @staticmethod
+    def _parse_retry_after(headers) -> Optional[float]:
+        value = headers.get('Retry-After') if headers is not None else None
+        try:
+            return max(float(value), 0.0) if value else None
+        except ValueError:
+            return None
+
     def _get_prompt_template(self) -> str:
-        saved_prompt = self._load_prompt_from_db()
+        saved_prompt = cache.get(PROMPT_CACHE_KEY)
+        if saved_prompt is None:
+            saved_prompt = self._load_prompt_from_db()
+            if saved_prompt is not None:
+                # Пустая строка тоже кэшируется: «в БД промпта нет».
+                timeout = getattr(settings, 'DEEPSEEK_PROMPT_CACHE_TIMEOUT', 300)
+                cache.set(PROMPT_CACHE_KEY, saved_prompt, timeout)
         return saved_prompt or DEFAULT_PROMPT_TEMPLATE
 
     @staticmethod
@@ -169,9 +249,7 @@ class DeepSeekReviewService:
         except Exception:
             logger.exception('Failed to load DeepSeek prompt from the database.')
             return None
-        if prompt_text:
-            return prompt_text.strip()
-        return None
+        return (prompt_text or '').strip()
 
     @staticmethod
     def _read_error_body(exc: error.HTTPError) -> Optional[str]:
@@ -183,3 +261,39 @@ class DeepSeekReviewService:
             return data.decode('utf-8')
         except Exception:
             return None
+
+
+def iter_sse_data(lines: Iterable[bytes]) -> Iterator[str]:
+    """
+    Разбирает поток server-sent events по строкам и отдаёт поле data каждого
+    события. Несколько строк data одного события склеиваются через перевод
+    строки, комментарии («: keep-alive») и прочие поля пропускаются.
+    """
+    data = []
+    for raw_line in lines:
+        line = raw_line.decode('utf-8').rstrip('\r\n')
+        if not line:
+            if data:
+                yield '\n'.join(data)
+                data = []
+            continue
+        if line.startswith(':'):
+            continue
+        name, _, value = line.partition(':')
+        if name == 'data':
+            data.append(value[1:] if value.startswith(' ') else value)
+    if data:
+        yield '\n'.join(data)
+
+
+def build_review_service() -> DeepSeekReviewService:
+    return DeepSeekReviewService(
+        api_key=getattr(settings, 'DEEPSEEK_API_KEY', ''),
+        api_url=getattr(settings, 'DEEPSEEK_API_URL', 'https://api.deepseek.com/chat/completions'),
+        model=getattr(settings, 'DEEPSEEK_MODEL', 'deepseek-chat'),
+        timeout=getattr(settings, 'DEEPSEEK_TIMEOUT', 30),
+    )
+
+
+def invalidate_prompt_cache() -> None:
+    cache.delete(PROMPT_CACHE_KEY)
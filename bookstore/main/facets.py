@@ -0,0 +1,126 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db.models import CharField, Count, F, Max, Min, Q, QuerySet, Value
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast
+
+from .models import CatalogBounds
+from .services import (
+    PRICE_PRESETS,
+    CatalogFilterState,
+    build_year_presets,
+    make_price_bounds,
+    make_year_bounds,
+    price_preset_condition,
+)
+
+GROUPED_FACETS = {
+    'genre': lambda: F('genre__slug'),
+    'author': lambda: F('author_records__name'),
+    'direction': lambda: KeyTextTransform('vinyl_directtion', 'attributes'),
+    'year': lambda: Cast('year', CharField()),
+}
+
+
+def build_catalog_facets(
+    products: QuerySet,
+    state: CatalogFilterState,
+    *,
+    include_directions: bool = False,
+    stored_bounds: Optional[CatalogBounds] = None,
+) -> Dict[str, Any]:
+    """
+    Считает фасеты каталога двумя запросами: агрегатом по срезу без фильтров
+    цены и года (границы + счётчики пресетов цены) и UNION ALL сгруппированных
+    счётчиков жанров, авторов, направлений и годов. Каждый фасет считается без
+    собственного фильтра, но с учётом всех остальных.
+    Если переданы сохранённые границы (stored_bounds), первый запрос не нужен.
+    """
+    products = products.order_by()
+    if stored_bounds is not None:
+        aggregates = {
+            'min_price': stored_bounds.min_price,
+            'max_price': stored_bounds.max_price,
+            'min_year': stored_bounds.min_year,
+            'max_year': stored_bounds.max_year,
+            **{
+                preset['key']: stored_bounds.price_preset_counts.get(preset['key'], 0)
+                for preset in PRICE_PRESETS
+            },
+        }
+    else:
+        core = products.filter(state.condition(exclude=('price', 'year')))
+        year_condition = state.conditions().get('year', Q())
+        aggregates = core.aggregate(
+            min_price=Min('price'),
+            max_price=Max('price'),
+            min_year=Min('year'),
+            max_year=Max('year'),
+            **{
+                preset['key']: Count('id', filter=year_condition & price_preset_condition(preset))
+                for preset in PRICE_PRESETS
+            },
+        )
+
+    facets = ['genre', 'author', 'year']
+    if include_directions:
+        facets.append('direction')
+    grouped = [
+        _grouped_counts(products.filter(state.condition(exclude=(facet,))), facet)
+        for facet in facets
+    ]
+    counts: Dict[str, Dict[str, int]] = {facet: {} for facet in GROUPED_FACETS}
+    for row in grouped[0].union(*grouped[1:], all=True):
+        counts[row['facet']][row['value']] = row['total']
+
+    price_bounds = make_price_bounds(aggregates['min_price'], aggregates['max_price'])
+    price_bounds['presets'] = [
+        dict(preset, count=aggregates[preset['key']])
+        for preset in PRICE_PRESETS
+    ]
+    year_bounds = make_year_bounds(aggregates['min_year'], aggregates['max_year'])
+    year_presets = (
+        stored_bounds.year_presets if stored_bounds is not None
+        else build_year_presets(year_bounds)
+    )
+    year_counts = _parse_year_counts(counts['year'])
+    year_bounds['presets'] = [
+        dict(preset, count=sum(
+            total for year, total in year_counts
+            if preset['min'] <= year <= preset['max']
+        ))
+        for preset in year_presets
+    ]
+
+    return {
+        'genres': counts['genre'],
+        'authors': _sorted_counts(counts['author']),
+        'directions': _sorted_counts(counts['direction']),
+        'price_bounds': price_bounds,
+        'year_bounds': year_bounds,
+    }
+
+
+def _grouped_counts(products: QuerySet, facet: str) -> QuerySet:
+    return (
+        products.annotate(facet=Value(facet), value=GROUPED_FACETS[facet]())
+        .exclude(value__isnull=True)
+        .exclude(value='')
+        .values('facet', 'value')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+
+
+def _parse_year_counts(counts: Dict[str, int]) -> List[Tuple[int, int]]:
+    parsed = []
+    for value, total in counts.items():
+        try:
+            parsed.append((int(value), total))
+        except (TypeError, ValueError):
+            continue
+    return parsed
+
+
+def _sorted_counts(counts: Dict[str, int]) -> List[Tuple[str, int]]:
+    return sorted(counts.items(), key=lambda item: item[0])
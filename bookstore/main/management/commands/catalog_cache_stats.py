@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from main.catalog_cache import get_catalog_fragment_stats, reset_catalog_fragment_stats
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters of the catalog fragment cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset counters after printing them.',
+        )
+
+    def handle(self, *args, **options):
+        stats = get_catalog_fragment_stats()
+        total = stats['hits'] + stats['misses']
+        hit_ratio = stats['hits'] / total * 100 if total else 0
+        if options.get('reset'):
+            reset_catalog_fragment_stats()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                'Catalog fragment cache: '
+                f"version={stats['version']} hits={stats['hits']} "
+                f"misses={stats['misses']} hit_ratio={hit_ratio:.1f}%"
+            )
+        )
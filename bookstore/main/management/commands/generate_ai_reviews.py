@@ -0,0 +1,130 @@
+import time
+from datetime import datetime, time as dt_time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from main.ai_review_bulk import estimate_cost, generate_missing_reviews, start_bulk_run
+from main.deepseek import DeepSeekConfigurationError, build_review_service
+from main.enums import ProductCollections
+from main.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Pre-generate DeepSeek reviews for published products without a current review. '
+        'Interrupted runs resume from the last checkpoint for the same filters.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--category', help='Only products of the category with this slug.')
+        parser.add_argument(
+            '--collection',
+            choices=[value for value, _ in ProductCollections.choices],
+            help='Only products of this collection.',
+        )
+        parser.add_argument(
+            '--updated-since',
+            dest='updated_since',
+            help='Only products updated since this date or datetime (ISO 8601).',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Number of parallel DeepSeek requests (default: DEEPSEEK_WORKER_CONCURRENCY).',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            help='Maximum DeepSeek requests per minute (default: DEEPSEEK_RATE_LIMIT_PER_MINUTE).',
+        )
+        parser.add_argument(
+            '--max-retries',
+            type=int,
+            dest='max_retries',
+            default=3,
+            help='Retries for 429, 5xx and network errors.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            dest='batch_size',
+            default=50,
+            help='Number of products per checkpoint.',
+        )
+        parser.add_argument('--limit', type=int, help='Maximum number of DeepSeek requests in this run.')
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore the checkpoint and start from the first product.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            service = build_review_service()
+        except DeepSeekConfigurationError as exc:
+            raise CommandError(str(exc)) from exc
+
+        filters = {
+            'category': options.get('category') or '',
+            'collection': options.get('collection') or '',
+            'updated_since': options.get('updated_since') or '',
+        }
+        products = Product.objects.filter(is_published=True)
+        if filters['category']:
+            products = products.filter(category__slug=filters['category'])
+        if filters['collection']:
+            products = products.filter(collection=filters['collection'])
+        if filters['updated_since']:
+            products = products.filter(updated_at__gte=self.parse_since(filters['updated_since']))
+
+        run = start_bulk_run(filters, restart=options.get('restart'))
+        if run.last_product_id:
+            self.stdout.write(f'Resuming after product {run.last_product_id}...')
+        if run.failed_product_ids:
+            self.stdout.write(f'Retrying failed products: {len(run.failed_product_ids)}...')
+
+        workers = options.get('workers') or int(getattr(settings, 'DEEPSEEK_WORKER_CONCURRENCY', 2))
+        rate = options.get('rate') or float(getattr(settings, 'DEEPSEEK_RATE_LIMIT_PER_MINUTE', 30))
+        started = time.monotonic()
+        stats = generate_missing_reviews(
+            service,
+            products,
+            run,
+            workers=max(workers, 1),
+            rate_per_minute=rate,
+            batch_size=max(options.get('batch_size') or 50, 1),
+            max_retries=max(options.get('max_retries') or 0, 0),
+            limit=options.get('limit'),
+        )
+        elapsed = time.monotonic() - started
+        cost = estimate_cost(
+            stats.prompt_tokens,
+            stats.completion_tokens,
+            float(getattr(settings, 'DEEPSEEK_INPUT_PRICE_PER_MILLION', 0)),
+            float(getattr(settings, 'DEEPSEEK_OUTPUT_PRICE_PER_MILLION', 0)),
+        )
+        per_minute = stats.generated * 60 / elapsed if elapsed else 0.0
+        self.stdout.write(
+            self.style.SUCCESS(
+                'AI reviews generated: '
+                f'products={stats.products} generated={stats.generated} copied={stats.copied} '
+                f'skipped={stats.skipped} failed={stats.failed} retries={stats.retries} '
+                f'tokens={stats.prompt_tokens}+{stats.completion_tokens} cost=${cost:.4f} '
+                f'throughput={per_minute:.1f}/min time={elapsed:.1f}s '
+                f"{'finished' if run.finished_at else 'checkpoint=' + str(run.last_product_id)}"
+            )
+        )
+
+    def parse_since(self, value):
+        since = parse_datetime(value)
+        if since is None:
+            date = parse_date(value)
+            if date is None:
+                raise CommandError(f'Invalid --updated-since value: {value}')
+            since = datetime.combine(date, dt_time.min)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
@@ -0,0 +1,120 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from main.catalog_cache import bump_catalog_version
+from main.category_tree import bump_category_tree_version
+from main.models import Banner, Category, Genre, Product
+from main.renditions import build_file_renditions
+
+RENDITION_MODELS = {
+    'product': Product,
+    'category': Category,
+    'genre': Genre,
+    'banner': Banner,
+}
+
+
+class Command(BaseCommand):
+    help = 'Build WebP/JPEG thumbnails for product, category, genre and banner images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--models',
+            nargs='+',
+            choices=sorted(RENDITION_MODELS),
+            default=list(RENDITION_MODELS),
+            help='Limit the backfill to these models.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Size of the process pool; 0 builds thumbnails in the current process.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            dest='batch_size',
+            default=200,
+            help='Number of rows processed per batch.',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rebuild renditions even when they are up to date.',
+        )
+
+    def handle(self, *args, **options):
+        workers = max(options.get('workers') or 0, 0)
+        batch_size = max(options.get('batch_size') or 200, 1)
+        force = options.get('force')
+
+        pool = None
+        if workers:
+            # Дочерние процессы работают только с хранилищем; открытые
+            # соединения с БД им не передаём.
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
+
+        started = time.monotonic()
+        totals = {'checked': 0, 'built': 0, 'failed': 0}
+        try:
+            for label in options['models']:
+                model = RENDITION_MODELS[label]
+                counts = self.backfill_model(model, pool, batch_size, force)
+                for key, value in counts.items():
+                    totals[key] += value
+                self.stdout.write(
+                    f'{label}: checked={counts["checked"]} built={counts["built"]} failed={counts["failed"]}'
+                )
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        if totals['built']:
+            bump_catalog_version()
+            bump_category_tree_version()
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                'Image renditions finished: '
+                f'checked={totals["checked"]} built={totals["built"]} '
+                f'failed={totals["failed"]} time={elapsed:.1f}s'
+            )
+        )
+
+    def backfill_model(self, model, pool, batch_size, force):
+        field_name = model.rendition_source_field
+        queryset = (
+            model.objects.exclude(**{field_name: ''})
+            .exclude(**{f'{field_name}__isnull': True})
+            .only('id', field_name, 'image_renditions')
+            .order_by('pk')
+        )
+        counts = {'checked': 0, 'built': 0, 'failed': 0}
+        last_id = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                return counts
+            last_id = batch[-1].pk
+            counts['checked'] += len(batch)
+            stale = [
+                obj for obj in batch
+                if force or (obj.image_renditions or {}).get('source') != getattr(obj, field_name).name
+            ]
+            names = list(dict.fromkeys(getattr(obj, field_name).name for obj in stale))
+            if pool is not None:
+                built = dict(zip(names, pool.map(build_file_renditions, names)))
+            else:
+                built = {name: build_file_renditions(name) for name in names}
+            for obj in stale:
+                obj.image_renditions = built[getattr(obj, field_name).name]
+                counts['failed' if not obj.image_renditions['sizes'] else 'built'] += 1
+            if stale:
+                model.objects.bulk_update(stale, ['image_renditions'])
@@ -0,0 +1,56 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from integrations.image_mirror import mirror_external_images
+
+
+class Command(BaseCommand):
+    help = 'Download external ERP product images into MEDIA_ROOT and switch products to local URLs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Number of concurrent downloads (default: ERP_IMAGE_MIRROR_WORKERS).',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            dest='batch_size',
+            default=200,
+            help='Number of products processed per batch.',
+        )
+        parser.add_argument(
+            '--recheck-hours',
+            type=int,
+            dest='recheck_hours',
+            help='Skip URLs checked less than this many hours ago (default: ERP_IMAGE_MIRROR_RECHECK_HOURS).',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-check every URL regardless of when it was last checked.',
+        )
+
+    def handle(self, *args, **options):
+        recheck_hours = options.get('recheck_hours')
+        started = time.monotonic()
+        stats = mirror_external_images(
+            workers=options.get('workers'),
+            batch_size=max(options.get('batch_size') or 200, 1),
+            force=options.get('force'),
+            recheck_after=timedelta(hours=recheck_hours) if recheck_hours is not None else None,
+        )
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                'Image mirror finished: '
+                f"products={stats['products']} updated={stats['products_updated']} "
+                f"urls={stats['urls']} downloaded={stats['downloaded']} "
+                f"deduplicated={stats['deduplicated']} not_modified={stats['not_modified']} "
+                f"unchanged={stats['unchanged']} skipped={stats['skipped']} "
+                f"failed={stats['failed']} time={elapsed:.1f}s"
+            )
+        )
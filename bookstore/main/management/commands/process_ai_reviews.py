@@ -0,0 +1,60 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.ai_reviews import process_ai_review_jobs
+from main.deepseek import DeepSeekConfigurationError, build_review_service
+
+
+class Command(BaseCommand):
+    help = 'Run queued DeepSeek review jobs with a concurrency and rate limit.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            help='Number of parallel DeepSeek requests (default: DEEPSEEK_WORKER_CONCURRENCY).',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            help='Maximum DeepSeek requests per minute (default: DEEPSEEK_RATE_LIMIT_PER_MINUTE).',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            dest='poll_interval',
+            default=1.0,
+            help='Seconds to wait before checking an empty queue again.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit when no runnable jobs are left instead of waiting for new ones.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            service = build_review_service()
+        except DeepSeekConfigurationError as exc:
+            raise CommandError(str(exc)) from exc
+        concurrency = options.get('concurrency') or int(getattr(settings, 'DEEPSEEK_WORKER_CONCURRENCY', 2))
+        rate = options.get('rate') or float(getattr(settings, 'DEEPSEEK_RATE_LIMIT_PER_MINUTE', 30))
+        started = time.monotonic()
+        stats = process_ai_review_jobs(
+            service,
+            concurrency=max(concurrency, 1),
+            rate_per_minute=rate,
+            once=options.get('once'),
+            poll_interval=options.get('poll_interval'),
+            stream=getattr(settings, 'DEEPSEEK_STREAM_REVIEWS', False),
+        )
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                'AI review jobs processed: '
+                f"done={stats['done']} retried={stats['retried']} failed={stats['failed']} "
+                f"time={elapsed:.1f}s"
+            )
+        )
@@ -0,0 +1,61 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from main.stale_visitors import purge_stale_visitors
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete expired sessions and the anonymous carts and favorite lists they left behind. '
+        'Works in small chunks with one short transaction each; intended to run from cron (e.g. hourly).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            dest='chunk_size',
+            default=1000,
+            help='Rows deleted per transaction.',
+        )
+        parser.add_argument(
+            '--grace-hours',
+            type=float,
+            dest='grace_hours',
+            default=24,
+            help='Keep carts and favorite lists updated within this many hours.',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='Seconds to sleep between chunks.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            dest='dry_run',
+            help='Only count rows that would be deleted.',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options.get('dry_run')
+        started = time.monotonic()
+        stats = purge_stale_visitors(
+            chunk_size=max(options.get('chunk_size') or 1000, 1),
+            dry_run=dry_run,
+            grace=timedelta(hours=max(options.get('grace_hours') or 0, 0)),
+            pause=max(options.get('pause') or 0, 0),
+        )
+        elapsed = time.monotonic() - started
+        rate = stats.rows / elapsed if elapsed else 0.0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Stale visitors {'found (dry run)' if dry_run else 'purged'}: "
+                f'sessions={stats.sessions} carts={stats.carts} cart_items={stats.cart_items} '
+                f'favorite_lists={stats.favorite_lists} favorite_items={stats.favorite_items} '
+                f'rows={stats.rows} rate={rate:.0f}/s time={elapsed:.1f}s'
+            )
+        )
@@ -0,0 +1,90 @@
+import time
+from collections import Counter
+from datetime import datetime, time as dt_time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from main.models import ProductRelation
+from main.relations import (
+    PRODUCT_RELATIONS_LIMIT,
+    collect_active_product_ids,
+    iter_product_batches,
+    rebuild_product_relations,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the "customers also bought" table from orders, favorites and carts, '
+        'falling back to same-author/same-genre products.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            dest='batch_size',
+            default=500,
+            help='Number of products processed per batch (one transaction each).',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=PRODUCT_RELATIONS_LIMIT,
+            help='Number of related products stored per product.',
+        )
+        parser.add_argument(
+            '--since',
+            help=(
+                'Only rebuild products from orders, favorites and carts active since '
+                'this date or datetime (ISO 8601). By default every published product is rebuilt.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(options.get('batch_size') or 500, 1)
+        limit = max(options.get('limit') or PRODUCT_RELATIONS_LIMIT, 1)
+        since = self.parse_since(options.get('since'))
+
+        product_ids = None
+        if since is not None:
+            product_ids = collect_active_product_ids(since)
+
+        started = time.monotonic()
+        processed = 0
+        written = Counter()
+        for batch in iter_product_batches(batch_size, product_ids):
+            written.update(rebuild_product_relations(batch, limit=limit))
+            processed += len(batch)
+            self.stdout.write(f'Processed {processed} products...')
+
+        removed = 0
+        if since is None:
+            removed, _ = ProductRelation.objects.filter(product__is_published=False).delete()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                'Product relations rebuilt: '
+                f'products={processed} relations={sum(written.values())} '
+                f'co_occurrence={written[ProductRelation.SOURCE_CO_OCCURRENCE]} '
+                f'author={written[ProductRelation.SOURCE_AUTHOR]} '
+                f'genre={written[ProductRelation.SOURCE_GENRE]} '
+                f'removed={removed} time={elapsed:.1f}s'
+            )
+        )
+
+    def parse_since(self, value):
+        if not value:
+            return None
+        since = parse_datetime(value)
+        if since is None:
+            date = parse_date(value)
+            if date is None:
+                raise CommandError(f'Invalid --since value: {value}')
+            since = datetime.combine(date, dt_time.min)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
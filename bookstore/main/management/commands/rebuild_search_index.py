@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from main.models import Product
+from main.search import refresh_search_vector
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search vector of products in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            dest='batch_size',
+            default=1000,
+            help='Number of products updated per statement.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(options.get('batch_size') or 1000, 1)
+
+        updated = 0
+        last_id = 0
+        while True:
+            batch_ids = list(
+                Product.objects.filter(pk__gt=last_id)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch_ids:
+                break
+            last_id = batch_ids[-1]
+            updated += refresh_search_vector(batch_ids)
+            if options.get('verbosity', 1) > 1:
+                self.stdout.write(f'Indexed {updated} products (last id {last_id})')
+
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt: products={updated}'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from main.catalog_bounds import refresh_catalog_bounds
+from main.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Recalculate stored price/year bounds for every category and the whole catalog.'
+
+    def handle(self, *args, **options):
+        category_ids = [None, *Category.objects.values_list('pk', flat=True)]
+        refreshed = refresh_catalog_bounds(category_ids)
+        self.stdout.write(self.style.SUCCESS(f'Catalog bounds refreshed: rows={refreshed}'))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.popularity import refresh_popularity_scores
+from main.view_counter import product_views
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalculate product popularity_score from page views, favorites and recent order lines. '
+        'Intended to run from cron (e.g. hourly).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            dest='batch_size',
+            default=5000,
+            help='Width of the product id range updated by one statement.',
+        )
+        parser.add_argument(
+            '--order-days',
+            type=int,
+            dest='order_days',
+            help='Only count order lines from the last N days (default: POPULARITY_ORDER_DAYS).',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        # Просмотры, накопленные в этом процессе (например, при запуске из shell).
+        product_views.flush()
+        stats = refresh_popularity_scores(
+            batch_size=max(options.get('batch_size') or 5000, 1),
+            order_days=options.get('order_days'),
+        )
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                'Popularity refreshed: '
+                f"batches={stats['batches']} updated={stats['updated']} time={elapsed:.1f}s"
+            )
+        )
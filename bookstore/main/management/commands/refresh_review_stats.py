@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.models import Product
+from main.review_stats import REVIEW_STATS_FIELDS, collect_review_stats, empty_review_stats
+
+
+class Command(BaseCommand):
+    help = 'Backfill or verify stored product review stats (total, average and rating histogram).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report mismatches, do not write anything.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            dest='batch_size',
+            default=1000,
+            help='Number of products processed per batch.',
+        )
+
+    def handle(self, *args, **options):
+        check_only = options.get('check')
+        batch_size = max(options.get('batch_size') or 1000, 1)
+
+        checked = 0
+        mismatched = 0
+        last_id = 0
+        while True:
+            batch = list(
+                Product.objects.filter(pk__gt=last_id)
+                .order_by('pk')
+                .only('id', *REVIEW_STATS_FIELDS)[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].pk
+            actual = collect_review_stats(product.pk for product in batch)
+            stale = []
+            for product in batch:
+                stats = actual.get(product.pk) or empty_review_stats()
+                if self.is_stale(product, stats):
+                    if check_only:
+                        self.stdout.write(
+                            f'Product {product.pk}: stored={product.reviews_total}/{product.reviews_average:.2f} '
+                            f"actual={stats['reviews_total']}/{stats['reviews_average']:.2f}"
+                        )
+                    for name, value in stats.items():
+                        setattr(product, name, value)
+                    stale.append(product)
+            if stale and not check_only:
+                Product.objects.bulk_update(stale, REVIEW_STATS_FIELDS)
+            checked += len(batch)
+            mismatched += len(stale)
+
+        if check_only and mismatched:
+            raise CommandError(f'Review stats mismatch: {mismatched} of {checked} products.')
+        action = 'mismatched' if check_only else 'updated'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Review stats finished: products={checked} {action}={mismatched}'
+            )
+        )
+
+    @staticmethod
+    def is_stale(product, stats):
+        for name, value in stats.items():
+            stored = getattr(product, name)
+            if name == 'reviews_average':
+                if abs(stored - value) > 1e-6:
+                    return True
+            elif stored != value:
+                return True
+        return False
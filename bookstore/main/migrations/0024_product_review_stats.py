@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:37
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_review_stats(apps, schema_editor):
+    Product = apps.get_model('main', 'Product')
+    ProductReview = apps.get_model('main', 'ProductReview')
+    public_reviews = (
+        ProductReview.objects.filter(product=OuterRef('pk'), is_public=True)
+        .values('product')
+        .order_by()
+    )
+    Product.objects.filter(
+        pk__in=ProductReview.objects.values('product_id'),
+    ).update(
+        reviews_total=Coalesce(
+            Subquery(public_reviews.annotate(total=Count('id')).values('total')),
+            Value(0),
+        ),
+        reviews_average=Coalesce(
+            Subquery(public_reviews.annotate(average=Avg('rating')).values('average')),
+            Value(0.0),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0023_category_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='reviews_average',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reviews_total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_review_stats, migrations.RunPython.noop),
+    ]
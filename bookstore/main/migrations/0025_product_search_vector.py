@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:39
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Value
+from django.db.models.functions import Replace
+
+
+def backfill_search_vector(apps, schema_editor):
+    Product = apps.get_model('main', 'Product')
+    Product.objects.update(
+        search_vector=(
+            SearchVector('name', weight='A', config='russian')
+            + SearchVector(Replace('isbn', Value('-'), Value('')), weight='A', config='simple')
+            + SearchVector('authors', weight='B', config='russian')
+            + SearchVector('publisher', weight='C', config='russian')
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0024_product_review_stats'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='main_product_search_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='main_product_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['authors'], name='main_product_authors_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunPython(backfill_search_vector, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:45
+
+import re
+
+from django.db import migrations, models
+
+AUTHOR_SEPARATORS_RE = re.compile(r'[,;/]')
+
+
+def backfill_authors(apps, schema_editor):
+    Author = apps.get_model('main', 'Author')
+    Product = apps.get_model('main', 'Product')
+    AuthorProduct = Author.products.through
+
+    authors = {}
+    links = []
+    rows = Product.objects.exclude(authors='').values_list('pk', 'authors', 'is_published')
+    for product_id, value, is_published in rows.iterator():
+        seen = set()
+        for part in AUTHOR_SEPARATORS_RE.split(value):
+            name = ' '.join(part.split())[:255]
+            key = name.lower()
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            entry = authors.setdefault(key, {'name': name, 'count': 0})
+            if is_published:
+                entry['count'] += 1
+            links.append((key, product_id))
+    Author.objects.bulk_create(
+        [
+            Author(name=entry['name'], name_lower=key, products_count=entry['count'])
+            for key, entry in authors.items()
+        ],
+        batch_size=1000,
+    )
+    author_ids = dict(Author.objects.values_list('name_lower', 'pk'))
+    AuthorProduct.objects.bulk_create(
+        [AuthorProduct(author_id=author_ids[key], product_id=product_id) for key, product_id in links],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0025_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Author',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('name_lower', models.CharField(editable=False, max_length=255, unique=True)),
+                ('products_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('products', models.ManyToManyField(blank=True, related_name='author_records', to='main.product')),
+            ],
+            options={
+                'verbose_name': 'Автор',
+                'verbose_name_plural': 'Авторы',
+                'ordering': ('-products_count', 'name'),
+            },
+        ),
+        migrations.RunPython(backfill_authors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0026_author'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogBounds',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('products_count', models.PositiveIntegerField(default=0)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=0, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=0, max_digits=10, null=True)),
+                ('min_year', models.PositiveIntegerField(blank=True, null=True)),
+                ('max_year', models.PositiveIntegerField(blank=True, null=True)),
+                ('price_preset_counts', models.JSONField(blank=True, default=dict)),
+                ('year_presets', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='bounds', to='main.category')),
+            ],
+            options={
+                'verbose_name': 'Границы фильтров каталога',
+                'verbose_name_plural': 'Границы фильтров каталога',
+                'constraints': [models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('category',), name='main_catalogbounds_single_global')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:52
+
+import django.db.models.fields.json
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индексы строятся CONCURRENTLY, чтобы не блокировать запись в main_product.
+    atomic = False
+
+    dependencies = [
+        ('main', '0027_catalog_bounds'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-created_at', '-id'], name='main_product_pub_created'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['category', '-created_at', '-id'], name='main_product_pub_cat_created'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['collection', '-created_at'], name='main_product_pub_coll_created'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('in_stock', True), ('is_published', True)), fields=['-updated_at'], name='main_product_instock_updated'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['category', 'price', 'id'], name='main_product_pub_cat_price'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['price', 'id'], name='main_product_pub_price'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['category', 'year'], name='main_product_pub_cat_year'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['year'], name='main_product_pub_year'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(django.db.models.fields.json.KeyTextTransform('vinyl_directtion', 'attributes'), condition=models.Q(('is_published', True)), name='main_product_pub_directtion'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:53
+
+from django.db import migrations, models
+
+CARD_IMAGES_LIMIT = 5
+
+
+def _external_urls(images):
+    if not isinstance(images, list):
+        return []
+    entries = []
+    for image in images:
+        if not isinstance(image, dict) or not image.get('url'):
+            continue
+        try:
+            position = int(image.get('position', image.get('order', 0)))
+        except (TypeError, ValueError):
+            position = 0
+        entries.append((position, image['url']))
+    entries.sort(key=lambda entry: entry[0])
+    return [url for _, url in entries]
+
+
+def backfill_card_images(apps, schema_editor):
+    Product = apps.get_model('main', 'Product')
+    batch = []
+    products = Product.objects.only('main_image', 'external_image_url', 'external_images')
+    for product in products.iterator(chunk_size=1000):
+        urls = []
+        if product.main_image:
+            urls.append(product.main_image.url)
+        if product.external_image_url:
+            urls.append(product.external_image_url)
+        urls.extend(_external_urls(product.external_images))
+        urls = list(dict.fromkeys(url for url in urls if url))
+        product.primary_image_url = urls[0] if urls else ''
+        product.card_image_urls = urls[:CARD_IMAGES_LIMIT]
+        batch.append(product)
+        if len(batch) >= 1000:
+            Product.objects.bulk_update(batch, ['primary_image_url', 'card_image_urls'])
+            batch = []
+    if batch:
+        Product.objects.bulk_update(batch, ['primary_image_url', 'card_image_urls'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0028_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='card_image_urls',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='primary_image_url',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.RunPython(backfill_card_images, migrations.RunPython.noop),
+    ]
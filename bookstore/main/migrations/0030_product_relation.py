@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0029_product_card_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRelation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField(default=0)),
+                ('source', models.CharField(choices=[('co_occurrence', 'Совместные покупки'), ('author', 'Тот же автор'), ('genre', 'Тот же жанр')], max_length=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relations', to='main.product')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reverse_relations', to='main.product')),
+            ],
+            options={
+                'verbose_name': 'Связанный товар',
+                'verbose_name_plural': 'Связанные товары',
+                'indexes': [models.Index(fields=['product', 'position'], name='main_prodrel_position_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'related'), name='main_productrelation_unique_pair')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0031_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MirroredImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image_renditions', models.JSONField(blank=True, default=dict, editable=False)),
+                ('source_url', models.URLField(max_length=1000, unique=True)),
+                ('image', models.ImageField(blank=True, max_length=255, upload_to='mirror/')),
+                ('content_hash', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('etag', models.CharField(blank=True, max_length=255)),
+                ('last_modified', models.CharField(blank=True, max_length=64)),
+                ('last_error', models.CharField(blank=True, max_length=255)),
+                ('checked_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Локальная копия изображения',
+                'verbose_name_plural': 'Локальные копии изображений',
+            },
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='mirrored_images',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0032_mirrored_images'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIReview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prompt_hash', models.CharField(max_length=64)),
+                ('model', models.CharField(max_length=100)),
+                ('text', models.TextField()),
+                ('generated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ai_reviews', to='main.product')),
+            ],
+            options={
+                'verbose_name': 'Рецензия DeepSeek',
+                'verbose_name_plural': 'Рецензии DeepSeek',
+                'indexes': [models.Index(fields=['prompt_hash', '-generated_at'], name='main_aireview_hash_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'prompt_hash'), name='main_aireview_unique_prompt')],
+            },
+        ),
+    ]
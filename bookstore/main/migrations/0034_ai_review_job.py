@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0033_ai_review'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIReviewJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prompt_hash', models.CharField(max_length=64)),
+                ('prompt', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ai_review_jobs', to='main.product')),
+                ('review', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to='main.aireview')),
+            ],
+            options={
+                'verbose_name': 'Задание на рецензию DeepSeek',
+                'verbose_name_plural': 'Задания на рецензии DeepSeek',
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['available_at'], name='main_aireviewjob_pending_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ('pending', 'running'))), fields=('prompt_hash',), name='main_aireviewjob_single_active')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0034_ai_review_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIReviewBulkRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('filters', models.JSONField(blank=True, default=dict)),
+                ('last_product_id', models.PositiveIntegerField(default=0)),
+                ('stats', models.JSONField(blank=True, default=dict)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Пакетная генерация рецензий DeepSeek',
+                'verbose_name_plural': 'Пакетные генерации рецензий DeepSeek',
+            },
+        ),
+    ]
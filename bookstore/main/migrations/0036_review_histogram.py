@@ -0,0 +1,59 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:17
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_review_histogram(apps, schema_editor):
+    Product = apps.get_model('main', 'Product')
+    ProductReview = apps.get_model('main', 'ProductReview')
+    counts = {}
+    for rating in range(1, 6):
+        reviews = (
+            ProductReview.objects.filter(product=OuterRef('pk'), is_public=True, rating=rating)
+            .values('product')
+            .order_by()
+            .annotate(total=Count('id'))
+            .values('total')
+        )
+        counts[f'reviews_rating_{rating}'] = Coalesce(Subquery(reviews), Value(0))
+    Product.objects.filter(
+        pk__in=ProductReview.objects.values('product_id'),
+    ).update(**counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0035_ai_review_bulk_run'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='reviews_rating_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reviews_rating_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reviews_rating_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reviews_rating_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reviews_rating_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_review_histogram, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0036_review_histogram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='popularity_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='views_count',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0037_product_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aireviewjob',
+            name='partial_text',
+            field=models.TextField(blank=True),
+        ),
+    ]
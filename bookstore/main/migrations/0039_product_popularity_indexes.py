@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:52
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индексы строятся CONCURRENTLY, чтобы не блокировать запись в main_product.
+    atomic = False
+
+    dependencies = [
+        ('main', '0038_ai_review_job_partial_text'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-popularity_score', '-id'], name='main_product_pub_popular'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['category', '-popularity_score', '-id'], name='main_product_pub_cat_popular'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:55
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индекс строится CONCURRENTLY, чтобы не блокировать запись в main_productreview.
+    atomic = False
+
+    dependencies = [
+        ('main', '0039_product_popularity_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='productreview',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['product', '-created_at', '-id'], name='main_review_public_created'),
+        ),
+    ]
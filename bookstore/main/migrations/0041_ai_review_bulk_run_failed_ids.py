@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0040_review_public_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aireviewbulkrun',
+            name='failed_product_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
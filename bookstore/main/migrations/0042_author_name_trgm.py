@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:05
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Индекс строится CONCURRENTLY, чтобы не блокировать запись в main_author.
+    atomic = False
+
+    dependencies = [
+        ('main', '0041_ai_review_bulk_run_failed_ids'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='author',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name_lower'], name='main_author_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
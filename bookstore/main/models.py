@@ -1,10 +1,53 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.fields.json import KeyTextTransform
 from django.utils import timezone
 from common.slugs import slugify_translit
 from .enums import ProductConditionChoices, ProductCollections
+from .renditions import build_file_renditions
 
 
-class Category(models.Model):
+class ImageRenditionsMixin(models.Model):
+    """
+    Хранит в image_renditions уменьшенные WebP/JPEG-версии изображения из
+    поля rendition_source_field. Версии строятся при сохранении, если файл
+    изменился, и командой generate_image_renditions для уже загруженных.
+    """
+    rendition_source_field = 'image'
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.refresh_image_renditions()
+        elif self.rendition_source_field in update_fields and self.refresh_image_renditions():
+            kwargs['update_fields'] = {*update_fields, 'image_renditions'}
+        super().save(*args, **kwargs)
+
+    def refresh_image_renditions(self, force=False) -> bool:
+        """
+        Пересобирает версии, если исходный файл сменился (или force).
+        Новый загруженный файл сначала сохраняется в хранилище, чтобы версии
+        ссылались на его окончательное имя. Возвращает True, если поле изменилось.
+        """
+        field_file = getattr(self, self.rendition_source_field)
+        if not field_file:
+            changed = bool(self.image_renditions)
+            self.image_renditions = {}
+            return changed
+        if not field_file._committed:
+            field_file.save(field_file.name, field_file.file, save=False)
+        elif not force and (self.image_renditions or {}).get('source') == field_file.name:
+            return False
+        self.image_renditions = build_file_renditions(field_file.name, field_file.storage)
+        return True
+
+
+class Category(ImageRenditionsMixin):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=150, unique=True, blank=True)
     order = models.PositiveIntegerField(default=0, verbose_name='Порядок')
@@ -28,7 +71,7 @@ class Category(models.Model):
         return self.name
 
 
-class Genre(models.Model):
+class Genre(ImageRenditionsMixin):
     category = models.ForeignKey(
         Category,
         on_delete=models.CASCADE,
@@ -54,7 +97,50 @@ class Genre(models.Model):
         return self.name
 
 
-class Product(models.Model):
+# Поля, которые нужны карточке товара в списках (каталог, подборки,
+# избранное, поиск). Тяжёлые description/attributes/external_images не читаются.
+PRODUCT_CARD_FIELDS = (
+    'id',
+    'name',
+    'slug',
+    'authors',
+    'year',
+    'collection',
+    'price',
+    'old_price',
+    'currency',
+    'primary_image_url',
+    'card_image_urls',
+    'image_renditions',
+    'mirrored_images',
+    'reviews_total',
+    'reviews_average',
+    'popularity_score',
+    'created_at',
+    'genre__name',
+)
+CARD_IMAGES_LIMIT = 5
+
+
+CARD_IMAGE_SOURCE_FIELDS = frozenset({
+    'main_image',
+    'external_image_url',
+    'external_images',
+    'mirrored_images',
+})
+
+
+class ProductQuerySet(models.QuerySet):
+    def cards(self):
+        """
+        Лёгкая проекция для карточек: только поля карточки и имя жанра.
+        """
+        return self.select_related('genre').only(*PRODUCT_CARD_FIELDS)
+
+
+class Product(ImageRenditionsMixin):
+    rendition_source_field = 'main_image'
+
     external_id = models.CharField(
         max_length=64,
         null=True,
@@ -127,19 +213,161 @@ class Product(models.Model):
     external_images = models.JSONField(default=list, blank=True)
     meta_title = models.CharField(max_length=255, blank=True)
     meta_description = models.CharField(max_length=300, blank=True)
+    reviews_total = models.PositiveIntegerField(default=0, editable=False)
+    reviews_average = models.FloatField(default=0, editable=False)
+    # Гистограмма оценок публичных отзывов: сколько отзывов с 1..5 звёздами.
+    reviews_rating_1 = models.PositiveIntegerField(default=0, editable=False)
+    reviews_rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    reviews_rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    reviews_rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    reviews_rating_5 = models.PositiveIntegerField(default=0, editable=False)
+    # Просмотры страницы товара; пишутся пачками из main.view_counter.
+    views_count = models.PositiveBigIntegerField(default=0, editable=False)
+    # Смесь просмотров, избранного и заказов для сортировки «По популярности»;
+    # пересчитывается командой refresh_popularity.
+    popularity_score = models.FloatField(default=0, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+    primary_image_url = models.CharField(max_length=500, blank=True, editable=False)
+    card_image_urls = models.JSONField(default=list, blank=True, editable=False)
+    # Локальные копии внешних изображений: {внешний URL: {'url', 'renditions'}}.
+    # Заполняется командой mirror_erp_images.
+    mirrored_images = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='main_product_search_gin'),
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='main_product_name_trgm'),
+            GinIndex(fields=['authors'], opclasses=['gin_trgm_ops'], name='main_product_authors_trgm'),
+            # Витрина читает только опубликованные товары, поэтому индексы
+            # под её запросы частичные (WHERE is_published).
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=models.Q(is_published=True),
+                name='main_product_pub_created',
+            ),
+            models.Index(
+                fields=['category', '-created_at', '-id'],
+                condition=models.Q(is_published=True),
+                name='main_product_pub_cat_created',
+            ),
+            models.Index(
+                fields=['-popularity_score', '-id'],
+                condition=models.Q(is_published=True),
+                name='main_product_pub_popular',
+            ),
+            models.Index(
+                fields=['category', '-popularity_score', '-id'],
+                condition=models.Q(is_published=True),
+                name='main_product_pub_cat_popular',
+            ),
+            models.Index(
+                fields=['collection', '-created_at'],
+                condition=models.Q(is_published=True),
+                name='main_product_pub_coll_created',
+            ),
+            models.Index(
+                fields=['-updated_at'],
+                condition=models.Q(is_published=True, in_stock=True),
+                name='main_product_instock_updated',
+            ),
+            models.Index(
+                fields=['category', 'price', 'id'],
+                condition=models.Q(is_published=True),
+                name='main_product_pub_cat_price',
+            ),
+            models.Index(
+                fields=['price', 'id'],
+                condition=models.Q(is_published=True),
+                name='main_product_pub_price',
+            ),
+            models.Index(
+                fields=['category', 'year'],
+                condition=models.Q(is_published=True),
+                name='main_product_pub_cat_year',
+            ),
+            models.Index(
+                fields=['year'],
+                condition=models.Q(is_published=True),
+                name='main_product_pub_year',
+            ),
+            models.Index(
+                KeyTextTransform('vinyl_directtion', 'attributes'),
+                condition=models.Q(is_published=True),
+                name='main_product_pub_directtion',
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if self.genre:
             self.category = self.genre.category
         if not self.slug:
             self.slug = slugify_translit(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            # Версии строятся до URL карточки: новый main_image к этому
+            # моменту уже лежит в хранилище под окончательным именем.
+            self.refresh_image_renditions()
+            self.refresh_card_images()
+        elif CARD_IMAGE_SOURCE_FIELDS.intersection(update_fields):
+            self.refresh_image_renditions()
+            self.refresh_card_images()
+            kwargs['update_fields'] = {
+                *update_fields,
+                'primary_image_url',
+                'card_image_urls',
+                'image_renditions',
+            }
         super().save(*args, **kwargs)
+
+    def refresh_card_images(self):
+        """
+        Пересчитывает сохранённые URL изображений карточки из main_image,
+        external_image_url и external_images. Внешние URL, для которых есть
+        локальная копия, заменяются на неё. Новый загруженный main_image
+        сначала сохраняется в хранилище: до этого его url не содержит
+        upload_to и имени, которое выберет хранилище.
+        """
+        urls = []
+        if self.main_image:
+            if not self.main_image._committed:
+                self.main_image.save(self.main_image.name, self.main_image.file, save=False)
+            urls.append(self.main_image.url)
+        if self.external_image_url:
+            urls.append(self.mirrored_image_url(self.external_image_url))
+        for image in self.external_images_sorted:
+            urls.append(self.mirrored_image_url(image['url']))
+        urls = list(dict.fromkeys(url for url in urls if url))
+        self.primary_image_url = urls[0] if urls else ''
+        self.card_image_urls = urls[:CARD_IMAGES_LIMIT]
+
+    @property
+    def card_images(self):
+        images = [{'url': url, 'alt': self.name} for url in self.card_image_urls or []]
+        self._attach_renditions(images)
+        return images
+
+    def mirrored_image_url(self, url):
+        mirrored = (self.mirrored_images or {}).get(url) or {}
+        return mirrored.get('url') or url
+
+    def _attach_renditions(self, images):
+        by_url = {
+            mirrored['url']: mirrored.get('renditions') or {}
+            for mirrored in (self.mirrored_images or {}).values()
+            if mirrored.get('url')
+        }
+        if self.image_renditions:
+            by_url[self.image_renditions.get('url')] = self.image_renditions
+        for image in images:
+            renditions = by_url.get(image['url'])
+            if renditions and renditions.get('sizes'):
+                image['renditions'] = renditions
         
     def _format_amount(self, amount):
         """
@@ -161,18 +389,6 @@ class Product(models.Model):
             return ''
         return self._format_amount(self.old_price)
 
-    @property
-    def primary_image_url(self):
-        if self.main_image:
-            return self.main_image.url
-        if self.external_image_url:
-            return self.external_image_url
-        for image in self.external_images_sorted:
-            url = image.get('url')
-            if url:
-                return url
-        return ''
-
     @property
     def external_images_sorted(self):
         images = self.external_images if isinstance(self.external_images, list) else []
@@ -212,9 +428,26 @@ class Product(models.Model):
 
         add_image(self.primary_image_url, f'Обложка: {self.name}')
         for image in self.external_images_sorted:
-            add_image(image.get('url'), image.get('alt'))
+            add_image(self.mirrored_image_url(image.get('url')), image.get('alt'))
+        self._attach_renditions(images)
         return images
 
+    @property
+    def reviews_histogram(self):
+        """
+        Строки гистограммы оценок от 5 звёзд к 1 по сохранённым счётчикам.
+        """
+        total = self.reviews_total or 0
+        rows = []
+        for rating in range(5, 0, -1):
+            count = getattr(self, f'reviews_rating_{rating}') or 0
+            rows.append({
+                'rating': rating,
+                'count': count,
+                'percent': round(count * 100 / total) if total else 0,
+            })
+        return rows
+
     @property
     def dimensions_display(self):
         if not isinstance(self.dimensions_cm, (list, tuple)):
@@ -241,6 +474,44 @@ class Product(models.Model):
         return self.name
 
 
+class Author(models.Model):
+    """
+    Нормализованный справочник авторов, собранный из строки Product.authors.
+    name_lower хранит ключ для регистронезависимого поиска по префиксу:
+    для unique CharField Django на PostgreSQL создаёт ещё и индекс
+    varchar_pattern_ops, поэтому LIKE 'префикс%' идёт по индексу, а поиск
+    по началу слова внутри имени — по триграммному индексу.
+    """
+    name = models.CharField(max_length=255)
+    name_lower = models.CharField(max_length=255, unique=True, editable=False)
+    products = models.ManyToManyField(
+        Product,
+        related_name='author_records',
+        blank=True,
+    )
+    products_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        ordering = ('-products_count', 'name')
+        indexes = [
+            # Поиск по началу слова внутри имени: LIKE '% толст%'.
+            GinIndex(fields=['name_lower'], opclasses=['gin_trgm_ops'], name='main_author_name_trgm'),
+        ]
+        verbose_name = 'Автор'
+        verbose_name_plural = 'Авторы'
+
+    def save(self, *args, **kwargs):
+        self.name_lower = normalize_author_name(self.name)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.name
+
+
+def normalize_author_name(name: str) -> str:
+    return ' '.join((name or '').split()).lower()
+
+
 class ProductReview(models.Model):
     product = models.ForeignKey(
         Product,
@@ -257,6 +528,14 @@ class ProductReview(models.Model):
         ordering = ('-created_at',)
         verbose_name = 'Отзыв'
         verbose_name_plural = 'Отзывы'
+        indexes = [
+            # Лента отзывов на странице товара листается курсором по (created_at, id).
+            models.Index(
+                fields=['product', '-created_at', '-id'],
+                condition=models.Q(is_public=True),
+                name='main_review_public_created',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.author_name}: {self.rating}'
@@ -295,7 +574,7 @@ class BookPurchasePhoto(models.Model):
         return f"Фото заявки #{self.request_id}"
 
 
-class Banner(models.Model):
+class Banner(ImageRenditionsMixin):
     title = models.CharField(max_length=255)
     image = models.ImageField(upload_to='banners/main')
     link = models.URLField(blank=True)
@@ -322,6 +601,126 @@ class DeepSeekPrompt(models.Model):
         verbose_name_plural = 'Промпты DeepSeek'
 
 
+class AIReview(models.Model):
+    """
+    Сохранённая рецензия DeepSeek. prompt_hash — хэш шаблона промпта, модели
+    и сведений о товаре: пока они не меняются, рецензия берётся из БД
+    и API повторно не вызывается.
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='ai_reviews',
+    )
+    prompt_hash = models.CharField(max_length=64)
+    model = models.CharField(max_length=100)
+    text = models.TextField()
+    generated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Рецензия DeepSeek'
+        verbose_name_plural = 'Рецензии DeepSeek'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product', 'prompt_hash'],
+                name='main_aireview_unique_prompt',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['prompt_hash', '-generated_at'], name='main_aireview_hash_idx'),
+        ]
+
+    def __str__(self):
+        return f'Рецензия: {self.product_id} ({self.generated_at:%Y-%m-%d})'
+
+
+class AIReviewJob(models.Model):
+    """
+    Задание на генерацию рецензии для воркера process_ai_reviews. На один
+    prompt_hash допускается одно активное задание, поэтому наплыв
+    посетителей на страницу товара ставит в очередь один вызов DeepSeek.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'В очереди'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Готово'),
+        (STATUS_FAILED, 'Ошибка'),
+    )
+    ACTIVE_STATUSES = (STATUS_PENDING, STATUS_RUNNING)
+
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='ai_review_jobs',
+    )
+    prompt_hash = models.CharField(max_length=64)
+    prompt = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    review = models.ForeignKey(
+        AIReview,
+        on_delete=models.SET_NULL,
+        related_name='jobs',
+        null=True,
+        blank=True,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.CharField(max_length=255, blank=True)
+    # Текст, полученный воркером из потока DeepSeek до конца ответа.
+    partial_text = models.TextField(blank=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Задание на рецензию DeepSeek'
+        verbose_name_plural = 'Задания на рецензии DeepSeek'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['prompt_hash'],
+                condition=models.Q(status__in=('pending', 'running')),
+                name='main_aireviewjob_single_active',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['available_at'],
+                condition=models.Q(status='pending'),
+                name='main_aireviewjob_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'Задание {self.pk}: {self.product_id} ({self.status})'
+
+
+class AIReviewBulkRun(models.Model):
+    """
+    Чекпойнт команды generate_ai_reviews. key — хэш фильтров запуска:
+    повторный запуск с теми же фильтрами сначала повторяет товары из
+    failed_product_ids, затем продолжает с last_product_id.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    filters = models.JSONField(default=dict, blank=True)
+    last_product_id = models.PositiveIntegerField(default=0)
+    failed_product_ids = models.JSONField(default=list, blank=True)
+    stats = models.JSONField(default=dict, blank=True)
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Пакетная генерация рецензий DeepSeek'
+        verbose_name_plural = 'Пакетные генерации рецензий DeepSeek'
+
+    def __str__(self):
+        return f'Генерация рецензий {self.key[:8]}: после {self.last_product_id}'
+
+
 class ErpProductSyncState(models.Model):
     last_synced_at = models.DateTimeField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -334,3 +733,110 @@ class ErpProductSyncState(models.Model):
         if self.last_synced_at:
             return f'ERP sync at {self.last_synced_at:%Y-%m-%d %H:%M:%S}'
         return 'ERP sync state'
+
+
+class CatalogBounds(models.Model):
+    """
+    Предрасчитанные границы цены и года для категории (category=None —
+    весь каталог). Обновляются при изменении товаров и используются
+    каталогом, пока не выбраны дополнительные фильтры.
+    """
+    category = models.OneToOneField(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='bounds',
+        null=True,
+        blank=True,
+    )
+    products_count = models.PositiveIntegerField(default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=0, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=0, null=True, blank=True)
+    min_year = models.PositiveIntegerField(null=True, blank=True)
+    max_year = models.PositiveIntegerField(null=True, blank=True)
+    price_preset_counts = models.JSONField(default=dict, blank=True)
+    year_presets = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Границы фильтров каталога'
+        verbose_name_plural = 'Границы фильтров каталога'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['category'],
+                condition=models.Q(category__isnull=True),
+                name='main_catalogbounds_single_global',
+            ),
+        ]
+
+    def __str__(self):
+        return f'Границы: {self.category or "весь каталог"}'
+
+
+class ProductRelation(models.Model):
+    """
+    Предрасчитанный список «с этим товаром также покупают». Заполняется
+    командой rebuild_product_relations, страница товара читает первые
+    позиции по индексу (product, position).
+    """
+    SOURCE_CO_OCCURRENCE = 'co_occurrence'
+    SOURCE_AUTHOR = 'author'
+    SOURCE_GENRE = 'genre'
+    SOURCE_CHOICES = (
+        (SOURCE_CO_OCCURRENCE, 'Совместные покупки'),
+        (SOURCE_AUTHOR, 'Тот же автор'),
+        (SOURCE_GENRE, 'Тот же жанр'),
+    )
+
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='relations',
+    )
+    related = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='reverse_relations',
+    )
+    position = models.PositiveSmallIntegerField()
+    score = models.FloatField(default=0)
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Связанный товар'
+        verbose_name_plural = 'Связанные товары'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product', 'related'],
+                name='main_productrelation_unique_pair',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'position'], name='main_prodrel_position_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} → {self.related_id} ({self.score:g})'
+
+
+class MirroredImage(ImageRenditionsMixin):
+    """
+    Локальная копия внешнего изображения из ERP. Файл назван по хэшу
+    содержимого, поэтому одинаковые картинки по разным URL хранятся один раз.
+    etag/last_modified/content_hash позволяют не скачивать неизменённые URL.
+    """
+    source_url = models.URLField(max_length=1000, unique=True)
+    image = models.ImageField(upload_to='mirror/', max_length=255, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    etag = models.CharField(max_length=255, blank=True)
+    last_modified = models.CharField(max_length=64, blank=True)
+    last_error = models.CharField(max_length=255, blank=True)
+    checked_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Локальная копия изображения'
+        verbose_name_plural = 'Локальные копии изображений'
+
+    def __str__(self):
+        return self.source_url
@@ -0,0 +1,90 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q, QuerySet
+
+CATALOG_PAGE_SIZE = 15
+CATALOG_NUMBERED_PAGES = 20
+PRODUCT_REVIEWS_PAGE_SIZE = 10
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+@dataclass
+class KeysetPage:
+    object_list: List[Any]
+    next_cursor: Optional[str]
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+
+def parse_order_by(order_by: str) -> Tuple[str, bool]:
+    """
+    Разбирает поле сортировки вида '-created_at' на имя поля и направление.
+    """
+    return order_by.lstrip('-'), order_by.startswith('-')
+
+
+def keyset_ordering(order_by: str) -> Tuple[str, str]:
+    field_name, descending = parse_order_by(order_by)
+    prefix = '-' if descending else ''
+    return f'{prefix}{field_name}', f'{prefix}id'
+
+
+def encode_cursor(sort_key: str, order_by: str, obj: Any) -> str:
+    field_name, _ = parse_order_by(order_by)
+    value = obj._meta.get_field(field_name).value_to_string(obj)
+    payload = json.dumps([sort_key, value, obj.pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, sort_key: str, order_by: str, model) -> Tuple[Any, int]:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        cursor_sort, raw_value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        field_name, _ = parse_order_by(order_by)
+        value = model._meta.get_field(field_name).to_python(raw_value)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValidationError, TypeError, ValueError) as exc:
+        raise InvalidCursor('Некорректный курсор пагинации.') from exc
+    if cursor_sort != sort_key or value is None:
+        raise InvalidCursor('Курсор относится к другой сортировке.')
+    return value, pk
+
+
+def paginate_keyset(
+    products: QuerySet,
+    sort_key: str,
+    order_by: str,
+    cursor: Optional[str] = None,
+    page_size: int = CATALOG_PAGE_SIZE,
+) -> KeysetPage:
+    """
+    Страница товаров «после курсора» без COUNT и OFFSET: порядок задаётся
+    полем сортировки и id, следующая страница начинается строго после
+    последней пары (значение, id). Берётся на одну строку больше, чтобы
+    понять, есть ли продолжение.
+    """
+    field_name, descending = parse_order_by(order_by)
+    products = products.order_by(*keyset_ordering(order_by))
+    if cursor:
+        value, pk = decode_cursor(cursor, sort_key, order_by, products.model)
+        lookup = 'lt' if descending else 'gt'
+        products = products.filter(
+            Q(**{f'{field_name}__{lookup}': value})
+            | Q(**{field_name: value, f'id__{lookup}': pk})
+        )
+    rows = list(products[:page_size + 1])
+    object_list = rows[:page_size]
+    next_cursor = None
+    if len(rows) > page_size:
+        next_cursor = encode_cursor(sort_key, order_by, object_list[-1])
+    return KeysetPage(object_list=object_list, next_cursor=next_cursor)
@@ -0,0 +1,82 @@
+from datetime import timedelta
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from favorites.models import FavoriteItem
+from orders.models import OrderItem
+
+from .catalog_cache import bump_catalog_version
+from .models import Product
+
+
+def popularity_weights() -> Dict[str, float]:
+    return {
+        'views': float(getattr(settings, 'POPULARITY_VIEW_WEIGHT', 0.1)),
+        'favorites': float(getattr(settings, 'POPULARITY_FAVORITE_WEIGHT', 3.0)),
+        'orders': float(getattr(settings, 'POPULARITY_ORDER_WEIGHT', 10.0)),
+    }
+
+
+def popularity_expression(orders_since, weights: Dict[str, float]):
+    """
+    Оценка популярности товара: просмотры + добавления в избранное +
+    купленные экземпляры в неотменённых заказах после orders_since,
+    каждое слагаемое со своим весом.
+    """
+    favorites = (
+        FavoriteItem.objects.filter(product=OuterRef('pk'))
+        .order_by()
+        .values('product')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    ordered = (
+        OrderItem.objects.filter(product=OuterRef('pk'), order__created_at__gte=orders_since)
+        .exclude(order__status='cancelled')
+        .order_by()
+        .values('product')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    return ExpressionWrapper(
+        F('views_count') * Value(weights['views'])
+        + Coalesce(Subquery(favorites), 0) * Value(weights['favorites'])
+        + Coalesce(Subquery(ordered), 0) * Value(weights['orders']),
+        output_field=FloatField(),
+    )
+
+
+def refresh_popularity_scores(
+    *,
+    batch_size: int = 5000,
+    order_days: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    Пересчитывает popularity_score диапазонами id: один UPDATE с
+    подзапросами на диапазон, строки с неизменившейся оценкой не
+    переписываются. Если что-то изменилось, сбрасывается кэш каталога.
+    """
+    if order_days is None:
+        order_days = int(getattr(settings, 'POPULARITY_ORDER_DAYS', 90))
+    score = popularity_expression(timezone.now() - timedelta(days=order_days), popularity_weights())
+    max_id = Product.objects.aggregate(max_id=Max('pk'))['max_id'] or 0
+    batches = 0
+    updated = 0
+    last_id = 0
+    while last_id < max_id:
+        upper = last_id + batch_size
+        updated += (
+            Product.objects.filter(pk__gt=last_id, pk__lte=upper)
+            .alias(new_score=score)
+            .exclude(popularity_score=F('new_score'))
+            .update(popularity_score=score)
+        )
+        batches += 1
+        last_id = upper
+    if updated:
+        bump_catalog_version()
+    return {'batches': batches, 'updated': updated}
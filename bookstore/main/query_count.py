@@ -0,0 +1,24 @@
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class QueryCounter:
+    """
+    Обёртка execute_wrapper, которая просто считает выполненные запросы.
+    В отличие от CaptureQueriesContext не включает debug-курсор и не копит SQL.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def count_queries(using=DEFAULT_DB_ALIAS):
+    counter = QueryCounter()
+    with connections[using].execute_wrapper(counter):
+        yield counter
@@ -0,0 +1,49 @@
+import threading
+import time
+from typing import Callable
+
+
+class TokenBucket:
+    """
+    Потокобезопасное ограничение частоты: rate токенов в секунду, не больше
+    capacity подряд. acquire() блокирует, пока не появится токен.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float = 1,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if rate <= 0:
+            raise ValueError('Rate must be positive.')
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated_at = clock()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, requests_per_minute: float, **kwargs) -> 'TokenBucket':
+        return cls(requests_per_minute / 60.0, **kwargs)
+
+    def acquire(self) -> float:
+        """
+        Забирает токен; возвращает, сколько секунд пришлось ждать.
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            self.sleep(delay)
+            waited += delay
@@ -0,0 +1,195 @@
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+from django.db import transaction
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+from cart.models import CartItem
+from favorites.models import FavoriteItem
+from orders.models import OrderItem
+
+from .authors import AuthorProduct
+from .models import Product, ProductRelation
+
+# Сколько связей хранится на товар: страница показывает 8, запас покрывает
+# товары, снятые с публикации между прогонами.
+PRODUCT_RELATIONS_LIMIT = 12
+# Источники совместной встречаемости: модель позиции, поле «корзины»,
+# поле даты активности для инкрементального прогона и вес одной встречи.
+CO_OCCURRENCE_SOURCES = (
+    (OrderItem, 'order', 'order__updated_at', 3.0),
+    (FavoriteItem, 'favorite_list', 'added_at', 2.0),
+    (CartItem, 'cart', 'added_at', 1.0),
+)
+
+
+def iter_product_batches(batch_size: int, product_ids: Optional[Set[int]] = None) -> Iterator[List[int]]:
+    """
+    Идёт по опубликованным товарам порциями по возрастанию id, не держа
+    в памяти весь список.
+    """
+    last_id = 0
+    while True:
+        queryset = Product.objects.filter(is_published=True, pk__gt=last_id)
+        if product_ids is not None:
+            queryset = queryset.filter(pk__in=product_ids)
+        batch = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return
+        last_id = batch[-1]
+        yield batch
+
+
+def collect_active_product_ids(since: datetime) -> Set[int]:
+    """
+    Товары из заказов, избранного и корзин, в которых была активность после
+    since: у всех товаров такой «корзины» могли измениться пары.
+    """
+    product_ids = set()
+    for model, basket_field, activity_field, _ in CO_OCCURRENCE_SOURCES:
+        baskets = (
+            model.objects.filter(**{f'{activity_field}__gte': since})
+            .values(basket_field)
+        )
+        product_ids.update(
+            model.objects.filter(**{f'{basket_field}__in': baskets})
+            # Сортировка по умолчанию (у FavoriteItem — '-added_at') попала бы
+            # в SELECT DISTINCT и размножила бы строки.
+            .order_by()
+            .values_list('product_id', flat=True)
+            .distinct()
+        )
+    return product_ids
+
+
+def score_co_occurrence(product_ids: Iterable[int]) -> Dict[int, Counter]:
+    """
+    Для каждого товара порции считает, в скольких заказах, списках избранного
+    и корзинах он встречался вместе с другими товарами. Одна встреча весит
+    столько, сколько указано у источника.
+    """
+    product_ids = list(product_ids)
+    scores = defaultdict(Counter)
+    for model, basket_field, _, weight in CO_OCCURRENCE_SOURCES:
+        rows = (
+            model.objects.filter(product_id__in=product_ids)
+            .values('product_id', other_id=F(f'{basket_field}__items__product_id'))
+            .annotate(baskets=Count(basket_field, distinct=True))
+            .order_by()
+        )
+        for row in rows.iterator():
+            if row['other_id'] != row['product_id']:
+                scores[row['product_id']][row['other_id']] += row['baskets'] * weight
+    return scores
+
+
+def collect_fallback_neighbours(products: List[Product], limit: int) -> Dict[int, List[tuple]]:
+    """
+    Соседи на случай, когда совместных покупок мало: сначала новинки тех же
+    авторов, затем того же жанра. Берутся первые limit + 1 товаров каждой
+    группы одним запросом с оконной функцией.
+    """
+    product_ids = [product.pk for product in products]
+    author_links = defaultdict(list)
+    for author_id, product_id in (
+        AuthorProduct.objects.filter(product_id__in=product_ids)
+        .values_list('author_id', 'product_id')
+    ):
+        author_links[product_id].append(author_id)
+
+    by_author = defaultdict(list)
+    author_ids = {author_id for ids in author_links.values() for author_id in ids}
+    if author_ids:
+        rows = (
+            AuthorProduct.objects.filter(author_id__in=author_ids, product__is_published=True)
+            .annotate(
+                rank=Window(
+                    RowNumber(),
+                    partition_by=F('author_id'),
+                    order_by=[F('product__created_at').desc(), F('product_id').desc()],
+                )
+            )
+            .filter(rank__lte=limit + 1)
+            .values_list('author_id', 'product_id')
+        )
+        for author_id, product_id in rows:
+            by_author[author_id].append(product_id)
+
+    by_genre = defaultdict(list)
+    genre_ids = {product.genre_id for product in products if product.genre_id}
+    if genre_ids:
+        rows = (
+            Product.objects.filter(genre_id__in=genre_ids, is_published=True)
+            .annotate(
+                rank=Window(
+                    RowNumber(),
+                    partition_by=F('genre_id'),
+                    order_by=[F('created_at').desc(), F('id').desc()],
+                )
+            )
+            .filter(rank__lte=limit + 1)
+            .values_list('genre_id', 'id')
+        )
+        for genre_id, product_id in rows:
+            by_genre[genre_id].append(product_id)
+
+    neighbours = {}
+    for product in products:
+        candidates = [
+            (related_id, ProductRelation.SOURCE_AUTHOR)
+            for author_id in author_links.get(product.pk, [])
+            for related_id in by_author[author_id]
+        ]
+        if product.genre_id:
+            candidates.extend(
+                (related_id, ProductRelation.SOURCE_GENRE)
+                for related_id in by_genre[product.genre_id]
+            )
+        neighbours[product.pk] = candidates
+    return neighbours
+
+
+def rebuild_product_relations(product_ids: List[int], limit: int = PRODUCT_RELATIONS_LIMIT) -> Counter:
+    """
+    Пересчитывает связи для порции товаров и заменяет их одной транзакцией.
+    Возвращает число записанных связей по источникам.
+    """
+    products = list(Product.objects.filter(pk__in=product_ids).only('id', 'genre_id'))
+    scores = score_co_occurrence(product_ids)
+    candidate_ids = {other_id for counter in scores.values() for other_id in counter}
+    published = set(
+        Product.objects.filter(pk__in=candidate_ids, is_published=True)
+        .values_list('pk', flat=True)
+    )
+    fallback = collect_fallback_neighbours(products, limit)
+
+    relations = []
+    written = Counter()
+    for product in products:
+        chosen = []
+        seen = {product.pk}
+        ranked = sorted(scores.get(product.pk, {}).items(), key=lambda item: (-item[1], item[0]))
+        for related_id, score in ranked:
+            if related_id in published and related_id not in seen:
+                chosen.append((related_id, score, ProductRelation.SOURCE_CO_OCCURRENCE))
+                seen.add(related_id)
+        for related_id, source in fallback.get(product.pk, []):
+            if related_id not in seen:
+                chosen.append((related_id, 0.0, source))
+                seen.add(related_id)
+        for position, (related_id, score, source) in enumerate(chosen[:limit]):
+            relations.append(ProductRelation(
+                product_id=product.pk,
+                related_id=related_id,
+                position=position,
+                score=score,
+                source=source,
+            ))
+            written[source] += 1
+
+    with transaction.atomic():
+        ProductRelation.objects.filter(product_id__in=product_ids).delete()
+        ProductRelation.objects.bulk_create(relations)
+    return written
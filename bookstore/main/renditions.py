@@ -0,0 +1,102 @@
+import hashlib
+import logging
+from io import BytesIO
+from typing import Any, Dict, Tuple
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# Ширины производных изображений: карточка на мобильном (~240px), карточка
+# на десктопе и ретина-экраны (480px), большая обложка на странице товара.
+RENDITION_WIDTHS = (240, 480, 960)
+RENDITION_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+RENDITIONS_DIR = 'renditions'
+RENDITION_ERRORS = (OSError, ValueError, Image.DecompressionBombError, UnidentifiedImageError)
+
+
+def rendition_name(digest: str, width: int, extension: str) -> str:
+    return f'{RENDITIONS_DIR}/{digest[:2]}/{digest}-{width}w.{extension}'
+
+
+def save_once(name: str, content: ContentFile, storage=default_storage) -> Tuple[str, bool]:
+    """
+    Сохраняет файл с именем из хэша содержимого, если его ещё нет. Между
+    exists() и save() файл может создать другой поток или процесс — тогда
+    хранилище выдаёт свободное имя; такую копию удаляем и используем уже
+    сохранённый файл. Возвращает имя и признак того, что файл создан здесь.
+    """
+    if storage.exists(name):
+        return name, False
+    saved = storage.save(name, content)
+    if saved != name:
+        storage.delete(saved)
+        return name, False
+    return saved, True
+
+
+def build_renditions(data: bytes, storage=default_storage) -> Dict[str, Any]:
+    """
+    Строит WebP- и JPEG-версии изображения фиксированных ширин. Имена файлов
+    содержат хэш содержимого, поэтому одинаковые исходники используют одни
+    и те же файлы, а уже существующие версии повторно не кодируются.
+    Ширины больше исходной не создаются.
+    """
+    digest = hashlib.sha256(data).hexdigest()[:20]
+    with Image.open(BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        width, height = image.size
+        widths = [value for value in RENDITION_WIDTHS if value < width] or [width]
+        sizes = []
+        # От большей ширины к меньшей: каждую версию уменьшаем из предыдущей.
+        for target_width in sorted(widths, reverse=True):
+            target_height = max(1, round(height * target_width / width))
+            if image.size != (target_width, target_height):
+                image = image.resize((target_width, target_height), Image.Resampling.LANCZOS)
+            entry = {'width': target_width, 'height': target_height}
+            for extension, (image_format, options) in RENDITION_FORMATS.items():
+                name = rendition_name(digest, target_width, extension)
+                if not storage.exists(name):
+                    name, _ = save_once(name, ContentFile(encode_image(image, image_format, options)), storage)
+                entry[extension] = storage.url(name)
+            sizes.append(entry)
+    sizes.reverse()
+    return {'hash': digest, 'width': width, 'height': height, 'sizes': sizes}
+
+
+def encode_image(image: Image.Image, image_format: str, options: Dict[str, Any]) -> bytes:
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    if image_format == 'JPEG':
+        if has_alpha:
+            rgba = image.convert('RGBA')
+            image = Image.new('RGB', rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel('A'))
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def build_file_renditions(name: str, storage=default_storage) -> Dict[str, Any]:
+    """
+    Версии для файла из хранилища. Ошибки чтения и битые файлы не прерывают
+    сохранение модели: в результате остаётся только source, чтобы файл не
+    обрабатывался повторно при каждом save(). Функция верхнего уровня, её
+    вызывают и процессы пула команды generate_image_renditions.
+    """
+    renditions = {'source': name, 'url': storage.url(name), 'sizes': []}
+    try:
+        with storage.open(name, 'rb') as stored:
+            data = stored.read()
+        renditions.update(build_renditions(data, storage))
+    except RENDITION_ERRORS as exc:
+        logger.warning('Could not build renditions for %s: %s', name, exc)
+    return renditions
@@ -0,0 +1,74 @@
+from typing import Any, Dict, Iterable
+
+from django.db.models import Avg, Count, ExpressionWrapper, F, FloatField, Q
+
+from .models import Product, ProductReview
+
+REVIEW_RATINGS = range(1, 6)
+
+
+def rating_field(rating: int) -> str:
+    return f'reviews_rating_{rating}'
+
+
+REVIEW_STATS_FIELDS = ('reviews_total', 'reviews_average') + tuple(
+    rating_field(rating) for rating in REVIEW_RATINGS
+)
+
+
+def empty_review_stats() -> Dict[str, Any]:
+    stats = {name: 0 for name in REVIEW_STATS_FIELDS}
+    stats['reviews_average'] = 0.0
+    return stats
+
+
+def collect_review_stats(product_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Считает количество, средний рейтинг и гистограмму оценок публичных
+    отзывов для набора товаров одним сгруппированным запросом.
+    """
+    rows = (
+        ProductReview.objects.filter(product_id__in=list(product_ids), is_public=True)
+        .values('product_id')
+        .annotate(
+            reviews_total=Count('id'),
+            reviews_average=Avg('rating'),
+            **{rating_field(rating): Count('id', filter=Q(rating=rating)) for rating in REVIEW_RATINGS},
+        )
+        .order_by()
+    )
+    stats = {}
+    for row in rows:
+        product_id = row.pop('product_id')
+        row['reviews_average'] = float(row['reviews_average'] or 0)
+        stats[product_id] = row
+    return stats
+
+
+def refresh_review_stats(product_id: int) -> None:
+    """
+    Пересчитывает сохранённые на товаре счётчики отзывов. Используется
+    update(), чтобы не трогать updated_at товара.
+    """
+    stats = collect_review_stats([product_id]).get(product_id) or empty_review_stats()
+    Product.objects.filter(pk=product_id).update(**stats)
+
+
+def add_review_to_stats(review: ProductReview) -> None:
+    """
+    Учитывает новый публичный отзыв без пересчёта: один UPDATE сдвигает
+    количество, среднее и столбец гистограммы. В выражениях F() берутся
+    значения до обновления, поэтому параллельные отзывы не теряются.
+    """
+    if review.rating not in REVIEW_RATINGS:
+        refresh_review_stats(review.product_id)
+        return
+    field_name = rating_field(review.rating)
+    Product.objects.filter(pk=review.product_id).update(
+        reviews_total=F('reviews_total') + 1,
+        reviews_average=ExpressionWrapper(
+            (F('reviews_average') * F('reviews_total') + review.rating) / (F('reviews_total') + 1.0),
+            output_field=FloatField(),
+        ),
+        **{field_name: F(field_name) + 1},
+    )
@@ -0,0 +1,81 @@
+import re
+from typing import Iterable
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramWordSimilarity,
+)
+from django.db.models import F, Q, QuerySet, Value
+from django.db.models.functions import Greatest, Replace
+
+from .models import Product
+
+SEARCH_CONFIG = 'russian'
+SEARCH_FIELDS = frozenset({'name', 'authors', 'publisher', 'isbn'})
+SEARCH_RANK_ANNOTATION = 'search_rank'
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+DIGIT_HYPHEN_RE = re.compile(r'(?<=\d)-(?=\d)')
+
+
+def build_search_vector() -> SearchVector:
+    """
+    Выражение поискового вектора товара. ISBN индексируется без морфологии и дефисов.
+    """
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(Replace('isbn', Value('-'), Value('')), weight='A', config='simple')
+        + SearchVector('authors', weight='B', config=SEARCH_CONFIG)
+        + SearchVector('publisher', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def refresh_search_vector(product_ids: Iterable[int]) -> int:
+    return Product.objects.filter(pk__in=list(product_ids)).update(
+        search_vector=build_search_vector(),
+    )
+
+
+def build_search_query(query: str) -> SearchQuery | None:
+    """
+    Превращает пользовательский ввод в tsquery: все слова обязательны,
+    последнее ищется по префиксу, чтобы поиск работал «по мере набора».
+    """
+    terms = TERM_RE.findall(DIGIT_HYPHEN_RE.sub('', query))
+    if not terms:
+        return None
+    raw = ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+    return SearchQuery(raw, search_type='raw', config=SEARCH_CONFIG)
+
+
+def search_products(products: QuerySet, query: str) -> QuerySet:
+    """
+    Полнотекстовый поиск по товарам с ранжированием. Если по tsquery ничего
+    не нашлось (опечатка, обрывок слова), используется триграммное сходство.
+    Ранг доступен в аннотации search_rank.
+    """
+    query = (query or '').strip()
+    if not query:
+        return products
+    search_query = build_search_query(query)
+    if search_query is not None:
+        matched = products.filter(search_vector=search_query).annotate(
+            **{SEARCH_RANK_ANNOTATION: SearchRank(F('search_vector'), search_query)}
+        )
+        if matched.exists():
+            return matched
+    return products.filter(
+        Q(name__trigram_word_similar=query) | Q(authors__trigram_word_similar=query)
+    ).annotate(
+        **{
+            SEARCH_RANK_ANNOTATION: Greatest(
+                TrigramWordSimilarity(query, 'name'),
+                TrigramWordSimilarity(query, 'authors'),
+            )
+        }
+    )
+
+
+def is_ranked(products: QuerySet) -> bool:
+    return SEARCH_RANK_ANNOTATION in products.query.annotations
@@ -1,5 +1,8 @@
-from django.db.models import Count, Q, Avg
-from django.db.models.functions import Coalesce
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.shortcuts import get_object_or_404
+
+from cart.models import CartItem
+
 from .models import Category, Product
 
 
@@ -12,28 +15,43 @@ def get_categories_with_products():
     ).filter(products_count__gt=0).order_by('order', 'name')
 
 
-def with_review_stats(queryset):
-    return queryset.annotate(
-        reviews_total=Count(
-            'reviews',
-            filter=Q(reviews__is_public=True),
-        ),
-        reviews_average=Coalesce(
-            Avg(
-                'reviews__rating',
-                filter=Q(reviews__is_public=True),
-            ),
-            0.0,
-        ),
-    )
-
-
 def get_published_products_queryset():
     queryset = Product.objects.filter(is_published=True)
-    return with_review_stats(queryset).order_by('-created_at')
+    return queryset.order_by('-created_at')
+
+
+def get_product_detail(slug, cart=None):
+    """
+    Товар для страницы карточки одним запросом: категория и жанр через JOIN,
+    статистика отзывов уже хранится на товаре, а позиция корзины (если корзина
+    есть) подтягивается подзапросами в cart_item_id/cart_item_quantity.
+    """
+    queryset = Product.objects.select_related('category', 'genre')
+    if cart is not None:
+        cart_items = CartItem.objects.filter(cart=cart, product=OuterRef('pk'))
+        queryset = queryset.annotate(
+            cart_item_id=Subquery(cart_items.values('id')[:1]),
+            cart_item_quantity=Subquery(cart_items.values('quantity')[:1]),
+        )
+    return get_object_or_404(queryset, slug=slug)
 
 
 def get_related_products(product, limit=8):
+    """
+    Связанные товары из предрасчитанной таблицы ProductRelation (читаются по
+    индексу product + position). Пока команда rebuild_product_relations
+    не заполнила связи для товара, показываются новинки той же категории.
+    """
+    related = list(
+        Product.objects.filter(
+            reverse_relations__product=product,
+            is_published=True,
+        )
+        .order_by('reverse_relations__position')
+        .cards()[:limit]
+    )
+    if related:
+        return related
     queryset = (
         Product.objects.filter(
             category=product.category,
@@ -41,22 +59,23 @@ def get_related_products(product, limit=8):
         )
         .exclude(id=product.id)
         .order_by('-created_at')
+        .cards()
     )
-    return with_review_stats(queryset)[:limit]
+    return queryset[:limit]
     
 
 def get_products_collection(collection, limit=8):
     queryset = Product.objects.filter(
         collection=collection,
         is_published=True
-    ).order_by('-created_at')
-    return with_review_stats(queryset)[:limit]
+    ).order_by('-created_at').cards()
+    return queryset[:limit]
 
 
 def get_actual_products(limit=20):
     queryset = Product.objects.filter(
         is_published=True,
         in_stock=True,
-    ).order_by('-updated_at')
-    return with_review_stats(queryset)[:limit]
+    ).order_by('-updated_at').cards()
+    return queryset[:limit]
     
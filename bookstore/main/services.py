@@ -1,15 +1,20 @@
-from typing import Dict, Iterable, Tuple, List
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional, Tuple, List
 from urllib.parse import urlencode
 from django.core.paginator import Paginator
 from django.db.models import Q, QuerySet, Min, Max
 from django.http import QueryDict
 
-CATALOG_FILTERS = {
-    'min_price': lambda queryset, value: queryset.filter(price__gte=value),
-    'max_price': lambda queryset, value: queryset.filter(price__lte=value),
-    'min_year': lambda queryset, value: queryset.filter(year__gte=value),
-    'max_year': lambda queryset, value: queryset.filter(year__lte=value),
-    'year': lambda queryset, value: queryset.filter(year=value),
+from .authors import author_products_condition
+from .pagination import keyset_ordering
+from .search import SEARCH_RANK_ANNOTATION, is_ranked, search_products
+
+CATALOG_FILTER_LOOKUPS = {
+    'min_price': 'price__gte',
+    'max_price': 'price__lte',
+    'min_year': 'year__gte',
+    'max_year': 'year__lte',
 }
 
 PRICE_PRESETS = [
@@ -19,15 +24,16 @@ PRICE_PRESETS = [
     {'key': 'gt_3000', 'label': '3000 ₽ и дороже', 'min': 3000, 'max': None},
 ]
 YEAR_ROUND_TO = 10
+YEAR_PRESET_RE = re.compile(r'^year_(\d{1,4})_(\d{1,4})$')
 
 CATALOG_SORT_OPTIONS = {
     'popular': {
         'label': 'По популярности',
-        'order_by': '-created_at',
+        'order_by': '-popularity_score',
     },
     'new': {
         'label': 'Новинки',
-        'order_by': 'new',
+        'order_by': '-created_at',
     },
     'price_asc': {
         'label': 'Дешевле',
@@ -128,16 +134,7 @@ def determine_price_step(span: int) -> int:
     return 5_000
 
 
-def build_price_bounds(queryset: QuerySet) -> Dict[str, int]:
-    """
-    Определяет минимальную и максимальную цену доступных товаров для текущего среза каталога.
-    """
-    aggregates = queryset.aggregate(
-        min_price=Min('price'),
-        max_price=Max('price'),
-    )
-    min_value = aggregates.get('min_price')
-    max_value = aggregates.get('max_price')
+def make_price_bounds(min_value, max_value) -> Dict[str, int]:
     try:
         min_value = int(min_value)
     except (TypeError, ValueError):
@@ -161,13 +158,7 @@ def build_price_bounds(queryset: QuerySet) -> Dict[str, int]:
     }
 
 
-def build_year_bounds(queryset: QuerySet) -> Dict[str, int]:
-    aggregates = queryset.aggregate(
-        min_year=Min('year'),
-        max_year=Max('year'),
-    )
-    min_value = aggregates.get('min_year')
-    max_value = aggregates.get('max_year')
+def make_year_bounds(min_value, max_value) -> Dict[str, int]:
     try:
         min_value = int(min_value)
     except (TypeError, ValueError):
@@ -183,6 +174,25 @@ def build_year_bounds(queryset: QuerySet) -> Dict[str, int]:
     return {'min': min_value, 'max': max_value}
 
 
+def build_price_bounds(queryset: QuerySet) -> Dict[str, int]:
+    """
+    Определяет минимальную и максимальную цену доступных товаров для текущего среза каталога.
+    """
+    aggregates = queryset.aggregate(
+        min_price=Min('price'),
+        max_price=Max('price'),
+    )
+    return make_price_bounds(aggregates.get('min_price'), aggregates.get('max_price'))
+
+
+def build_year_bounds(queryset: QuerySet) -> Dict[str, int]:
+    aggregates = queryset.aggregate(
+        min_year=Min('year'),
+        max_year=Max('year'),
+    )
+    return make_year_bounds(aggregates.get('min_year'), aggregates.get('max_year'))
+
+
 def build_year_presets(bounds: Dict[str, int]) -> List[Dict[str, int]]:
     import datetime
 
@@ -211,6 +221,131 @@ def build_year_presets(bounds: Dict[str, int]) -> List[Dict[str, int]]:
     return presets
 
 
+def parse_year_preset(key: str) -> Optional[Tuple[int, int]]:
+    """
+    Возвращает границы пресета года по его ключу вида year_1990_2000.
+    """
+    match = YEAR_PRESET_RE.match(key or '')
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+@dataclass
+class CatalogFilterState:
+    """
+    Разобранные параметры фильтра каталога. Каждый фасет (genre, author,
+    direction, price, year) даёт своё условие, чтобы счётчики фасета можно
+    было считать без его собственного фильтра.
+    """
+    query: str = ''
+    genres: List[str] = field(default_factory=list)
+    authors: List[str] = field(default_factory=list)
+    directions: List[str] = field(default_factory=list)
+    year: str = ''
+    price_range: str = ''
+    min_price: str = ''
+    max_price: str = ''
+    year_range: str = ''
+    min_year: str = ''
+    max_year: str = ''
+
+    def conditions(self) -> Dict[str, Q]:
+        conditions: Dict[str, Q] = {}
+        if self.year:
+            conditions['exact_year'] = Q(year=self.year)
+        if self.genres:
+            conditions['genre'] = Q(genre__slug__in=self.genres)
+        if self.authors:
+            conditions['author'] = Q(pk__in=author_products_condition(self.authors))
+        if self.directions:
+            conditions['direction'] = Q(attributes__vinyl_directtion__in=self.directions)
+        price = self._range_condition('min_price', 'max_price')
+        if price:
+            conditions['price'] = price
+        year = self._range_condition('min_year', 'max_year')
+        if year:
+            conditions['year'] = year
+        return conditions
+
+    def condition(self, exclude: Iterable[str] = ()) -> Q:
+        excluded = set(exclude)
+        combined = Q()
+        for facet, condition in self.conditions().items():
+            if facet not in excluded:
+                combined &= condition
+        return combined
+
+    def as_filter_params(self) -> Dict[str, str]:
+        return {
+            'min_price': self.min_price,
+            'max_price': self.max_price,
+            'price_range': self.price_range,
+            'min_year': self.min_year,
+            'max_year': self.max_year,
+            'year_range': self.year_range,
+            'author': ','.join(self.authors),
+            'directtion': ','.join(self.directions),
+            'year': self.year,
+            'genre': ','.join(self.genres),
+            'q': self.query,
+        }
+
+    def _range_condition(self, min_key: str, max_key: str) -> Q:
+        condition = Q()
+        min_value = getattr(self, min_key)
+        max_value = getattr(self, max_key)
+        if min_value:
+            condition &= Q(**{CATALOG_FILTER_LOOKUPS[min_key]: min_value})
+        if max_value:
+            condition &= Q(**{CATALOG_FILTER_LOOKUPS[max_key]: max_value})
+        return condition
+
+
+def price_preset_condition(preset: Dict) -> Q:
+    state = CatalogFilterState(
+        min_price='' if preset['min'] is None else str(preset['min']),
+        max_price='' if preset['max'] is None else str(preset['max']),
+    )
+    return state.conditions()['price']
+
+
+def parse_catalog_filter_state(params: QueryDict) -> CatalogFilterState:
+    """
+    Разбирает QueryDict каталога: пресеты цены и года имеют приоритет над
+    ручными границами, как и в форме фильтра.
+    """
+    state = CatalogFilterState(
+        query=params.get('q') or '',
+        genres=extract_selected_genres(params),
+        authors=extract_selected_authors(params),
+        directions=extract_selected_vinyl_directtions(params),
+        year=params.get('year') or '',
+        price_range=params.get('price_range') or '',
+        year_range=params.get('year_range') or '',
+    )
+
+    if state.price_range:
+        preset = next((p for p in PRICE_PRESETS if p['key'] == state.price_range), None)
+        if preset:
+            if preset['min'] is not None:
+                state.min_price = str(preset['min'])
+            if preset['max'] is not None:
+                state.max_price = str(preset['max'])
+    else:
+        state.min_price = params.get('min_price') or ''
+        state.max_price = params.get('max_price') or ''
+
+    if state.year_range:
+        preset_bounds = parse_year_preset(state.year_range)
+        if preset_bounds:
+            state.min_year, state.max_year = (str(value) for value in preset_bounds)
+    else:
+        state.min_year = params.get('min_year') or ''
+        state.max_year = params.get('max_year') or ''
+    return state
+
+
 def apply_catalog_filters(
     products: QuerySet,
     params: QueryDict,
@@ -220,118 +355,42 @@ def apply_catalog_filters(
     Возвращает обновлённый queryset, словарь текущих параметров фильтра, строку поиска
     и вычисленные границы цен/годов для текущего набора товаров.
     """
-    query = params.get('q')
-    if query:
-        products = products.filter(
-            Q(name__icontains=query)
-            | Q(authors__icontains=query)
-            | Q(publisher__icontains=query)
-        )
-
-    filter_params: Dict[str, str] = {
-        'min_price': '',
-        'max_price': '',
-        'price_range': params.get('price_range', ''),
-        'min_year': '',
-        'max_year': '',
-        'year_range': params.get('year_range', ''),
-        'author': '',
-        'directtion': '',
-    }
-    price_keys = {'min_price', 'max_price'}
-    year_keys = {'min_year', 'max_year'}
-    multi_keys = {'genre'}
-    for key, filter_func in CATALOG_FILTERS.items():
-        if key in price_keys or key in multi_keys or key in year_keys:
-            continue
-        value = params.get(key)
-        if value:
-            products = filter_func(products, value)
-            filter_params[key] = value
-        else:
-            filter_params[key] = ''
+    state = parse_catalog_filter_state(params)
+    if state.query:
+        products = search_products(products, state.query)
 
-    selected_genres = extract_selected_genres(params)
-    if selected_genres:
-        products = products.filter(genre__slug__in=selected_genres)
-        filter_params['genre'] = ','.join(selected_genres)
-    else:
-        filter_params['genre'] = ''
-
-    selected_authors = extract_selected_authors(params)
-    if selected_authors:
-        products = products.filter(authors__in=selected_authors)
-        filter_params['author'] = ','.join(selected_authors)
-    else:
-        filter_params['author'] = ''
-
-    selected_vinyl_directtions = extract_selected_vinyl_directtions(params)
-    if selected_vinyl_directtions:
-        products = products.filter(attributes__vinyl_directtion__in=selected_vinyl_directtions)
-        filter_params['directtion'] = ','.join(selected_vinyl_directtions)
-    else:
-        filter_params['directtion'] = ''
-
-    price_bounds = build_price_bounds(products)
+    aggregates = products.filter(state.condition(exclude=('price', 'year'))).aggregate(
+        min_price=Min('price'),
+        max_price=Max('price'),
+        min_year=Min('year'),
+        max_year=Max('year'),
+    )
+    price_bounds = make_price_bounds(aggregates['min_price'], aggregates['max_price'])
     price_bounds['presets'] = PRICE_PRESETS
-    year_bounds = build_year_bounds(products)
+    year_bounds = make_year_bounds(aggregates['min_year'], aggregates['max_year'])
     year_bounds['presets'] = build_year_presets(year_bounds)
 
-    price_range = params.get('price_range')
-    if price_range:
-        filter_params['price_range'] = price_range
-    if price_range:
-        preset = next((p for p in PRICE_PRESETS if p['key'] == price_range), None)
-        if preset:
-            if preset['min'] is not None:
-                products = CATALOG_FILTERS['min_price'](products, preset['min'])
-                filter_params['min_price'] = str(preset['min'])
-            if preset['max'] is not None:
-                products = CATALOG_FILTERS['max_price'](products, preset['max'])
-                filter_params['max_price'] = str(preset['max'])
-    if not price_range:
-        for key in ('min_price', 'max_price'):
-            filter_func = CATALOG_FILTERS[key]
-            value = params.get(key)
-            if value:
-                products = filter_func(products, value)
-                filter_params[key] = value
-            else:
-                filter_params[key] = ''
-
-    year_range = params.get('year_range')
-    if year_range:
-        filter_params['year_range'] = year_range
-    if year_range:
-        preset = next((p for p in year_bounds['presets'] if p['key'] == year_range), None)
-        if preset:
-            if preset['min'] is not None:
-                products = CATALOG_FILTERS['min_year'](products, preset['min'])
-                filter_params['min_year'] = str(preset['min'])
-            if preset['max'] is not None:
-                products = CATALOG_FILTERS['max_year'](products, preset['max'])
-                filter_params['max_year'] = str(preset['max'])
-    if not year_range:
-        for key in ('min_year', 'max_year'):
-            filter_func = CATALOG_FILTERS[key]
-            value = params.get(key)
-            if value:
-                products = filter_func(products, value)
-                filter_params[key] = value
-            else:
-                filter_params[key] = ''
-
-    filter_params['q'] = query or ''
-    return products, filter_params, query or '', price_bounds, year_bounds
+    products = products.filter(state.condition())
+    return products, state.as_filter_params(), state.query, price_bounds, year_bounds
 
 def apply_catalog_sorting(products: QuerySet, sort_key: str) -> Tuple[QuerySet, str]:
     """
     Применяет сортировку к queryset каталога. Возвращает отсортированный queryset и ключ сортировки.
+    Для результатов поиска сортировка по умолчанию учитывает релевантность.
+    """
+    sort_key, order_by = resolve_catalog_sort(sort_key)
+    if sort_key == 'popular' and is_ranked(products):
+        return products.order_by(f'-{SEARCH_RANK_ANNOTATION}', order_by), sort_key
+    return products.order_by(*keyset_ordering(order_by)), sort_key
+
+
+def resolve_catalog_sort(sort_key: str) -> Tuple[str, str]:
+    """
+    Возвращает допустимый ключ сортировки и соответствующее поле order_by.
     """
     if sort_key not in CATALOG_SORT_OPTIONS:
         sort_key = 'popular'
-    order_by = CATALOG_SORT_OPTIONS[sort_key]['order_by']
-    return products.order_by(order_by), sort_key
+    return sort_key, CATALOG_SORT_OPTIONS[sort_key]['order_by']
 
 
 def extract_hx_flags(
@@ -428,6 +487,19 @@ def build_pagination(request, page_obj):
             'next_url': next_url,
         }
 
+def build_load_more_url(request, cursor: str) -> str:
+    """
+    Ссылка на следующую порцию товаров по курсору с сохранением фильтров.
+    """
+    params = {
+        key: value
+        for key, value in request.GET.items()
+        if key not in {'page', 'cursor'} and value
+    }
+    params['cursor'] = cursor
+    return f'{request.path}?{urlencode(params)}'
+
+
 def build_sorting_options(request, current_sort: str):
         """
         Формирует список доступных вариантов сортировки с учётом текущих query-параметров.
@@ -0,0 +1,135 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from .authors import AuthorProduct, refresh_author_counts, sync_product_authors
+from .catalog_cache import bump_catalog_version
+from .catalog_bounds import CATALOG_BOUNDS_PRODUCT_FIELDS, mark_catalog_bounds_dirty
+from .category_tree import CATEGORY_TREE_PRODUCT_FIELDS, bump_category_tree_version
+from .deepseek import invalidate_prompt_cache
+from .models import Category, DeepSeekPrompt, Genre, Product, ProductReview
+from .review_stats import add_review_to_stats, refresh_review_stats
+from .search import SEARCH_FIELDS, refresh_search_vector
+
+
+@receiver(post_save, sender=ProductReview)
+def update_review_stats_on_save(sender, instance, created=False, **kwargs):
+    # Новый отзыв учитывается приращением, правка (оценка, видимость) —
+    # пересчётом, потому что прежнее значение здесь неизвестно.
+    if created:
+        if instance.is_public:
+            add_review_to_stats(instance)
+        return
+    refresh_review_stats(instance.product_id)
+
+
+@receiver(post_delete, sender=ProductReview)
+def update_review_stats_on_delete(sender, instance, **kwargs):
+    refresh_review_stats(instance.product_id)
+
+
+AUTHOR_FIELDS = frozenset({'authors', 'is_published'})
+
+
+@receiver(post_save, sender=Product)
+def update_authors_on_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not AUTHOR_FIELDS.intersection(update_fields):
+        return
+    sync_product_authors(instance)
+
+
+@receiver(pre_delete, sender=Product)
+def remember_authors_on_delete(sender, instance, **kwargs):
+    instance._author_ids = list(
+        AuthorProduct.objects.filter(product_id=instance.pk).values_list('author_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Product)
+def update_author_counts_on_delete(sender, instance, **kwargs):
+    refresh_author_counts(getattr(instance, '_author_ids', []))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+def invalidate_catalog_fragments(sender, **kwargs):
+    bump_catalog_version()
+
+
+TRACKED_PRODUCT_FIELDS = tuple(dict.fromkeys(
+    CATEGORY_TREE_PRODUCT_FIELDS + CATALOG_BOUNDS_PRODUCT_FIELDS + tuple(sorted(SEARCH_FIELDS))
+))
+
+
+def _tracked_state(instance):
+    # Через __dict__, чтобы не подгружать отложенные поля у .only()-выборок.
+    return {name: instance.__dict__.get(name) for name in TRACKED_PRODUCT_FIELDS}
+
+
+def _changed_fields(previous, current):
+    if previous is None:
+        return set(current)
+    return {name for name, value in current.items() if previous.get(name) != value}
+
+
+@receiver(post_init, sender=Product)
+def remember_tracked_state(sender, instance, **kwargs):
+    instance._tracked_state = _tracked_state(instance)
+
+
+# Регистрируется раньше handle_tracked_product_changes, который обновляет
+# снимок полей: здесь он ещё от загрузки товара.
+@receiver(post_save, sender=Product)
+def update_search_vector_on_save(sender, instance, created=False, update_fields=None, **kwargs):
+    if update_fields is not None and not SEARCH_FIELDS.intersection(update_fields):
+        return
+    previous = None if created else getattr(instance, '_tracked_state', None)
+    if not SEARCH_FIELDS.intersection(_changed_fields(previous, _tracked_state(instance))):
+        return
+    refresh_search_vector([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def handle_tracked_product_changes(sender, instance, created=False, **kwargs):
+    previous = None if created else getattr(instance, '_tracked_state', None)
+    current = _tracked_state(instance)
+    changed = _changed_fields(previous, current)
+    instance._tracked_state = current
+    if not changed or (created and not instance.is_published):
+        return
+    if created or changed.intersection(CATEGORY_TREE_PRODUCT_FIELDS):
+        # Только после коммита: иначе параллельный запрос соберёт дерево из
+        # старых строк и сохранит его под новой версией.
+        transaction.on_commit(bump_category_tree_version)
+    if changed.intersection(CATALOG_BOUNDS_PRODUCT_FIELDS):
+        category_ids = {current['category_id']}
+        if previous is not None:
+            category_ids.add(previous.get('category_id'))
+        mark_catalog_bounds_dirty(category_ids)
+
+
+@receiver(post_delete, sender=Product)
+def handle_tracked_product_delete(sender, instance, **kwargs):
+    if instance.is_published:
+        transaction.on_commit(bump_category_tree_version)
+        mark_catalog_bounds_dirty({instance.category_id})
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree(sender, **kwargs):
+    transaction.on_commit(bump_category_tree_version)
+
+
+@receiver(post_save, sender=DeepSeekPrompt)
+@receiver(post_delete, sender=DeepSeekPrompt)
+def invalidate_deepseek_prompt(sender, **kwargs):
+    invalidate_prompt_cache()
@@ -0,0 +1,114 @@
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable, Dict, Optional
+
+from django.contrib.sessions.models import Session
+from django.db import transaction
+from django.db.models import Exists, OuterRef, QuerySet
+from django.utils import timezone
+
+from cart.models import Cart
+from favorites.models import FavoriteList
+
+# Корзины и списки моложе этого не трогаем: строка создаётся в запросе
+# раньше, чем SessionMiddleware сохранит новую сессию.
+STALE_VISITOR_GRACE = timedelta(hours=24)
+
+
+@dataclass
+class PurgeStats:
+    sessions: int = 0
+    carts: int = 0
+    cart_items: int = 0
+    favorite_lists: int = 0
+    favorite_items: int = 0
+
+    @property
+    def rows(self) -> int:
+        return self.sessions + self.carts + self.cart_items + self.favorite_lists + self.favorite_items
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(self.__dict__)
+
+
+def expired_sessions(now) -> QuerySet:
+    return Session.objects.filter(expire_date__lt=now)
+
+
+def orphaned_carts(cutoff) -> QuerySet:
+    sessions = Session.objects.filter(session_key=OuterRef('session_key'))
+    return Cart.objects.filter(~Exists(sessions), updated_at__lt=cutoff)
+
+
+def orphaned_favorite_lists(cutoff) -> QuerySet:
+    sessions = Session.objects.filter(session_key=OuterRef('session_key'))
+    return FavoriteList.objects.filter(~Exists(sessions), user=None, updated_at__lt=cutoff)
+
+
+def purge_in_chunks(
+    queryset: QuerySet,
+    *,
+    chunk_size: int,
+    dry_run: bool,
+    pause: float = 0,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Dict[str, int]:
+    """
+    Удаляет строки queryset порциями по первичному ключу, каждая порция —
+    в своей короткой транзакции. Условие отбора проверяется повторно при
+    удалении, так что строка, ожившая между выборкой и DELETE, остаётся.
+    Возвращает число удалённых строк по моделям (с каскадом).
+    """
+    deleted: Dict[str, int] = {}
+    last_pk = None
+    while True:
+        chunk = queryset.order_by('pk')
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        pks = list(chunk.values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return deleted
+        last_pk = pks[-1]
+        if dry_run:
+            counts = {queryset.model._meta.label: len(pks)}
+        else:
+            with transaction.atomic():
+                _, counts = queryset.filter(pk__in=pks).delete()
+        for label, count in counts.items():
+            deleted[label] = deleted.get(label, 0) + count
+        if len(pks) < chunk_size:
+            return deleted
+        if pause:
+            sleep(pause)
+
+
+def purge_stale_visitors(
+    *,
+    chunk_size: int = 1000,
+    dry_run: bool = False,
+    grace: Optional[timedelta] = None,
+    pause: float = 0,
+) -> PurgeStats:
+    """
+    Удаляет истёкшие сессии, затем анонимные корзины и списки избранного,
+    у которых не осталось сессии. Списки пользователей не трогаются.
+    В dry_run только считает: корзины и списки, которые осиротеют после
+    удаления сессий, в этом режиме не учитываются.
+    """
+    now = timezone.now()
+    cutoff = now - (grace if grace is not None else STALE_VISITOR_GRACE)
+    stats = PurgeStats()
+    options = {'chunk_size': chunk_size, 'dry_run': dry_run, 'pause': pause}
+
+    deleted = purge_in_chunks(expired_sessions(now), **options)
+    stats.sessions = deleted.get('sessions.Session', 0)
+
+    deleted = purge_in_chunks(orphaned_carts(cutoff), **options)
+    stats.carts = deleted.get('cart.Cart', 0)
+    stats.cart_items = deleted.get('cart.CartItem', 0)
+
+    deleted = purge_in_chunks(orphaned_favorite_lists(cutoff), **options)
+    stats.favorite_lists = deleted.get('favorites.FavoriteList', 0)
+    stats.favorite_items = deleted.get('favorites.FavoriteItem', 0)
+    return stats
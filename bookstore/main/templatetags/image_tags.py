@@ -0,0 +1,40 @@
+from django import template
+from django.utils.html import format_html
+
+register = template.Library()
+
+
+def _srcset(renditions, extension):
+    sizes = (renditions or {}).get('sizes') or []
+    return ', '.join(
+        f"{size[extension]} {size['width']}w"
+        for size in sizes
+        if size.get(extension)
+    )
+
+
+@register.simple_tag
+def rendition_srcset(renditions, extension='jpeg'):
+    return _srcset(renditions, extension)
+
+
+@register.simple_tag
+def webp_source(renditions, sizes='100vw'):
+    """
+    <source> с WebP-версиями для <picture>; пусто, если версий нет.
+    """
+    srcset = _srcset(renditions, 'webp')
+    if not srcset:
+        return ''
+    return format_html('<source type="image/webp" srcset="{}" sizes="{}">', srcset, sizes)
+
+
+@register.simple_tag
+def srcset_attrs(renditions, sizes='100vw'):
+    """
+    Атрибуты srcset/sizes с JPEG-версиями для <img>; пусто, если версий нет.
+    """
+    srcset = _srcset(renditions, 'jpeg')
+    if not srcset:
+        return ''
+    return format_html('srcset="{}" sizes="{}"', srcset, sizes)
@@ -0,0 +1,124 @@
+import json
+
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from main import selectors
+from main.enums import ProductCollections
+from main.models import Category, Genre, Product
+from main.services import apply_catalog_filters, apply_catalog_sorting
+
+CATALOG_FILTER_COMBINATIONS = [
+    '',
+    'min_price=100&max_price=900',
+    'price_range=gt_3000',
+    'min_year=1990&max_year=2005',
+    'year_range=year_1990_2000',
+    'year=1995',
+    'genre=prose',
+    'author=Автор 3',
+    'directtion=Jazz',
+    'q=книга',
+    'genre=prose&price_range=lt_1500&year_range=year_2000_2010',
+]
+
+
+class CatalogQueryPlanTests(TestCase):
+    """
+    Проверяет, что запросы витрины обслуживаются индексами. Планировщику
+    запрещается seq scan (enable_seqscan = off), поэтому если в плане всё же
+    есть Seq Scan по main_product, подходящего индекса нет.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Книги')
+        cls.genre = Genre.objects.create(category=cls.category, name='Проза', slug='prose')
+        collections = [choice for choice, _ in ProductCollections.choices]
+        for index in range(60):
+            Product.objects.create(
+                erp_product_id=f'plan-{index}',
+                name=f'Книга {index}',
+                slug=f'plan-{index}',
+                category=cls.category,
+                genre=cls.genre if index % 2 else None,
+                authors=f'Автор {index % 5}',
+                collection=collections[index % len(collections)],
+                price=100 * (index % 40),
+                year=1980 + index % 40,
+                in_stock=bool(index % 3),
+                is_published=bool(index % 7),
+                attributes={'vinyl_directtion': 'Jazz' if index % 2 else 'Rock'},
+            )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE main_product')
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute('RESET enable_seqscan')
+
+    def assertNoProductSeqScan(self, run):
+        with CaptureQueriesContext(connection) as queries:
+            run()
+        statements = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and '"main_product"' in query['sql']
+        ]
+        self.assertTrue(statements)
+        for sql in statements:
+            with self.subTest(sql=sql[:120]):
+                plan = self.explain(sql)
+                scans = [
+                    node for node in self.walk(plan)
+                    if node.get('Node Type') == 'Seq Scan'
+                    and node.get('Relation Name') == 'main_product'
+                ]
+                self.assertEqual(scans, [], json.dumps(plan, ensure_ascii=False, indent=1))
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            return cursor.fetchone()[0][0]['Plan']
+
+    def walk(self, node):
+        yield node
+        for child in node.get('Plans', []):
+            yield from self.walk(child)
+
+    def test_selectors_use_indexes(self):
+        product = Product.objects.filter(is_published=True).first()
+        runs = {
+            'get_categories_with_products': lambda: list(selectors.get_categories_with_products()),
+            'get_published_products_queryset': lambda: list(selectors.get_published_products_queryset()[:15]),
+            'get_related_products': lambda: list(selectors.get_related_products(product)),
+            'get_products_collection': lambda: list(
+                selectors.get_products_collection(ProductCollections.choices[0][0])
+            ),
+            'get_actual_products': lambda: list(selectors.get_actual_products()),
+        }
+        for name, run in runs.items():
+            with self.subTest(selector=name):
+                self.assertNoProductSeqScan(run)
+
+    def test_catalog_filters_use_indexes(self):
+        for category in (self.category, None):
+            for query_string in CATALOG_FILTER_COMBINATIONS:
+                for sort in ('popular', 'price_asc'):
+                    with self.subTest(category=category, params=query_string, sort=sort):
+                        self.assertNoProductSeqScan(
+                            lambda: self.run_catalog_query(category, query_string, sort)
+                        )
+
+    def run_catalog_query(self, category, query_string, sort):
+        products = selectors.get_published_products_queryset()
+        if category:
+            products = products.filter(category=category)
+        products, *_ = apply_catalog_filters(products, QueryDict(query_string))
+        products, _ = apply_catalog_sorting(products, sort)
+        list(products[:15])
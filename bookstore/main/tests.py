@@ -1,8 +1,62 @@
-from django.test import TestCase
+import hashlib
+import json
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import Http404, QueryDict
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
 
+from cart.models import Cart, CartItem
+from favorites.models import FavoriteItem, FavoriteList
 from integrations.erp import upsert_product_from_erp
-from main.models import Category, Genre, Product
+from integrations.image_mirror import fetch_image
+from main.ai_reviews import (
+    build_product_prompt,
+    claim_ai_review_job,
+    enqueue_ai_review,
+    find_usable_review,
+    run_ai_review_job,
+)
+from main.ai_review_bulk import estimate_cost
+from main.catalog_cache import get_catalog_fragment_stats, get_catalog_version
+from main.deepseek import DeepSeekAPIError, DeepSeekReviewService, iter_sse_data
+from main.models import (
+    AIReview,
+    AIReviewBulkRun,
+    AIReviewJob,
+    Author,
+    Banner,
+    Category,
+    DeepSeekPrompt,
+    Genre,
+    MirroredImage,
+    Product,
+    ProductRelation,
+    ProductReview,
+)
+from main.rate_limit import TokenBucket
+from main.relations import collect_active_product_ids
+from main.selectors import get_product_detail, get_related_products
+from main.view_counter import ViewCounterBuffer, product_views
+from orders.models import Order, OrderItem
 
 
 class ErpVinylMappingTests(TestCase):
@@ -200,6 +254,9 @@ class ErpBookMappingTests(TestCase):
 
 
 class CatalogViewGenreTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
     def test_category_pages_show_genres_cards_block(self):
         books = Category.objects.create(name='Книги')
         vinyl = Category.objects.create(name='Винил')
@@ -287,6 +344,9 @@ class CatalogViewGenreTests(TestCase):
 
 
 class CatalogViewVinylDirecttionFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
     def test_vinyl_category_shows_directtion_filter_and_filters_products(self):
         vinyl = Category.objects.create(name='Винил')
         genre = Genre.objects.create(category=vinyl, name='Rock', slug='rock')
@@ -344,6 +404,191 @@ class CatalogViewVinylDirecttionFilterTests(TestCase):
         self.assertNotIn('Направление', response.content.decode('utf-8'))
 
 
+class CatalogFacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.books = Category.objects.create(name='Книги')
+        self.prose = Genre.objects.create(category=self.books, name='Проза', slug='prose')
+        self.poetry = Genre.objects.create(category=self.books, name='Поэзия', slug='poetry')
+        rows = [
+            ('facet-1', 'Пушкин', self.poetry, 250, 1990),
+            ('facet-2', 'Пушкин', self.prose, 1200, 1995),
+            ('facet-3', 'Толстой', self.prose, 2000, 2005),
+            ('facet-4', 'Толстой', self.prose, 3500, 2012),
+        ]
+        for erp_id, author, genre, price, year in rows:
+            Product.objects.create(
+                erp_product_id=erp_id,
+                name=f'Книга {erp_id}',
+                slug=erp_id,
+                category=self.books,
+                genre=genre,
+                authors=author,
+                price=price,
+                year=year,
+            )
+
+    def test_facet_counts_ignore_own_filter(self):
+        response = self.client.get(
+            reverse('main:catalog', kwargs={'category_slug': self.books.slug}),
+            {'author': 'Пушкин', 'genre': 'prose'},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        products = list(response.context['products'].object_list)
+        self.assertEqual([product.erp_product_id for product in products], ['facet-2'])
+        self.assertEqual(response.context['author_counts'], {'Пушкин': 1, 'Толстой': 2})
+        genre_counts = {
+            genre['slug']: genre['count'] for genre in response.context['genre_filters']
+        }
+        self.assertEqual(genre_counts, {'prose': 1, 'poetry': 1})
+        price_counts = {
+            preset['key']: preset['count']
+            for preset in response.context['price_bounds']['presets']
+        }
+        self.assertEqual(price_counts, {'lt_300': 0, 'lt_1500': 1, '1500_3000': 0, 'gt_3000': 0})
+
+    def test_price_and_year_presets_are_counted(self):
+        response = self.client.get(
+            reverse('main:catalog', kwargs={'category_slug': self.books.slug}),
+            {'price_range': 'gt_3000'},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['products'].object_list), 1)
+        self.assertEqual(response.context['author_counts'], {'Толстой': 1})
+        price_counts = {
+            preset['key']: preset['count']
+            for preset in response.context['price_bounds']['presets']
+        }
+        self.assertEqual(price_counts, {'lt_300': 1, 'lt_1500': 2, '1500_3000': 1, 'gt_3000': 1})
+        year_counts = {
+            preset['key']: preset['count']
+            for preset in response.context['year_bounds']['presets']
+        }
+        self.assertEqual(sum(year_counts.values()), 1)
+
+    def test_facets_use_two_queries(self):
+        from main.facets import build_catalog_facets
+        from main.services import parse_catalog_filter_state
+
+        state = parse_catalog_filter_state(QueryDict('author=Толстой&min_year=2000'))
+        products = Product.objects.filter(category=self.books)
+
+        with self.assertNumQueries(2):
+            facets = build_catalog_facets(products, state, include_directions=True)
+
+        self.assertEqual(dict(facets['authors']), {'Толстой': 2})
+        self.assertEqual(facets['genres'], {'prose': 2})
+        self.assertEqual(facets['price_bounds']['min'], 2000)
+
+
+class AuthorIndexTests(TestCase):
+    def test_erp_sync_fills_author_table(self):
+        payload = {
+            'id': 20201,
+            'name': 'Двенадцать стульев',
+            'prices': [{'price': 500, 'currency_code': 'RUB'}],
+            'book_details': {'author': 'Илья Ильф, Евгений Петров'},
+        }
+
+        product, _, _ = upsert_product_from_erp(payload)
+
+        self.assertEqual(
+            sorted(product.author_records.values_list('name', flat=True)),
+            ['Евгений Петров', 'Илья Ильф'],
+        )
+        self.assertEqual(Author.objects.get(name='Илья Ильф').products_count, 1)
+
+    def test_api_upsert_fills_author_table(self):
+        from api.views import upsert_single_product
+
+        product, status = upsert_single_product({
+            'sku': 'api-author-1',
+            'name': 'Золотой телёнок',
+            'price': 450,
+            'authors': 'Илья Ильф; Евгений Петров',
+        })
+
+        self.assertEqual(status, 'created')
+        self.assertEqual(product.author_records.count(), 2)
+
+        upsert_single_product({'sku': 'api-author-1', 'authors': 'Евгений Петров'})
+
+        self.assertEqual(
+            list(product.author_records.values_list('name', flat=True)),
+            ['Евгений Петров'],
+        )
+        self.assertEqual(Author.objects.get(name='Илья Ильф').products_count, 0)
+
+    def test_suggestions_use_prefix_and_product_count(self):
+        for index, authors in enumerate(['Пушкин', 'Пушкин, Пастернак', 'Пастернак', 'Пастернак']):
+            Product.objects.create(
+                erp_product_id=f'suggest-{index}',
+                name=f'Книга {index}',
+                slug=f'suggest-{index}',
+                authors=authors,
+                price=100,
+            )
+        Product.objects.create(
+            erp_product_id='suggest-hidden',
+            name='Скрытая',
+            slug='suggest-hidden',
+            authors='Паустовский',
+            price=100,
+            is_published=False,
+        )
+
+        response = self.client.get(reverse('main:author_suggest'), {'q': 'п'})
+
+        self.assertEqual(response.json()['results'], ['Пастернак', 'Пушкин'])
+        response = self.client.get(reverse('main:author_suggest'), {'q': 'ПУШ'})
+        self.assertEqual(response.json()['results'], ['Пушкин'])
+
+    def test_suggestions_match_start_of_any_name_word(self):
+        for index, authors in enumerate(['Лев Толстой', 'Лев Толстой', 'Толстая Татьяна', 'Салтыков-Щедрин', 'Пустолстов']):
+            Product.objects.create(
+                erp_product_id=f'word-{index}',
+                name=f'Книга {index}',
+                slug=f'word-{index}',
+                authors=authors,
+                price=100,
+            )
+
+        response = self.client.get(reverse('main:author_suggest'), {'q': 'толст'})
+        self.assertEqual(response.json()['results'], ['Толстая Татьяна', 'Лев Толстой'])
+        response = self.client.get(reverse('main:author_suggest'), {'q': 'щедр'})
+        self.assertEqual(response.json()['results'], ['Салтыков-Щедрин'])
+
+    def test_catalog_author_filter_matches_any_listed_author(self):
+        books = Category.objects.create(name='Книги')
+        Product.objects.create(
+            erp_product_id='author-filter-1',
+            name='Двенадцать стульев',
+            slug='author-filter-1',
+            category=books,
+            authors='Илья Ильф, Евгений Петров',
+            price=500,
+        )
+        Product.objects.create(
+            erp_product_id='author-filter-2',
+            name='Записные книжки',
+            slug='author-filter-2',
+            category=books,
+            authors='Илья Ильф',
+            price=300,
+        )
+
+        response = self.client.get(
+            reverse('main:catalog', kwargs={'category_slug': books.slug}),
+            {'author': 'Евгений Петров'},
+        )
+
+        products = list(response.context['products'].object_list)
+        self.assertEqual([product.erp_product_id for product in products], ['author-filter-1'])
+        self.assertEqual(response.context['author_counts'], {'Евгений Петров': 1, 'Илья Ильф': 2})
+
+
 class HomeCategoriesOrderTests(TestCase):
     def test_home_categories_sorted_by_order(self):
         category_b = Category.objects.create(name='Категория B', order=20)
@@ -381,6 +626,9 @@ class HomeCategoriesOrderTests(TestCase):
 
 
 class CatalogAllPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
     def test_catalog_all_shows_categories_cards_and_bottom_text(self):
         books = Category.objects.create(name='Книги')
         vinyl = Category.objects.create(name='Винил')
@@ -411,3 +659,1684 @@ class CatalogAllPageTests(TestCase):
         self.assertIn(response.context['catalog_categories_bottom_text'], content)
         self.assertNotIn('Фильтры', content)
         self.assertNotIn('data-product-card', content)
+
+
+class CatalogKeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.books = Category.objects.create(name='Книги')
+        for index in range(40):
+            Product.objects.create(
+                erp_product_id=f'keyset-{index}',
+                name=f'Книга {index}',
+                slug=f'keyset-{index}',
+                category=self.books,
+                price=100 * (index % 4),
+            )
+        self.url = reverse('main:catalog', kwargs={'category_slug': self.books.slug})
+
+    def walk(self, sort):
+        response = self.client.get(self.url, {'sort': sort})
+        seen = [product.pk for product in response.context['products']]
+        load_more_url = response.context['load_more_url']
+        while load_more_url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(load_more_url, HTTP_HX_REQUEST='true')
+            self.assertEqual(response.status_code, 200)
+            product_queries = [
+                query['sql'] for query in queries.captured_queries
+                if 'FROM "main_product"' in query['sql']
+            ]
+            self.assertEqual(len(product_queries), 1)
+            self.assertNotIn('COUNT(', product_queries[0])
+            self.assertNotIn('OFFSET', product_queries[0])
+            seen.extend(product.pk for product in response.context['products'])
+            load_more_url = response.context['load_more_url']
+        return seen
+
+    def test_cursor_walks_whole_listing_in_sort_order(self):
+        for sort, order in [('price_asc', ('price', 'id')), ('new', ('-created_at', '-id'))]:
+            expected = list(
+                Product.objects.filter(category=self.books)
+                .order_by(*order)
+                .values_list('pk', flat=True)
+            )
+            self.assertEqual(self.walk(sort), expected)
+
+    def test_load_more_partial_appends_cards(self):
+        response = self.client.get(self.url, {'sort': 'price_desc'})
+        self.assertIn('Показать ещё', response.content.decode('utf-8'))
+
+        response = self.client.get(response.context['load_more_url'], HTTP_HX_REQUEST='true')
+
+        content = response.content.decode('utf-8')
+        self.assertEqual(content.count('data-product-card='), 15)
+        self.assertIn('hx-swap-oob="true"', content)
+
+    def test_invalid_or_foreign_cursor_is_rejected(self):
+        from main.pagination import InvalidCursor, paginate_keyset
+
+        products = Product.objects.all()
+        cursor = paginate_keyset(products, 'price_asc', 'price').next_cursor
+
+        with self.assertRaises(InvalidCursor):
+            paginate_keyset(products, 'price_asc', 'price', 'garbage')
+        with self.assertRaises(InvalidCursor):
+            paginate_keyset(products, 'new', '-created_at', cursor)
+
+    def test_numbered_pages_are_capped(self):
+        from main.pagination import CATALOG_NUMBERED_PAGES
+
+        response = self.client.get(self.url, {'page': 400})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(response.context['page_obj'].number, CATALOG_NUMBERED_PAGES)
+
+
+class CatalogFragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.books = Category.objects.create(name='Книги')
+        self.genre = Genre.objects.create(category=self.books, name='Проза', slug='prose')
+        Product.objects.create(
+            erp_product_id='fragment-1',
+            name='Кэшируемая книга',
+            slug='fragment-1',
+            category=self.books,
+            genre=self.genre,
+            price=300,
+        )
+        self.url = reverse('main:catalog', kwargs={'category_slug': self.books.slug})
+
+    def test_normalized_params_share_fragment(self):
+        first = self.client.get(
+            self.url,
+            {'genre': 'prose,poetry', 'min_price': '', 'sort': 'price_asc'},
+            HTTP_HX_REQUEST='true',
+        )
+        second = self.client.get(
+            f'{self.url}?sort=price_asc&genre=poetry&genre=prose',
+            HTTP_HX_REQUEST='true',
+        )
+
+        self.assertEqual(first.content, second.content)
+        stats = get_catalog_fragment_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_catalog_changes_invalidate_fragments(self):
+        self.client.get(self.url, HTTP_HX_REQUEST='true')
+        version = get_catalog_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.genre.save()
+            self.assertEqual(get_catalog_version(), version)
+        response = self.client.get(self.url, HTTP_HX_REQUEST='true')
+
+        self.assertGreater(get_catalog_version(), version)
+        self.assertEqual(get_catalog_fragment_stats()['misses'], 2)
+        self.assertIn('Кэшируемая книга', response.content.decode('utf-8'))
+
+    def test_visitor_with_cart_items_bypasses_cache(self):
+
+        self.client.get(self.url, HTTP_HX_REQUEST='true')
+        cart = Cart.objects.create(session_key=self.client.session.session_key)
+        cart.items.create(product=Product.objects.get(slug='fragment-1'), quantity=1)
+
+        self.client.get(self.url, HTTP_HX_REQUEST='true')
+
+        stats = get_catalog_fragment_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (0, 1))
+
+    def test_erp_sync_bumps_version_once(self):
+        from unittest import mock
+
+        from integrations.erp import sync_erp_products
+
+        payloads = [
+            {
+                'id': 30000 + index,
+                'name': f'Синхронизация {index}',
+                'prices': [{'price': 100, 'currency_code': 'RUB'}],
+            }
+            for index in range(3)
+        ]
+        client = mock.Mock()
+        client.list_products.return_value = iter([payloads])
+        version = get_catalog_version()
+
+        with mock.patch('integrations.erp.require_erp_client', return_value=client), \
+                self.captureOnCommitCallbacks(execute=True):
+            stats = sync_erp_products(write_state=False)
+
+        self.assertEqual(stats['created'], 3)
+        self.assertEqual(get_catalog_version(), version + 1)
+
+
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.books = Category.objects.create(name='Книги')
+        self.genre = Genre.objects.create(category=self.books, name='Проза', slug='prose')
+        Category.objects.create(name='Пустая')
+        self.product = Product.objects.create(
+            erp_product_id='tree-1',
+            name='Книга',
+            slug='tree-1',
+            category=self.books,
+            genre=self.genre,
+            price=100,
+        )
+
+    def test_tree_is_served_from_memory_until_version_changes(self):
+        from main.category_tree import get_category_tree
+
+        tree = get_category_tree()
+        self.assertEqual([category.slug for category in tree], [self.books.slug])
+        self.assertEqual(tree[0].products_count, 1)
+        self.assertEqual([genre.slug for genre in tree[0].genre_list], ['prose'])
+
+        with self.assertNumQueries(0):
+            get_category_tree()
+
+        self.product.price = 200
+        self.product.save()
+        with self.assertNumQueries(0):
+            get_category_tree()
+
+        self.product.is_published = False
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.product.save()
+        with self.assertNumQueries(0):
+            get_category_tree()
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_category_tree(), [])
+
+    def test_callers_cannot_change_shared_tree(self):
+        from main.category_tree import get_category_tree, get_tree_category
+
+        tree = get_category_tree()
+        tree[0].products_count = 99
+        tree[0].genre_list[0].name = 'Изменено'
+        tree[0].genre_list.append(Genre(name='Лишний'))
+        get_tree_category(self.books.slug).products_count = 100
+
+        with self.assertNumQueries(0):
+            tree = get_category_tree()
+        self.assertEqual(tree[0].products_count, 1)
+        self.assertEqual([genre.name for genre in tree[0].genre_list], ['Проза'])
+
+    def test_other_process_reads_shared_copy(self):
+        from main import category_tree
+
+        category_tree.get_category_tree()
+        category_tree._process_copy.version = None
+
+        with self.assertNumQueries(0):
+            tree = category_tree.get_category_tree()
+
+        self.assertEqual(tree[0].products_count, 1)
+
+    def test_waits_for_concurrent_rebuild_instead_of_querying(self):
+        from main import category_tree
+
+        version = category_tree.get_category_tree_version()
+        cache.add(f'{category_tree.CATEGORY_TREE_LOCK_KEY_PREFIX}:{version}', 1)
+        built = category_tree._build_tree()
+        cache.set(f'{category_tree.CATEGORY_TREE_KEY_PREFIX}:{version}', built)
+        category_tree._process_copy.version = None
+
+        with self.assertNumQueries(0):
+            tree = category_tree.get_category_tree()
+
+        self.assertEqual([category.slug for category in tree], [self.books.slug])
+
+    def test_waiter_that_gives_up_keeps_owner_lock(self):
+        from unittest import mock
+
+        from main import category_tree
+
+        version = category_tree.get_category_tree_version()
+        lock_key = f'{category_tree.CATEGORY_TREE_LOCK_KEY_PREFIX}:{version}'
+        cache.add(lock_key, 'owner')
+        category_tree._process_copy.version = None
+
+        with mock.patch.object(category_tree, 'CATEGORY_TREE_WAIT_ATTEMPTS', 0):
+            tree = category_tree._load_shared_tree(version)
+
+        self.assertEqual([category.slug for category in tree], [self.books.slug])
+        self.assertEqual(cache.get(lock_key), 'owner')
+
+    def test_catalog_resolves_category_from_tree(self):
+        response = self.client.get(reverse('main:catalog', kwargs={'category_slug': self.books.slug}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['current_category_label'], 'Книги')
+
+
+class CatalogBoundsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.books = Category.objects.create(name='Книги')
+        self.genre = Genre.objects.create(category=self.books, name='Проза', slug='prose')
+        self.cheap = Product.objects.create(
+            erp_product_id='bounds-1',
+            name='Дешёвая',
+            slug='bounds-1',
+            category=self.books,
+            genre=self.genre,
+            price=200,
+            year=1985,
+        )
+        Product.objects.create(
+            erp_product_id='bounds-2',
+            name='Дорогая',
+            slug='bounds-2',
+            category=self.books,
+            price=4000,
+            year=2010,
+        )
+
+    def test_bounds_follow_product_changes(self):
+        from main.models import CatalogBounds
+
+        bounds = CatalogBounds.objects.get(category=self.books)
+        self.assertEqual((bounds.min_price, bounds.max_price), (200, 4000))
+        self.assertEqual(bounds.price_preset_counts['gt_3000'], 1)
+
+        self.cheap.price = 500
+        self.cheap.save()
+        bounds.refresh_from_db()
+        self.assertEqual(bounds.min_price, 500)
+
+        self.cheap.is_published = False
+        self.cheap.save()
+        bounds.refresh_from_db()
+        self.assertEqual((bounds.products_count, bounds.min_year), (1, 2010))
+        self.assertEqual(CatalogBounds.objects.get(category=None).products_count, 1)
+
+    def test_category_only_listing_uses_stored_bounds(self):
+        from main.catalog_bounds import get_catalog_bounds
+        from main.facets import build_catalog_facets
+        from main.services import parse_catalog_filter_state
+
+        stored = get_catalog_bounds(self.books)
+        state = parse_catalog_filter_state(QueryDict('price_range=gt_3000'))
+        products = Product.objects.filter(category=self.books)
+
+        with self.assertNumQueries(1):
+            facets = build_catalog_facets(products, state, stored_bounds=stored)
+
+        self.assertEqual(facets['price_bounds']['min'], 200)
+        self.assertEqual(facets['price_bounds']['presets'][-1]['count'], 1)
+
+    def test_ad_hoc_filters_use_live_aggregate(self):
+        url = reverse('main:catalog', kwargs={'category_slug': self.books.slug})
+
+        response = self.client.get(url)
+        self.assertEqual(response.context['price_bounds']['min'], 200)
+
+        response = self.client.get(url, {'genre': 'prose', 'min_year': '2000'})
+        self.assertLess(response.context['price_bounds']['max'], 4000)
+        self.assertEqual(len(response.context['products'].object_list), 0)
+
+    def test_erp_sync_refreshes_bounds_once(self):
+        from unittest import mock
+
+        from integrations.erp import sync_erp_products
+
+        client = mock.Mock()
+        client.list_products.return_value = iter([[
+            {
+                'id': 31000 + index,
+                'name': f'Границы {index}',
+                'prices': [{'price': 100 + index, 'currency_code': 'RUB'}],
+            }
+            for index in range(3)
+        ]])
+
+        with mock.patch('integrations.erp.require_erp_client', return_value=client), \
+                mock.patch('main.catalog_bounds.refresh_catalog_bounds') as refresh:
+            sync_erp_products(write_state=False)
+
+        refresh.assert_called_once()
+
+    @override_settings(INTERNET_SHOP_API_KEY='bounds-key')
+    def test_api_bulk_upsert_refreshes_bounds_once(self):
+        from unittest import mock
+
+        payload = {
+            'products': [
+                {'sku': f'BOUNDS-API-{index}', 'name': f'Пакет {index}', 'price': 300 + index, 'category': 'Книги'}
+                for index in range(3)
+            ],
+        }
+        with mock.patch('main.catalog_bounds.refresh_catalog_bounds') as refresh:
+            response = self.client.post(
+                reverse('api:products-bulk-upsert'),
+                data=json.dumps(payload),
+                content_type='application/json',
+                HTTP_AUTHORIZATION='Bearer bounds-key',
+            )
+
+        self.assertEqual(len(response.json()['results']), 3)
+        refresh.assert_called_once()
+
+
+class ProductCardProjectionTests(TestCase):
+    def setUp(self):
+        self.books = Category.objects.create(name='Книги')
+        self.genre = Genre.objects.create(category=self.books, name='Проза', slug='prose')
+        self.url = reverse('main:catalog', kwargs={'category_slug': self.books.slug})
+
+    def create_products(self, count, offset=0):
+        for index in range(offset, offset + count):
+            Product.objects.create(
+                erp_product_id=f'card-{index}',
+                name=f'Карточка {index}',
+                slug=f'card-{index}',
+                category=self.books,
+                genre=self.genre,
+                year=2000,
+                price=100,
+                description='Длинное описание. ' * 200,
+                external_images=[
+                    {'url': f'https://img.example/{index}/2.jpg', 'position': 2},
+                    {'url': f'https://img.example/{index}/1.jpg', 'position': 1},
+                ],
+            )
+
+    def test_card_images_are_computed_on_save(self):
+        self.create_products(1)
+        product = Product.objects.get(slug='card-0')
+
+        self.assertEqual(product.primary_image_url, 'https://img.example/0/1.jpg')
+        self.assertEqual(len(product.card_image_urls), 2)
+
+        product.external_image_url = 'https://img.example/main.jpg'
+        product.save(update_fields=['external_image_url'])
+        product.refresh_from_db()
+        self.assertEqual(product.primary_image_url, 'https://img.example/main.jpg')
+
+    def test_uploaded_main_image_gets_its_stored_url(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.create_products(1)
+        product = Product.objects.get(slug='card-0')
+        buffer = BytesIO()
+        Image.new('RGB', (60, 80)).save(buffer, 'PNG')
+
+        with override_settings(MEDIA_ROOT=media_root):
+            product.main_image = SimpleUploadedFile('cover.png', buffer.getvalue(), content_type='image/png')
+            product.save(update_fields=['main_image'])
+
+            card = Product.objects.cards().get(pk=product.pk)
+            self.assertEqual(card.card_images[0]['url'], product.main_image.url)
+            self.assertTrue(product.main_image.name.startswith('products/main/'))
+            self.assertTrue(default_storage.exists(product.main_image.name))
+
+    def test_cards_skip_heavy_columns(self):
+        self.create_products(1)
+
+        with CaptureQueriesContext(connection) as queries:
+            product = Product.objects.cards().get(slug='card-0')
+            self.assertEqual(str(product.genre), 'Проза')
+            self.assertEqual(product.card_images[0]['url'], 'https://img.example/0/1.jpg')
+
+        self.assertEqual(len(queries.captured_queries), 1)
+        sql = queries.captured_queries[0]['sql']
+        self.assertNotIn('"description"', sql)
+        self.assertNotIn('"external_images"', sql)
+
+    def test_catalog_query_count_does_not_grow_with_cards(self):
+        self.create_products(2)
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.url)
+
+        self.create_products(10, offset=2)
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(self.url)
+
+        self.assertEqual(len(response.context['products'].object_list), 12)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+
+class ProductReviewStatsTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Книги')
+        self.product = Product.objects.create(
+            erp_product_id='reviews-101',
+            name='Книга с отзывами',
+            slug='kniga-s-otzyvami',
+            category=self.category,
+            price=500,
+        )
+
+    def test_stats_follow_review_changes(self):
+        first = ProductReview.objects.create(product=self.product, author_name='Анна', rating=5, text='Отлично')
+        ProductReview.objects.create(product=self.product, author_name='Борис', rating=3, text='Неплохо')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reviews_total, 2)
+        self.assertEqual(self.product.reviews_average, 4.0)
+
+        first.is_public = False
+        first.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reviews_total, 1)
+        self.assertEqual(self.product.reviews_average, 3.0)
+
+        ProductReview.objects.filter(product=self.product).delete()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reviews_total, 0)
+        self.assertEqual(self.product.reviews_average, 0.0)
+
+    def test_refresh_command_backfills_and_checks(self):
+        ProductReview.objects.create(product=self.product, author_name='Анна', rating=4, text='Хорошо')
+        Product.objects.filter(pk=self.product.pk).update(reviews_total=0, reviews_average=0)
+
+        with self.assertRaises(CommandError):
+            call_command('refresh_review_stats', '--check', stdout=StringIO())
+
+        call_command('refresh_review_stats', stdout=StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reviews_total, 1)
+        self.assertEqual(self.product.reviews_average, 4.0)
+        call_command('refresh_review_stats', '--check', stdout=StringIO())
+
+    def test_catalog_cards_use_stored_stats(self):
+        ProductReview.objects.create(product=self.product, author_name='Анна', rating=5, text='Отлично')
+
+        response = self.client.get(reverse('main:catalog', kwargs={'category_slug': self.category.slug}))
+
+        self.assertEqual(response.status_code, 200)
+        products = list(response.context['products'].object_list)
+        self.assertEqual(products[0].reviews_total, 1)
+        self.assertIn('1 отзыв', response.content.decode('utf-8'))
+
+
+    def test_new_review_updates_stats_incrementally(self):
+        ProductReview.objects.create(product=self.product, author_name='Анна', rating=5, text='Отлично')
+        url = reverse('main:product_review_create', kwargs={'slug': self.product.slug})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {'author_name': 'Борис', 'rating': 2, 'text': 'Так себе'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries.captured_queries if 'AVG(' in query['sql']])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reviews_total, 2)
+        self.assertEqual(self.product.reviews_average, 3.5)
+        self.assertEqual(
+            [(row['rating'], row['count'], row['percent']) for row in self.product.reviews_histogram],
+            [(5, 1, 50), (4, 0, 0), (3, 0, 0), (2, 1, 50), (1, 0, 0)],
+        )
+        self.assertEqual(response.context['reviews_total'], 2)
+        call_command('refresh_review_stats', '--check', stdout=StringIO())
+
+    def test_reviews_are_loaded_by_cursor(self):
+        for index in range(23):
+            ProductReview.objects.create(
+                product=self.product,
+                author_name=f'Читатель {index}',
+                rating=index % 5 + 1,
+                text='Отзыв',
+            )
+        ProductReview.objects.create(
+            product=self.product, author_name='Скрытый', rating=1, text='Скрыт', is_public=False,
+        )
+
+        response = self.client.get(reverse('main:product_detail', kwargs={'slug': self.product.slug}))
+        names = [review.author_name for review in response.context['reviews']]
+        self.assertEqual(names[0], 'Читатель 22')
+        self.assertEqual(len(names), 10)
+        next_url = response.context['reviews_load_more_url']
+        self.assertIn('?cursor=', next_url)
+
+        while next_url:
+            response = self.client.get(next_url)
+            self.assertEqual(response.status_code, 200)
+            names.extend(review.author_name for review in response.context['reviews'])
+            next_url = response.context['reviews_load_more_url']
+
+        self.assertEqual(names, [f'Читатель {index}' for index in range(22, -1, -1)])
+        self.assertContains(response, 'hx-swap-oob="true"')
+
+
+@override_settings(PRODUCT_VIEWS_FLUSH_INTERVAL=3600, PRODUCT_VIEWS_MAX_PENDING=1000)
+class ProductPopularityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        product_views.reset()
+        self.addCleanup(product_views.reset)
+        self.category = Category.objects.create(name='Книги')
+        self.products = [
+            Product.objects.create(
+                erp_product_id=f'popular-{index}',
+                name=f'Книга {index}',
+                slug=f'popular-{index}',
+                category=self.category,
+                price=100,
+            )
+            for index in range(4)
+        ]
+
+    def test_views_are_buffered_and_flushed_in_batches(self):
+        buffer = ViewCounterBuffer()
+        first, second, third, _ = self.products
+        for product in (first, first, first, second, third):
+            buffer.add(product.pk)
+
+        self.assertEqual(buffer.pending(), {first.pk: 3, second.pk: 1, third.pk: 1})
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(buffer.flush(), 3)
+
+        updates = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(
+            dict(Product.objects.filter(pk__in=[first.pk, second.pk, third.pk]).values_list('pk', 'views_count')),
+            {first.pk: 3, second.pk: 1, third.pk: 1},
+        )
+        self.assertEqual(buffer.pending(), {})
+
+    def test_flush_is_scheduled_when_buffer_is_full(self):
+        buffer = ViewCounterBuffer()
+        with override_settings(PRODUCT_VIEWS_MAX_PENDING=2), self.captureOnCommitCallbacks(execute=True):
+            buffer.add(self.products[0].pk)
+            buffer.add(self.products[1].pk)
+
+        self.assertEqual(buffer.pending(), {})
+        self.products[1].refresh_from_db()
+        self.assertEqual(self.products[1].views_count, 1)
+
+    def test_product_page_counts_view_without_writing(self):
+        url = reverse('main:product_detail', kwargs={'slug': self.products[2].slug})
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE') and 'views_count' in query['sql']
+        ])
+        self.assertEqual(product_views.pending(), {self.products[2].pk: 1})
+        product_views.flush()
+
+    def test_popular_sort_uses_stored_score(self):
+        viewed, favorite, ordered, _ = self.products
+        Product.objects.filter(pk=viewed.pk).update(views_count=20)
+        favorite_list = FavoriteList.objects.create(session_key='popular-favorites')
+        FavoriteItem.objects.create(favorite_list=favorite_list, product=favorite)
+        user = get_user_model().objects.create(phone='+70000000009', first_name='Тест')
+        order = Order.objects.create(user=user, first_name='Тест', phone='1', total_price=100)
+        OrderItem.objects.create(order=order, product=ordered, quantity=2, price=100)
+
+        out = StringIO()
+        call_command('refresh_popularity', '--batch-size', '2', stdout=out)
+        self.assertIn('updated=3', out.getvalue())
+
+        response = self.client.get(
+            reverse('main:catalog', kwargs={'category_slug': self.category.slug}), {'sort': 'popular'},
+        )
+        names = [product.name for product in response.context['products'].object_list]
+        self.assertEqual(names[:3], [ordered.name, favorite.name, viewed.name])
+
+        out = StringIO()
+        call_command('refresh_popularity', stdout=out)
+        self.assertIn('updated=0', out.getvalue())
+
+
+@override_settings(DEBUG=True)
+class ProductDetailQueriesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.books = Category.objects.create(name='Книги')
+        self.genre = Genre.objects.create(category=self.books, name='Проза', slug='prose')
+        self.product = Product.objects.create(
+            erp_product_id='detail-1',
+            name='Книга',
+            slug='detail-book',
+            category=self.books,
+            genre=self.genre,
+            price=500,
+        )
+        for index in range(3):
+            Product.objects.create(
+                erp_product_id=f'detail-related-{index}',
+                name=f'Похожая {index}',
+                slug=f'detail-related-{index}',
+                category=self.books,
+                price=300,
+            )
+        ProductReview.objects.create(product=self.product, author_name='Анна', rating=5, text='Отлично')
+        ProductReview.objects.create(product=self.product, author_name='Борис', rating=4, text='Хорошо')
+        self.url = reverse('main:product_detail', kwargs={'slug': self.product.slug})
+
+    def test_product_page_view_queries(self):
+        self.client.get(self.url)
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(int(response['X-Query-Count']), 4)
+        self.assertEqual(response.context['reviews_total'], 2)
+        self.assertEqual(response.context['reviews_average_display'], '4.5')
+        self.assertEqual(len(response.context['reviews']), 2)
+        self.assertEqual(len(response.context['related_products']), 3)
+        self.assertIsNone(response.context['product_cart_item'])
+
+    def test_cart_item_comes_with_product(self):
+        self.client.get(self.url)
+        cart = Cart.objects.create(session_key=self.client.session.session_key)
+        item = CartItem.objects.create(cart=cart, product=self.product, quantity=3)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.context['product_cart_item'], {'id': item.pk, 'quantity': 3})
+        self.assertEqual(response.context['product_cart_quantity'], 3)
+        # +1 — ленивая загрузка корзины, раньше она шла в CartMiddleware.
+        self.assertLessEqual(int(response['X-Query-Count']), 5)
+
+    def test_missing_product_returns_404(self):
+        with self.assertRaises(Http404):
+            get_product_detail('missing')
+
+
+class ProductRelationTests(TestCase):
+    def setUp(self):
+        self.books = Category.objects.create(name='Книги')
+        self.genre = Genre.objects.create(category=self.books, name='Проза', slug='prose')
+        self.other_genre = Genre.objects.create(category=self.books, name='Поэзия', slug='poetry')
+        self.products = {
+            key: Product.objects.create(
+                erp_product_id=f'rel-{key}',
+                name=f'Товар {key}',
+                slug=f'rel-{key}',
+                category=self.books,
+                genre=self.other_genre if key in ('d', 'e') else self.genre,
+                authors='Лев Толстой' if key in ('a', 'e') else '',
+                price=100,
+            )
+            for key in ('a', 'b', 'c', 'd', 'e')
+        }
+        self.user = get_user_model().objects.create(phone='+70000000001', first_name='Тест')
+
+    def order(self, *keys):
+        order = Order.objects.create(user=self.user, first_name='Тест', phone='1', total_price=100)
+        for key in keys:
+            OrderItem.objects.create(order=order, product=self.products[key], quantity=1, price=100)
+        return order
+
+    def favorites(self, *keys):
+        favorite_list = FavoriteList.objects.create(session_key=f'fav-{"".join(keys)}')
+        for key in keys:
+            FavoriteItem.objects.create(favorite_list=favorite_list, product=self.products[key])
+
+    def related_keys(self, key):
+        names = {product.pk: name for name, product in self.products.items()}
+        return [
+            names[relation.related_id]
+            for relation in ProductRelation.objects.filter(product=self.products[key]).order_by('position')
+        ]
+
+    def test_co_occurrence_ranks_before_fallback(self):
+        self.order('a', 'b')
+        self.favorites('a', 'c')
+        self.order('a', 'b', 'd')
+
+        call_command('rebuild_product_relations', '--batch-size', '2', stdout=StringIO())
+
+        related = self.related_keys('a')
+        self.assertEqual(related[:3], ['b', 'd', 'c'])
+        self.assertEqual(related[3], 'e')
+        relation = ProductRelation.objects.get(product=self.products['a'], related=self.products['b'])
+        self.assertEqual(relation.score, 6.0)
+        self.assertEqual(relation.source, ProductRelation.SOURCE_CO_OCCURRENCE)
+
+    def test_fallback_uses_author_then_genre(self):
+        call_command('rebuild_product_relations', stdout=StringIO())
+
+        self.assertEqual(self.related_keys('e'), ['a', 'd'])
+        sources = set(
+            ProductRelation.objects.filter(product=self.products['e'])
+            .values_list('source', flat=True)
+        )
+        self.assertEqual(sources, {ProductRelation.SOURCE_AUTHOR, ProductRelation.SOURCE_GENRE})
+
+    def test_unpublished_products_are_skipped(self):
+        self.order('a', 'b')
+        Product.objects.filter(pk=self.products['b'].pk).update(is_published=False)
+
+        call_command('rebuild_product_relations', stdout=StringIO())
+
+        self.assertNotIn('b', self.related_keys('a'))
+        self.assertFalse(ProductRelation.objects.filter(product=self.products['b']).exists())
+
+    def test_since_rebuilds_only_active_baskets(self):
+        call_command('rebuild_product_relations', stdout=StringIO())
+        untouched = ProductRelation.objects.get(product=self.products['c'], position=0).updated_at
+        self.order('a', 'b')
+
+        output = StringIO()
+        call_command('rebuild_product_relations', '--since', '2000-01-01', stdout=output)
+
+        self.assertIn('products=2', output.getvalue())
+        self.assertEqual(
+            ProductRelation.objects.get(product=self.products['c'], position=0).updated_at,
+            untouched,
+        )
+        self.assertEqual(self.related_keys('b')[0], 'a')
+
+    def test_active_products_are_collected_without_ordering(self):
+        self.order('a', 'b')
+        self.favorites('a', 'c')
+        self.favorites('a', 'b', 'd')
+
+        with CaptureQueriesContext(connection) as queries:
+            product_ids = collect_active_product_ids(timezone.now() - timedelta(days=1))
+
+        self.assertEqual(
+            product_ids,
+            {self.products[key].pk for key in ('a', 'b', 'c', 'd')},
+        )
+        for query in queries.captured_queries:
+            self.assertIn('SELECT DISTINCT', query['sql'])
+            self.assertNotIn('ORDER BY', query['sql'])
+
+    def test_related_products_read_from_table(self):
+        self.order('a', 'd')
+        call_command('rebuild_product_relations', stdout=StringIO())
+
+        related = get_related_products(self.products['a'])
+
+        self.assertEqual(related[0], self.products['d'])
+
+
+class ImageRenditionsTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media_root = media_root
+
+    def make_image(self, name='cover.png', size=(600, 800), mode='RGBA'):
+        buffer = BytesIO()
+        Image.new(mode, size, (200, 40, 40, 255) if mode == 'RGBA' else (200, 40, 40)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_product_upload_builds_renditions(self):
+        product = Product.objects.create(
+            erp_product_id='thumb-1',
+            name='Книга',
+            slug='thumb-book',
+            price=100,
+            main_image=self.make_image(),
+        )
+
+        renditions = product.image_renditions
+        self.assertEqual(renditions['source'], product.main_image.name)
+        self.assertEqual(product.primary_image_url, product.main_image.url)
+        self.assertEqual([size['width'] for size in renditions['sizes']], [240, 480])
+        self.assertEqual(renditions['sizes'][0]['height'], 320)
+        for size in renditions['sizes']:
+            for extension in ('webp', 'jpeg'):
+                name = size[extension].removeprefix(settings.MEDIA_URL)
+                self.assertTrue(default_storage.exists(name))
+                self.assertIn(renditions['hash'], name)
+        self.assertEqual(product.card_images[0]['renditions'], renditions)
+        self.assertEqual(product.gallery_images[0]['renditions'], renditions)
+
+    def test_same_content_reuses_files(self):
+        first = Category.objects.create(name='Книги', image=self.make_image('a.png'))
+        second = Genre.objects.create(category=first, name='Проза', slug='prose', image=self.make_image('b.png'))
+
+        self.assertNotEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image_renditions['sizes'], second.image_renditions['sizes'])
+
+    def test_small_image_keeps_its_width(self):
+        banner = Banner.objects.create(title='Баннер', image=self.make_image(size=(120, 60), mode='RGB'))
+
+        self.assertEqual([size['width'] for size in banner.image_renditions['sizes']], [120])
+
+    def test_broken_image_does_not_break_save(self):
+        upload = SimpleUploadedFile('broken.png', b'not an image', content_type='image/png')
+        with self.assertLogs('main.renditions', level='WARNING'):
+            category = Category.objects.create(name='Битая', image=upload)
+
+        self.assertEqual(category.image_renditions['sizes'], [])
+        category.name = 'Битая обложка'
+        category.save()
+
+    def test_backfill_command_builds_missing_renditions(self):
+        category = Category.objects.create(name='Книги', image=self.make_image())
+        Category.objects.filter(pk=category.pk).update(image_renditions={})
+        version = get_catalog_version()
+
+        output = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('generate_image_renditions', '--models', 'category', '--workers', '0', stdout=output)
+
+        category.refresh_from_db()
+        self.assertEqual(len(category.image_renditions['sizes']), 2)
+        self.assertIn('checked=1 built=1 failed=0', output.getvalue())
+        self.assertGreater(get_catalog_version(), version)
+
+        output = StringIO()
+        call_command('generate_image_renditions', '--models', 'category', '--workers', '0', stdout=output)
+        self.assertIn('checked=1 built=0', output.getvalue())
+
+    def test_srcset_tags(self):
+        renditions = {'sizes': [
+            {'width': 240, 'webp': '/media/a-240w.webp', 'jpeg': '/media/a-240w.jpeg'},
+            {'width': 480, 'webp': '/media/a-480w.webp', 'jpeg': '/media/a-480w.jpeg'},
+        ]}
+        template = Template(
+            '{% load image_tags %}{% webp_source renditions "50vw" %}|{% srcset_attrs renditions "50vw" %}'
+        )
+
+        rendered = template.render(Context({'renditions': renditions}))
+
+        self.assertEqual(
+            rendered,
+            '<source type="image/webp" srcset="/media/a-240w.webp 240w, /media/a-480w.webp 480w" sizes="50vw">'
+            '|srcset="/media/a-240w.jpeg 240w, /media/a-480w.jpeg 480w" sizes="50vw"',
+        )
+        self.assertEqual(template.render(Context({'renditions': {}})), '|')
+
+
+class ImageMirrorServer:
+    """
+    Локальная подмена CDN ERP: отдаёт картинки по путям, понимает
+    If-None-Match и считает запросы.
+    """
+
+    def __init__(self, files):
+        self.files = files
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append((self.path, self.headers.get('If-None-Match')))
+                body = server.files.get(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/png')
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.httpd.server_port}{path}'
+
+
+class ImageMirrorTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, ERP_IMAGE_MIRROR_WORKERS=4)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def png(self, color):
+        buffer = BytesIO()
+        Image.new('RGB', (500, 700), color).save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def create_product(self, slug, main_url, extra_urls=()):
+        return Product.objects.create(
+            erp_product_id=slug,
+            name=slug,
+            slug=slug,
+            price=100,
+            external_image_url=main_url,
+            external_images=[
+                {'url': url, 'position': index}
+                for index, url in enumerate([main_url, *extra_urls])
+            ],
+        )
+
+    def mirror(self, *args):
+        output = StringIO()
+        call_command('mirror_erp_images', *args, stdout=output)
+        return output.getvalue()
+
+    def test_images_are_mirrored_and_deduplicated(self):
+        red = self.png((255, 0, 0))
+        files = {'/a.png': red, '/copy-of-a.png': red, '/b.png': self.png((0, 0, 255))}
+        with ImageMirrorServer(files) as server:
+            first = self.create_product('mirror-1', server.url('/a.png'), [server.url('/b.png')])
+            second = self.create_product('mirror-2', server.url('/copy-of-a.png'))
+            output = self.mirror()
+
+        self.assertIn('products=2 updated=2 urls=3 downloaded=2 deduplicated=1', output)
+        self.assertEqual(MirroredImage.objects.count(), 3)
+        self.assertEqual(MirroredImage.objects.values('content_hash').distinct().count(), 2)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertTrue(first.primary_image_url.startswith(settings.MEDIA_URL))
+        self.assertEqual(first.primary_image_url, second.primary_image_url)
+        self.assertTrue(default_storage.exists(first.primary_image_url.removeprefix(settings.MEDIA_URL)))
+        gallery = first.gallery_images
+        self.assertEqual(len(gallery), 2)
+        self.assertTrue(all(image['url'].startswith(settings.MEDIA_URL) for image in gallery))
+        self.assertEqual(len(gallery[0]['renditions']['sizes']), 2)
+        self.assertEqual(first.card_images[1]['url'], gallery[1]['url'])
+
+    def test_copy_saved_by_another_worker_is_deduplicated(self):
+        from unittest import mock
+
+        red = self.png((255, 0, 0))
+        with ImageMirrorServer({'/a.png': red, '/copy-of-a.png': red}) as server:
+            first = fetch_image(server.url('/a.png'))
+            # Второй поток проверил exists() до того, как первый сохранил файл:
+            # первая проверка каждого имени промахивается, дальше — как есть.
+            exists = default_storage.exists
+            checked = set()
+
+            def stale_exists(name):
+                if name in checked:
+                    return exists(name)
+                checked.add(name)
+                return False
+
+            with mock.patch.object(default_storage, 'exists', side_effect=stale_exists):
+                second = fetch_image(server.url('/copy-of-a.png'))
+
+        self.assertEqual((first.status, second.status), ('downloaded', 'deduplicated'))
+        self.assertEqual(second.name, first.name)
+        self.assertEqual(second.renditions['sizes'], first.renditions['sizes'])
+        directory = first.name.rsplit('/', 1)[0]
+        self.assertEqual(default_storage.listdir(directory)[1], [first.name.rsplit('/', 1)[1]])
+
+    def test_only_http_urls_are_fetched(self):
+        path = f'{settings.MEDIA_ROOT}/local.png'
+        with open(path, 'wb') as image_file:
+            image_file.write(self.png((255, 0, 0)))
+        product = self.create_product('mirror-file', f'file://{path}')
+
+        with self.assertLogs('integrations.image_mirror', level='WARNING'):
+            output = self.mirror()
+
+        self.assertIn('failed=1', output)
+        product.refresh_from_db()
+        self.assertEqual(product.primary_image_url, f'file://{path}')
+        self.assertEqual(MirroredImage.objects.get().last_error, 'Unsupported URL scheme.')
+
+    def test_unchanged_urls_are_skipped(self):
+        with ImageMirrorServer({'/a.png': self.png((255, 0, 0))}) as server:
+            product = self.create_product('mirror-etag', server.url('/a.png'))
+            self.mirror()
+            self.assertEqual(len(server.requests), 1)
+
+            output = self.mirror()
+            self.assertIn('skipped=1', output)
+            self.assertEqual(len(server.requests), 1)
+
+            output = self.mirror('--force')
+            self.assertIn('not_modified=1', output)
+            self.assertIn('updated=0', output)
+            self.assertIsNotNone(server.requests[-1][1])
+
+        product.refresh_from_db()
+        self.assertTrue(product.primary_image_url.startswith(settings.MEDIA_URL))
+
+    def test_failed_download_keeps_external_url(self):
+        with ImageMirrorServer({}) as server:
+            product = self.create_product('mirror-404', server.url('/missing.png'))
+            with self.assertLogs('integrations.image_mirror', level='WARNING'):
+                output = self.mirror()
+
+        self.assertIn('failed=1', output)
+        product.refresh_from_db()
+        self.assertEqual(product.primary_image_url, product.external_image_url)
+        self.assertEqual(MirroredImage.objects.get().last_error, 'HTTP 404')
+
+    def test_erp_resync_keeps_mirrored_urls(self):
+        with ImageMirrorServer({'/a.png': self.png((255, 0, 0))}) as server:
+            product = self.create_product('mirror-resync', server.url('/a.png'))
+            self.mirror()
+
+        product.refresh_from_db()
+        mirrored_url = product.primary_image_url
+        product.name = 'Обновлено из ERP'
+        product.save()
+
+        product.refresh_from_db()
+        self.assertEqual(product.primary_image_url, mirrored_url)
+
+
+class FakeDeepSeekService(DeepSeekReviewService):
+    def __init__(self, delay=0.0, fail=False):
+        super().__init__(api_key='key', api_url='http://deepseek.invalid', model='deepseek-chat', timeout=5)
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def _perform_request(self, payload):
+        with self.lock:
+            self.calls += 1
+            number = self.calls
+        time.sleep(self.delay)
+        if self.fail:
+            raise DeepSeekAPIError('DeepSeek API вернул ошибку.', status_code=503)
+        return {'choices': [{'message': {'content': f'Рецензия {number}'}}]}
+
+
+class AIReviewCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(
+            erp_product_id='ai-1',
+            name='Война и мир',
+            slug='war-and-peace',
+            authors='Лев Толстой',
+            year=1869,
+            price=100,
+        )
+
+    def create_edition(self):
+        return Product.objects.create(
+            erp_product_id='ai-2',
+            name='Война и мир',
+            slug='war-and-peace-2',
+            authors='Лев Толстой',
+            year=1869,
+            price=200,
+        )
+
+    def test_same_prompt_is_shared_between_products(self):
+        AIReview.objects.create(product=self.product, prompt_hash='hash', model='deepseek-chat', text='Рецензия')
+        edition = self.create_edition()
+
+        review, stored = find_usable_review(edition, 'hash')
+
+        self.assertIsNone(stored)
+        self.assertEqual((review.product, review.text), (edition, 'Рецензия'))
+        self.assertEqual(AIReview.objects.count(), 2)
+
+    @override_settings(DEEPSEEK_REVIEW_TTL=3600, DEEPSEEK_REVIEW_REGENERATE_AFTER=600)
+    def test_ttl_and_regenerate_policy(self):
+        review = AIReview.objects.create(product=self.product, prompt_hash='hash', model='deepseek-chat', text='Рецензия')
+
+        self.assertEqual(find_usable_review(self.product, 'hash', regenerate=True), (review, review))
+
+        AIReview.objects.filter(pk=review.pk).update(generated_at=timezone.now() - timedelta(minutes=20))
+        self.assertEqual(find_usable_review(self.product, 'hash', regenerate=True), (None, review))
+        self.assertEqual(find_usable_review(self.product, 'hash'), (review, review))
+
+        AIReview.objects.filter(pk=review.pk).update(generated_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(find_usable_review(self.product, 'hash'), (None, review))
+
+    def test_prompt_template_is_cached(self):
+        service = FakeDeepSeekService()
+        DeepSeekPrompt.objects.create(text='Шаблон {details}')
+        service.build_prompt(title='Книга', authors=None, year=None, genre=None)
+
+        with self.assertNumQueries(0):
+            prompt = service.build_prompt(title='Книга', authors=None, year=None, genre=None)
+        self.assertTrue(prompt.startswith('Шаблон'))
+
+        DeepSeekPrompt.objects.create(text='Новый {details}')
+        self.assertTrue(service.build_prompt(title='Книга', authors=None, year=None, genre=None).startswith('Новый'))
+
+    @override_settings(DEEPSEEK_API_KEY='key')
+    def test_view_returns_stored_review(self):
+        AIReview.objects.create(
+            product=self.product,
+            prompt_hash=FakeDeepSeekService().prompt_hash(
+                build_product_prompt(FakeDeepSeekService(), self.product)
+            ),
+            model='deepseek-chat',
+            text='Сохранённая рецензия',
+        )
+
+        response = self.client.post(reverse('main:product_deepseek_review', kwargs={'slug': self.product.slug}))
+
+        self.assertContains(response, 'Сохранённая рецензия')
+
+
+class AIReviewQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(
+            erp_product_id='ai-queue',
+            name='Отцы и дети',
+            slug='fathers-and-sons',
+            authors='Иван Тургенев',
+            price=100,
+        )
+        self.edition = Product.objects.create(
+            erp_product_id='ai-queue-2',
+            name='Отцы и дети',
+            slug='fathers-and-sons-2',
+            authors='Иван Тургенев',
+            price=150,
+        )
+
+    def test_one_active_job_per_prompt(self):
+        service = FakeDeepSeekService()
+
+        review, job = enqueue_ai_review(self.product, service)
+        _, same_job = enqueue_ai_review(self.edition, service)
+
+        self.assertIsNone(review)
+        self.assertEqual(job.pk, same_job.pk)
+        self.assertEqual(AIReviewJob.objects.count(), 1)
+        self.assertEqual(service.calls, 0)
+
+    def test_job_is_run_and_shared(self):
+        service = FakeDeepSeekService()
+        _, job = enqueue_ai_review(self.product, service)
+
+        claimed = claim_ai_review_job()
+        self.assertEqual(claimed.status, AIReviewJob.STATUS_RUNNING)
+        self.assertIsNone(claim_ai_review_job())
+        job = run_ai_review_job(claimed, service)
+
+        self.assertEqual(job.status, AIReviewJob.STATUS_DONE)
+        self.assertEqual(job.review.text, 'Рецензия 1')
+        review, new_job = enqueue_ai_review(self.edition, service)
+        self.assertIsNone(new_job)
+        self.assertEqual(review.product, self.edition)
+        self.assertEqual(service.calls, 1)
+
+    @override_settings(DEEPSEEK_JOB_MAX_ATTEMPTS=2)
+    def test_failed_job_is_retried_then_failed(self):
+        service = FakeDeepSeekService(fail=True)
+        enqueue_ai_review(self.product, service)
+
+        job = run_ai_review_job(claim_ai_review_job(), service)
+        self.assertEqual(job.status, AIReviewJob.STATUS_PENDING)
+        self.assertGreater(job.available_at, timezone.now())
+        self.assertIsNone(claim_ai_review_job())
+
+        AIReviewJob.objects.filter(pk=job.pk).update(available_at=timezone.now())
+        job = run_ai_review_job(claim_ai_review_job(), service)
+        self.assertEqual(job.status, AIReviewJob.STATUS_FAILED)
+        self.assertEqual(job.attempts, 2)
+
+        _, new_job = enqueue_ai_review(self.product, service)
+        self.assertNotEqual(new_job.pk, job.pk)
+
+    @override_settings(DEEPSEEK_API_KEY='key', DEEPSEEK_POLL_INTERVAL=3)
+    def test_view_polls_until_worker_finishes(self):
+        from unittest import mock
+
+        response = self.client.post(reverse('main:product_deepseek_review', kwargs={'slug': self.product.slug}))
+        job = AIReviewJob.objects.get()
+        status_url = reverse(
+            'main:product_deepseek_review_status',
+            kwargs={'slug': self.product.slug, 'job_id': job.pk},
+        )
+        self.assertContains(response, status_url)
+        self.assertNotContains(response, 'data-ai-review-stream')
+
+        response = self.client.get(status_url)
+        self.assertContains(response, 'DeepSeek готовит рецензию')
+        self.assertContains(response, 'load delay:3s')
+
+        service = FakeDeepSeekService()
+        with mock.patch('main.management.commands.process_ai_reviews.build_review_service', return_value=service):
+            call_command('process_ai_reviews', '--once', '--concurrency', '1', '--rate', '600', stdout=StringIO())
+
+        response = self.client.get(status_url)
+        self.assertContains(response, 'Рецензия 1')
+        self.assertNotContains(response, 'hx-trigger="load')
+        self.assertEqual(service.calls, 1)
+
+    @override_settings(DEEPSEEK_API_KEY='key')
+    def test_job_of_other_product_is_not_served(self):
+        from django.test import RequestFactory
+
+        from main.views import ProductAIReviewStatusView
+
+        other = Product.objects.create(erp_product_id='ai-queue-3', name='Обломов', slug='oblomov', price=100)
+        _, job = enqueue_ai_review(other, FakeDeepSeekService())
+        run_ai_review_job(claim_ai_review_job(), FakeDeepSeekService())
+        view = ProductAIReviewStatusView.as_view()
+
+        with self.assertRaises(Http404):
+            view(RequestFactory().get('/'), slug=self.product.slug, job_id=job.pk)
+        self.assertFalse(AIReview.objects.filter(product=self.product).exists())
+
+        response = view(RequestFactory().get('/'), slug=other.slug, job_id=job.pk)
+        self.assertEqual(response.status_code, 200)
+
+    def test_token_bucket_limits_rate(self):
+        now = [0.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        bucket = TokenBucket.per_minute(60, capacity=2, clock=lambda: now[0], sleep=sleep)
+        waits = [bucket.acquire() for _ in range(4)]
+
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 1.0)
+        self.assertAlmostEqual(waits[3], 1.0)
+        self.assertAlmostEqual(now[0], 2.0)
+
+
+class FakeChatCompletionsServer:
+    """
+    Локальная подмена DeepSeek chat completions: отвечает рецензией
+    с usage, первые запросы может завершать кодами из failures.
+    """
+
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.prompts = []
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with server.lock:
+                    status = server.failures.pop(0) if server.failures else 200
+                    if status == 200:
+                        server.prompts.append(payload['messages'][-1]['content'])
+                if status != 200:
+                    self.send_response(status)
+                    self.send_header('Retry-After', '0')
+                    self.end_headers()
+                    return
+                if payload.get('stream'):
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/event-stream')
+                    self.end_headers()
+                    self.wfile.write(b': keep-alive\n\n')
+                    for word in ('Живая ', 'потоковая ', 'рецензия'):
+                        chunk = {'choices': [{'delta': {'content': word}}]}
+                        self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+                        self.wfile.flush()
+                    self.wfile.write(b'data: [DONE]\n\n')
+                    return
+                body = json.dumps({
+                    'choices': [{'message': {'content': 'Рецензия: ' + payload['messages'][-1]['content'][-20:]}}],
+                    'usage': {'prompt_tokens': 100, 'completion_tokens': 300},
+                }).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.httpd.server_port}/chat/completions'
+
+
+class GenerateAIReviewsCommandTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Книги')
+        self.products = [
+            Product.objects.create(
+                erp_product_id=f'bulk-{index}',
+                name=f'Книга {index}',
+                slug=f'bulk-{index}',
+                category=self.category,
+                price=100,
+            )
+            for index in range(4)
+        ]
+        # Второе издание с тем же промптом: рецензия запрашивается один раз.
+        self.edition = Product.objects.create(
+            erp_product_id='bulk-edition',
+            name='Книга 0',
+            slug='bulk-edition',
+            category=self.category,
+            price=120,
+        )
+        Product.objects.create(erp_product_id='bulk-other', name='Журнал', slug='bulk-other', price=50)
+
+    def run_command(self, server, *args):
+        from unittest import mock
+
+        out = StringIO()
+        with override_settings(DEEPSEEK_API_KEY='key', DEEPSEEK_API_URL=server.url, DEEPSEEK_MODEL='deepseek-chat'), \
+                mock.patch('main.ai_review_bulk.BULK_RETRY_DELAY', 0.01):
+            call_command(
+                'generate_ai_reviews',
+                '--category', self.category.slug,
+                '--workers', '3',
+                '--rate', '6000',
+                *args,
+                stdout=out,
+            )
+        return out.getvalue()
+
+    def test_generates_missing_reviews_with_retries(self):
+        with FakeChatCompletionsServer(failures=[429, 503]) as server:
+            output = self.run_command(server)
+
+        self.assertEqual(len(server.prompts), 4)
+        self.assertEqual(AIReview.objects.count(), 5)
+        self.assertEqual(
+            AIReview.objects.get(product=self.edition).text,
+            AIReview.objects.get(product=self.products[0]).text,
+        )
+        self.assertIn('generated=4 copied=1', output)
+        self.assertIn('retries=2', output)
+        self.assertIn('tokens=400+1200', output)
+        self.assertIn('cost=$', output)
+        self.assertIsNotNone(AIReviewBulkRun.objects.get().finished_at)
+
+        with FakeChatCompletionsServer() as server:
+            output = self.run_command(server)
+        self.assertEqual(server.prompts, [])
+        self.assertIn('skipped=5', output)
+
+    def test_interrupted_run_resumes_from_checkpoint(self):
+        with FakeChatCompletionsServer() as server:
+            self.run_command(server, '--limit', '2', '--batch-size', '2')
+            run = AIReviewBulkRun.objects.get()
+            self.assertIsNone(run.finished_at)
+            self.assertEqual(run.last_product_id, self.products[1].pk)
+
+            output = self.run_command(server, '--batch-size', '2')
+
+        self.assertIn(f'Resuming after product {self.products[1].pk}', output)
+        self.assertEqual(len(server.prompts), 4)
+        self.assertEqual(len(set(server.prompts)), 4)
+        run.refresh_from_db()
+        self.assertIsNotNone(run.finished_at)
+        self.assertEqual(run.stats['generated'], 4)
+
+    def test_failed_product_is_retried_on_resume(self):
+        with FakeChatCompletionsServer(failures=[500]) as server:
+            output = self.run_command(server, '--workers', '1', '--max-retries', '0', '--limit', '2', '--batch-size', '2')
+            self.assertIn('failed=1', output)
+            run = AIReviewBulkRun.objects.get()
+            self.assertEqual(run.last_product_id, self.products[1].pk)
+            self.assertEqual(run.failed_product_ids, [self.products[0].pk])
+
+            output = self.run_command(server, '--workers', '1', '--max-retries', '0')
+
+        self.assertIn('Retrying failed products: 1', output)
+        self.assertEqual(AIReview.objects.count(), 5)
+        run.refresh_from_db()
+        self.assertEqual(run.failed_product_ids, [])
+        self.assertIsNotNone(run.finished_at)
+
+    def test_non_retryable_error_fails_product(self):
+        with FakeChatCompletionsServer(failures=[400]) as server:
+            output = self.run_command(server, '--workers', '1')
+
+        self.assertIn('failed=2', output)
+        self.assertEqual(AIReview.objects.count(), 3)
+
+    def test_estimate_cost(self):
+        self.assertAlmostEqual(estimate_cost(1_000_000, 500_000, 0.27, 1.10), 0.82)
+
+
+@override_settings(DEEPSEEK_MODEL='deepseek-chat', DEEPSEEK_API_KEY='key')
+class AIReviewStreamingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(
+            erp_product_id='ai-stream',
+            name='Мастер и Маргарита',
+            slug='master-i-margarita',
+            price=100,
+        )
+
+    def test_iter_sse_data(self):
+        lines = [b': ping\r\n', b'data: one\n', b'data: two\n', b'\n', b'event: x\n', b'data:three\n', b'\n']
+
+        self.assertEqual(list(iter_sse_data(lines)), ['one\ntwo', 'three'])
+
+    def test_service_streams_chunks(self):
+        with FakeChatCompletionsServer() as server:
+            service = DeepSeekReviewService(api_key='key', api_url=server.url, model='deepseek-chat')
+            chunks = list(service.stream('Промпт'))
+
+        self.assertEqual(chunks, ['Живая ', 'потоковая ', 'рецензия'])
+
+    @override_settings(DEEPSEEK_API_KEY='key', DEEPSEEK_STREAM_REVIEWS=True)
+    def test_view_offers_stream_only_when_enabled(self):
+        response = self.client.post(reverse('main:product_deepseek_review', kwargs={'slug': self.product.slug}))
+        job = AIReviewJob.objects.get()
+
+        self.assertContains(response, reverse(
+            'main:product_deepseek_review_stream',
+            kwargs={'slug': self.product.slug, 'job_id': job.pk},
+        ))
+        self.assertEqual(job.status, AIReviewJob.STATUS_PENDING)
+
+    def test_worker_streams_and_publishes_progress(self):
+        from unittest import mock
+
+        from main import ai_reviews
+
+        _, job = enqueue_ai_review(self.product, FakeDeepSeekService())
+        with FakeChatCompletionsServer() as server:
+            service = DeepSeekReviewService(api_key='key', api_url=server.url, model='deepseek-chat')
+            claimed = claim_ai_review_job()
+            AIReviewJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(minutes=5))
+            published = []
+            publish = ai_reviews.publish_ai_review_progress
+
+            def record(job, text):
+                publish(job, text)
+                published.append(AIReviewJob.objects.values_list('partial_text', 'started_at').get(pk=job.pk))
+
+            with mock.patch.object(ai_reviews, 'AI_REVIEW_PROGRESS_INTERVAL', 0), \
+                    mock.patch.object(ai_reviews, 'publish_ai_review_progress', record):
+                job = run_ai_review_job(claimed, service, stream=True)
+
+        self.assertEqual([text for text, _ in published], ['Живая ', 'Живая потоковая ', 'Живая потоковая рецензия'])
+        self.assertGreater(published[0][1], timezone.now() - timedelta(minutes=1))
+        self.assertEqual(job.status, AIReviewJob.STATUS_DONE)
+        self.assertEqual(job.review.text, 'Живая потоковая рецензия')
+        self.assertEqual(job.partial_text, '')
+
+    def start_job(self, partial_text):
+        _, job = enqueue_ai_review(self.product, FakeDeepSeekService())
+        claim_ai_review_job()
+        AIReviewJob.objects.filter(pk=job.pk).update(partial_text=partial_text)
+        return job, reverse(
+            'main:product_deepseek_review_stream',
+            kwargs={'slug': self.product.slug, 'job_id': job.pk},
+        )
+
+    @override_settings(DEEPSEEK_API_KEY='key')
+    async def test_stream_view_relays_worker_progress(self):
+        from unittest import mock
+
+        from asgiref.sync import sync_to_async
+
+        from main.views import ProductAIReviewStreamView
+
+        job, stream_url = await sync_to_async(self.start_job)('Живая ')
+        service = FakeDeepSeekService()
+
+        with mock.patch.object(ProductAIReviewStreamView, 'relay_timeout', 0):
+            response = await self.async_client.get(stream_url)
+            body = b''.join([chunk async for chunk in response.streaming_content]).decode('utf-8')
+        self.assertEqual(body, 'event: chunk\ndata: Живая \n\nevent: pending\ndata: \n\n')
+
+        await sync_to_async(run_ai_review_job)(await AIReviewJob.objects.aget(pk=job.pk), service)
+        response = await self.async_client.get(stream_url)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode('utf-8')
+        self.assertIn('event: done\n', body)
+        self.assertIn('Рецензия 1', body)
+        self.assertEqual(service.calls, 1)
+
+    @override_settings(DEEPSEEK_API_KEY='key')
+    def test_stream_view_does_not_wait_under_wsgi(self):
+        _, stream_url = self.start_job('Живая ')
+
+        body = b''.join(self.client.get(stream_url).streaming_content).decode('utf-8')
+
+        self.assertEqual(body, 'event: pending\ndata: \n\n')
+        self.assertContains(self.client.get(stream_url.replace('/stream/', '/')), 'Живая ')
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Книги')
+        self.crime = Product.objects.create(
+            erp_product_id='search-101',
+            name='Преступление и наказание',
+            slug='prestuplenie-i-nakazanie',
+            authors='Фёдор Достоевский',
+            category=self.category,
+            price=700,
+        )
+        self.idiot = Product.objects.create(
+            erp_product_id='search-102',
+            name='Идиот',
+            slug='idiot',
+            authors='Фёдор Достоевский',
+            publisher='Наказание букиниста',
+            category=self.category,
+            price=600,
+        )
+        Product.objects.create(
+            erp_product_id='search-103',
+            name='Война и мир',
+            slug='voyna-i-mir',
+            authors='Лев Толстой',
+            isbn='978-5-17-090335-2',
+            category=self.category,
+            price=900,
+        )
+
+    def search(self, query):
+        response = self.client.get(reverse('main:product_search'), {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [product.slug for product in response.context['products']]
+
+    def test_search_uses_russian_morphology_and_prefixes(self):
+        self.assertEqual(self.search('наказания'), ['prestuplenie-i-nakazanie', 'idiot'])
+        self.assertEqual(self.search('преступ'), ['prestuplenie-i-nakazanie'])
+        self.assertEqual(self.search('978-5-17-090335-2'), ['voyna-i-mir'])
+
+    def test_search_falls_back_to_trigram_similarity(self):
+        self.assertCountEqual(self.search('Дастоевский'), ['prestuplenie-i-nakazanie', 'idiot'])
+
+    def test_search_vector_follows_product_changes(self):
+        self.crime.name = 'Бесы'
+        self.crime.save()
+
+        self.assertEqual(self.search('бесы'), ['prestuplenie-i-nakazanie'])
+        self.assertEqual(self.search('преступ'), [])
+
+    def test_search_vector_is_kept_when_search_fields_are_unchanged(self):
+        product = Product.objects.get(pk=self.crime.pk)
+        product.price = 800
+        with CaptureQueriesContext(connection) as queries:
+            product.save()
+
+        self.assertFalse([query for query in queries if 'to_tsvector' in query['sql']])
+
+    def test_catalog_search_filters_products(self):
+        response = self.client.get(
+            reverse('main:catalog', kwargs={'category_slug': self.category.slug}),
+            {'q': 'толстой'},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        products = list(response.context['products'].object_list)
+        self.assertEqual([product.slug for product in products], ['voyna-i-mir'])
+
+    def test_rebuild_search_index_command(self):
+        Product.objects.update(search_vector=None)
+
+        call_command('rebuild_search_index', '--batch-size', '2', stdout=StringIO())
+
+        self.assertFalse(Product.objects.filter(search_vector__isnull=True).exists())
+        self.assertEqual(self.search('наказание'), ['prestuplenie-i-nakazanie', 'idiot'])
+
+
+class PurgeStaleVisitorsTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Книги')
+        self.product = Product.objects.create(
+            erp_product_id='stale-1',
+            name='Книга',
+            slug='stale-book',
+            category=category,
+            price=100,
+        )
+        now = timezone.now()
+        Session.objects.create(session_key='live', session_data='', expire_date=now + timedelta(days=1))
+        for index in range(3):
+            Session.objects.create(session_key=f'expired-{index}', session_data='', expire_date=now - timedelta(days=1))
+            cart = Cart.objects.create(session_key=f'expired-{index}')
+            cart.items.create(product=self.product, quantity=1)
+            FavoriteList.objects.create(session_key=f'expired-{index}').items.create(product=self.product)
+        Cart.objects.create(session_key='live')
+        Cart.objects.create(session_key='fresh-without-session')
+        user = get_user_model().objects.create(phone='+79990003344', first_name='Олег')
+        FavoriteList.objects.create(user=user)
+        old = now - timedelta(days=2)
+        Cart.objects.exclude(session_key='fresh-without-session').update(updated_at=old)
+        FavoriteList.objects.update(updated_at=old)
+
+    def test_dry_run_only_counts(self):
+        out = StringIO()
+        call_command('purge_stale_visitors', '--dry-run', '--chunk-size', '2', stdout=out)
+
+        self.assertIn('found (dry run): sessions=3 carts=0', out.getvalue())
+        self.assertEqual(Session.objects.count(), 4)
+
+    def test_purges_expired_sessions_and_orphans_in_chunks(self):
+        out = StringIO()
+        call_command('purge_stale_visitors', '--chunk-size', '2', stdout=out)
+
+        self.assertIn(
+            'purged: sessions=3 carts=3 cart_items=3 favorite_lists=3 favorite_items=3 rows=15',
+            out.getvalue(),
+        )
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
+        self.assertEqual(
+            set(Cart.objects.values_list('session_key', flat=True)),
+            {'live', 'fresh-without-session'},
+        )
+        self.assertEqual(list(FavoriteList.objects.values_list('session_key', flat=True)), [None])
@@ -7,8 +7,11 @@ from .views import (
     ProductSearchView,
     AuthorSuggestView,
     ProductReviewCreateView,
+    ProductReviewListView,
     ProductStockNotifyView,
     ProductAIReviewView,
+    ProductAIReviewStatusView,
+    ProductAIReviewStreamView,
 )
 
 app_name = 'main'
@@ -19,8 +22,19 @@ urlpatterns = [
 	path('catalog/', CatalogView.as_view(), name='catalog_all'),
 	path('catalog/<uslug:category_slug>/', CatalogView.as_view(), name='catalog'),
 	path('product/<uslug:slug>/', ProductDetailView.as_view(), name='product_detail'),
+	path('product/<uslug:slug>/reviews/', ProductReviewListView.as_view(), name='product_reviews'),
 	path('product/<uslug:slug>/reviews/new/', ProductReviewCreateView.as_view(), name='product_review_create'),
 	path('product/<uslug:slug>/reviews/deepseek/', ProductAIReviewView.as_view(), name='product_deepseek_review'),
+	path(
+		'product/<uslug:slug>/reviews/deepseek/jobs/<int:job_id>/',
+		ProductAIReviewStatusView.as_view(),
+		name='product_deepseek_review_status',
+	),
+	path(
+		'product/<uslug:slug>/reviews/deepseek/jobs/<int:job_id>/stream/',
+		ProductAIReviewStreamView.as_view(),
+		name='product_deepseek_review_stream',
+	),
 	path('product/<uslug:slug>/notify/', ProductStockNotifyView.as_view(), name='product_stock_notify'),
 	path('search/', ProductSearchView.as_view(), name='product_search'),
 	path('authors/suggest/', AuthorSuggestView.as_view(), name='author_suggest'),
@@ -0,0 +1,82 @@
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import F
+
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounterBuffer:
+    """
+    Копит просмотры товаров в памяти процесса и сбрасывает их в БД пачкой:
+    по одному UPDATE ... SET views_count = views_count + n на каждое n,
+    не чаще раза в PRODUCT_VIEWS_FLUSH_INTERVAL секунд (или раньше, если
+    набралось PRODUCT_VIEWS_MAX_PENDING товаров). Просмотры, не сброшенные
+    до остановки процесса, теряются — для популярности это допустимо.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+
+    def add(self, product_id: int) -> None:
+        interval = float(getattr(settings, 'PRODUCT_VIEWS_FLUSH_INTERVAL', 5))
+        max_pending = int(getattr(settings, 'PRODUCT_VIEWS_MAX_PENDING', 500))
+        with self.lock:
+            self.counts[product_id] += 1
+            due = (
+                time.monotonic() - self.last_flush >= interval
+                or len(self.counts) >= max_pending
+            )
+        if not due:
+            return
+        # Запрос выполняется в транзакции (ATOMIC_REQUESTS): пишем после
+        # коммита, чтобы не удерживать блокировки строк товаров до конца запроса.
+        transaction.on_commit(self.flush)
+
+    def flush(self) -> int:
+        """
+        Записывает накопленные просмотры. Возвращает число обновлённых товаров.
+        """
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+            self.last_flush = time.monotonic()
+        if not counts:
+            return 0
+        by_increment: Dict[int, list] = defaultdict(list)
+        for product_id, views in counts.items():
+            by_increment[views].append(product_id)
+        try:
+            with transaction.atomic():
+                for views, product_ids in by_increment.items():
+                    Product.objects.filter(pk__in=product_ids).update(views_count=F('views_count') + views)
+        except DatabaseError:
+            logger.exception('Failed to flush %d product views', sum(counts.values()))
+            with self.lock:
+                self.counts.update(counts)
+            return 0
+        return len(counts)
+
+    def pending(self) -> Dict[int, int]:
+        with self.lock:
+            return dict(self.counts)
+
+    def reset(self) -> None:
+        """
+        Отбрасывает накопленные просмотры, не записывая их.
+        """
+        with self.lock:
+            self.counts = Counter()
+            self.last_flush = time.monotonic()
+
+
+product_views = ViewCounterBuffer()
+
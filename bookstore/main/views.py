@@ -1,55 +1,117 @@
+import asyncio
+import logging
+import time
 from urllib.parse import urlencode
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.core.paginator import Paginator
-from django.db.models import Avg
 from django.shortcuts import get_object_or_404
 from django.views.generic import TemplateView, DetailView
 from django.views import View
-from django.http import HttpResponse, JsonResponse, HttpResponseRedirect
+from django.http import Http404, HttpResponse, JsonResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.template.response import TemplateResponse
 from django.urls import reverse
+
+from cart.services import get_existing_cart
 from .deepseek import (
-    DeepSeekAPIError,
     DeepSeekConfigurationError,
-    DeepSeekReviewService,
+    build_review_service,
 )
-from cart.models import Cart
-
-from .models import Genre, Product, Banner
+from .models import AIReviewJob, Category, Genre, Product, Banner
 from .forms import ProductReviewForm, BookPurchaseRequestForm
+from .category_tree import get_category_tree, get_tree_category
 from .selectors import (
-    get_categories_with_products,
     get_actual_products,
+    get_product_detail,
     get_published_products_queryset,
     get_related_products,
 )
+from .ai_reviews import (
+    enqueue_ai_review,
+    find_product_job,
+    get_job_review,
+)
+from .authors import suggest_authors
+from .catalog_bounds import can_use_catalog_bounds, get_catalog_bounds
+from .catalog_cache import (
+    build_catalog_fragment_key,
+    get_catalog_fragment,
+    is_fragment_cacheable,
+    set_catalog_fragment,
+)
+from .facets import build_catalog_facets
+from .pagination import (
+    CATALOG_NUMBERED_PAGES,
+    CATALOG_PAGE_SIZE,
+    PRODUCT_REVIEWS_PAGE_SIZE,
+    InvalidCursor,
+    encode_cursor,
+    paginate_keyset,
+)
+from .query_count import count_queries
+from .review_stats import REVIEW_STATS_FIELDS
+from .view_counter import product_views
+from .search import is_ranked, search_products
 from .services import (
     build_genre_filters,
+    build_load_more_url,
     build_pagination,
     apply_catalog_filters,
     apply_catalog_sorting,
     build_sorting_options,
     extract_hx_flags,
-    extract_selected_authors,
-    extract_selected_vinyl_directtions,
+    parse_catalog_filter_state,
+    resolve_catalog_sort,
     CATALOG_SORT_OPTIONS,
 )
 
+logger = logging.getLogger(__name__)
+
+
+def sse_event(event, data=''):
+    lines = str(data).split('\n')
+    return f'event: {event}\n' + ''.join(f'data: {line}\n' for line in lines) + '\n'
+
 
 def build_product_reviews_context(product):
-    reviews_qs = product.reviews.filter(is_public=True)
-    total = reviews_qs.count()
-    average = reviews_qs.aggregate(avg=Avg('rating'))['avg'] or 0
+    # Количество, средняя оценка и гистограмма берутся из сохранённых на
+    # товаре полей, запросом читается только первая страница отзывов.
+    total = product.reviews_total
+    average = product.reviews_average or 0
     average_display = f'{average:.1f}' if average else '0'
-    return {
+    context = {
         'product': product,
-        'reviews': reviews_qs,
         'reviews_total': total,
         'reviews_average': average,
         'reviews_average_display': average_display,
+        'reviews_histogram': product.reviews_histogram,
+    }
+    context.update(build_product_reviews_page(product))
+    return context
+
+
+def build_product_reviews_page(product, cursor=None):
+    page = paginate_keyset(
+        product.reviews.filter(is_public=True),
+        'reviews',
+        '-created_at',
+        cursor,
+        page_size=PRODUCT_REVIEWS_PAGE_SIZE,
+    )
+    load_more_url = None
+    if page.has_next:
+        load_more_url = '{}?{}'.format(
+            reverse('main:product_reviews', kwargs={'slug': product.slug}),
+            urlencode({'cursor': page.next_cursor}),
+        )
+    return {
+        'reviews': page.object_list,
+        'reviews_load_more_url': load_more_url,
     }
 
 
@@ -62,7 +124,7 @@ class IndexView(TemplateView):
         purchase_form = kwargs.pop('purchase_form', None)
         purchase_form_success = kwargs.pop('purchase_form_success', None)
         context = super().get_context_data(**kwargs)
-        context['categories'] = get_categories_with_products()
+        context['categories'] = get_category_tree()
         context['current_category'] = None
         context['is_catalog_page'] = False
         context['new_products'] = get_actual_products(20)
@@ -167,80 +229,80 @@ class CatalogView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         category_slug = kwargs.get('category_slug')
-        categories = get_categories_with_products()
+        categories = get_category_tree()
         products = get_published_products_queryset()
-        base_products = products
         current_category = None
         if category_slug:
-            current_category = get_object_or_404(categories, slug=category_slug)
+            current_category = get_tree_category(category_slug)
+            if current_category is None:
+                raise Http404('Категория не найдена.')
             products = products.filter(category=current_category)
-            base_products = base_products.filter(category=current_category)
         show_categories_cards = current_category is None
-        products, filter_params, search_query, price_bounds, year_bounds = apply_catalog_filters(
+        is_vinyl_category = bool(
+            current_category
+            and (
+                (current_category.slug or '').casefold() == 'vinyl'
+                or (current_category.name or '').casefold() in {'vinyl', 'винил'}
+            )
+        )
+        filter_state = parse_catalog_filter_state(self.request.GET)
+        if filter_state.query:
+            products = search_products(products, filter_state.query)
+        stored_bounds = None
+        if can_use_catalog_bounds(filter_state):
+            stored_bounds = get_catalog_bounds(current_category)
+        facets = build_catalog_facets(
             products,
-            self.request.GET,
+            filter_state,
+            include_directions=is_vinyl_category,
+            stored_bounds=stored_bounds,
         )
+        products = products.filter(filter_state.condition())
+        filter_params = filter_state.as_filter_params()
+        search_query = filter_state.query
+        price_bounds = facets['price_bounds']
+        year_bounds = facets['year_bounds']
         products, current_sort = apply_catalog_sorting(
             products,
             self.request.GET.get('sort', 'popular'),
         )
+        products = products.cards()
         sort_options = build_sorting_options(self.request, current_sort)
 
-        genres_queryset = Genre.objects.filter(category=current_category) if current_category else Genre.objects.all()
-        genres = list(genres_queryset.select_related('category'))
+        if current_category:
+            genres = current_category.genre_list
+        else:
+            genres = list(Genre.objects.select_related('category'))
         show_all_genres_cards = True
         if current_category:
             all_genres = genres
             all_genres_title = 'Жанры категории'
             show_all_genres_cards = True
         else:
-            all_genres = list(Genre.objects.select_related('category').all()[:10])
+            all_genres = genres[:10]
             all_genres_title = 'Все жанры'
-        params_without_author = self.request.GET.copy()
-        params_without_author.setlist('author', [])
-        params_without_author['author'] = ''
-        authors_filtered, _, _, _, _ = apply_catalog_filters(
-            base_products,
-            params_without_author,
-        )
-        authors_list = list(
-            authors_filtered.exclude(authors='')
-            .values_list('authors', flat=True)
-            .distinct()
-            .order_by('authors')
+        authors_list = [name for name, _ in facets['authors']]
+        selected_authors = filter_state.authors
+        vinyl_directtions = [name for name, _ in facets['directions']]
+        selected_vinyl_directtions = filter_state.directions
+        # Нумерованные страницы только для первых CATALOG_NUMBERED_PAGES:
+        # COUNT и OFFSET ограничены срезом, дальше — подгрузка по курсору.
+        paginator = Paginator(
+            products[:CATALOG_NUMBERED_PAGES * CATALOG_PAGE_SIZE],
+            CATALOG_PAGE_SIZE,
         )
-        selected_authors = extract_selected_authors(self.request.GET)
-        is_vinyl_category = bool(
-            current_category
-            and (
-                (current_category.slug or '').casefold() == 'vinyl'
-                or (current_category.name or '').casefold() in {'vinyl', 'винил'}
-            )
-        )
-        params_without_directtion = self.request.GET.copy()
-        params_without_directtion.setlist('directtion', [])
-        params_without_directtion['directtion'] = ''
-        params_without_directtion.setlist('direction', [])
-        params_without_directtion['direction'] = ''
-        vinyl_directtions = []
-        if is_vinyl_category:
-            vinyl_directtions_filtered, _, _, _, _ = apply_catalog_filters(
-                base_products,
-                params_without_directtion,
-            )
-            vinyl_directtions = list(
-                vinyl_directtions_filtered
-                .exclude(attributes__vinyl_directtion__isnull=True)
-                .exclude(attributes__vinyl_directtion='')
-                .values_list('attributes__vinyl_directtion', flat=True)
-                .distinct()
-                .order_by('attributes__vinyl_directtion')
-            )
-        selected_vinyl_directtions = extract_selected_vinyl_directtions(self.request.GET)
-        paginator = Paginator(products, 15)
         page_obj = paginator.get_page(self.request.GET.get('page'))
         pagination = build_pagination(self.request, page_obj)
+        load_more_url = None
+        if not is_ranked(products) and len(page_obj) == CATALOG_PAGE_SIZE:
+            _, order_by = resolve_catalog_sort(current_sort)
+            load_more_url = build_load_more_url(
+                self.request,
+                encode_cursor(current_sort, order_by, page_obj[len(page_obj) - 1]),
+            )
         genre_filters, genre_reset_url = build_genre_filters(self.request, genres)
+        for genre_filter in genre_filters:
+            genre_filter['count'] = facets['genres'].get(genre_filter['slug'], 0)
         active_genres = [
             slug for slug in filter_params.get('genre', '').split(',') if slug
         ]
@@ -268,14 +330,17 @@ class CatalogView(TemplateView):
             'show_all_genres_cards': show_all_genres_cards,
             'search_query': search_query,
             'authors': authors_list,
+            'author_counts': dict(facets['authors']),
             'selected_authors': selected_authors,
             'show_vinyl_directtion_filter': bool(is_vinyl_category and vinyl_directtions),
             'vinyl_directtions': vinyl_directtions,
+            'vinyl_directtion_counts': dict(facets['directions']),
             'selected_vinyl_directtions': selected_vinyl_directtions,
             'is_catalog_page': True,
             'is_paginated': paginator.num_pages > 1,
             'page_obj': page_obj,
             'pagination': pagination,
+            'load_more_url': load_more_url,
             'sort_options': sort_options,
             'current_sort': current_sort,
             'current_sort_label': CATALOG_SORT_OPTIONS[current_sort]['label'],
@@ -283,7 +348,45 @@ class CatalogView(TemplateView):
         context.update(extract_hx_flags(self.request.GET))
         return context
     
+    def get_load_more_context(self, cursor, category_slug=None):
+        """
+        Следующая порция товаров после курсора: без фасетов, COUNT и OFFSET.
+        """
+        products = get_published_products_queryset()
+        if category_slug:
+            products = products.filter(category=get_object_or_404(Category, slug=category_slug))
+        filter_state = parse_catalog_filter_state(self.request.GET)
+        if filter_state.query:
+            products = search_products(products, filter_state.query)
+        products = products.filter(filter_state.condition())
+        sort_key, order_by = resolve_catalog_sort(self.request.GET.get('sort', 'popular'))
+        try:
+            page = paginate_keyset(products.cards(), sort_key, order_by, cursor)
+        except InvalidCursor as exc:
+            raise Http404(str(exc)) from exc
+        return {
+            'products': page.object_list,
+            'load_more_url': (
+                build_load_more_url(self.request, page.next_cursor) if page.has_next else None
+            ),
+            'infinite_scroll': True,
+        }
+
     def get(self, request, *args, **kwargs):
+        cursor = request.GET.get('cursor')
+        if cursor:
+            context = self.get_load_more_context(cursor, kwargs.get('category_slug'))
+            return TemplateResponse(request, 'main/partials/_catalog_more.html', context)
+        fragment_key = None
+        if (
+            request.headers.get('HX-Request')
+            and not extract_hx_flags(request.GET)
+            and is_fragment_cacheable(request)
+        ):
+            fragment_key = build_catalog_fragment_key(kwargs.get('category_slug'), request.GET)
+            content = get_catalog_fragment(fragment_key)
+            if content is not None:
+                return HttpResponse(content)
         context = self.get_context_data(**kwargs)
         if request.headers.get('HX-Request'):
             if context.get('show_search'):
@@ -294,7 +397,12 @@ class CatalogView(TemplateView):
                 return TemplateResponse(request, 'main/filter_modal.html', context)
             if context.get('reset_filter'):
                 return HttpResponse('')
-            return TemplateResponse(request, 'main/catalog.html', context)
+            response = TemplateResponse(request, 'main/catalog.html', context)
+            if fragment_key:
+                response.add_post_render_callback(
+                    lambda rendered: set_catalog_fragment(fragment_key, rendered.content)
+                )
+            return response
         return TemplateResponse(request, self.template_name, context)
 
 
@@ -305,12 +413,18 @@ class ProductDetailView(DetailView):
     slug_url_kwarg = 'slug'
     
     
+    def get_object(self, queryset=None):
+        return get_product_detail(
+            self.kwargs[self.slug_url_kwarg],
+            cart=get_existing_cart(self.request),
+        )
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        product = self.get_object()
+        product = self.object
         reviews_context = build_product_reviews_context(product)
-        context['categories'] = get_categories_with_products()
-        context['related_products'] = get_related_products(product, limit=8)
+        context['categories'] = get_category_tree()
+        context['related_products'] = list(get_related_products(product, limit=8))
         context['gallery_images'] = product.gallery_images
         context['seo_text'] = getattr(product, 'seo_text', None) or product.meta_description or product.description
         rating_value = getattr(product, 'rating', None)
@@ -364,26 +478,64 @@ class ProductDetailView(DetailView):
             context['current_category_label'] = None
         context['is_catalog_page'] = False
         context['can_request_ai_review'] = bool(getattr(settings, 'DEEPSEEK_API_KEY', ''))
-        cart = None
-        if not self.request.session.session_key:
-            self.request.session.create()
-        cart, _ = Cart.objects.get_or_create(session_key=self.request.session.session_key)
-        cart_item = cart.items.filter(product=product).first()
+        cart_item = None
+        if getattr(product, 'cart_item_id', None):
+            cart_item = {'id': product.cart_item_id, 'quantity': product.cart_item_quantity}
         context['product_cart_item'] = cart_item
-        context['product_cart_quantity'] = cart_item.quantity if cart_item else 0
+        context['product_cart_quantity'] = cart_item['quantity'] if cart_item else 0
         context.update(reviews_context)
         return context
     
     def get(self, request, *args, **kwargs):
-        self.object = self.get_object()
-        context = self.get_context_data(**kwargs)
+        with count_queries() as queries:
+            self.object = self.get_object()
+            context = self.get_context_data(**kwargs)
+        logger.debug('Product page %s: %d queries', self.object.slug, queries.count)
+        product_views.add(self.object.pk)
         if request.headers.get('HX-Request'):
-            return TemplateResponse(request, 'main/product_detail.html', context)
-        return TemplateResponse(request, self.template_name, context)
+            response = TemplateResponse(request, 'main/product_detail.html', context)
+        else:
+            response = TemplateResponse(request, self.template_name, context)
+        if settings.DEBUG:
+            response['X-Query-Count'] = str(queries.count)
+        return response
 
 
 class ProductSearchView(TemplateView):
     template_name = 'main/search_results.html'
+    max_results = 12
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        products_queryset = get_published_products_queryset()
+        filtered_products, _, search_query, _, _ = apply_catalog_filters(
+            products_queryset,
+            self.request.GET,
+        )
+        if search_query:
+            filtered_products, _ = apply_catalog_sorting(filtered_products, 'popular')
+        else:
+            filtered_products = products_queryset.none()
+        context.update({
+            'products': filtered_products.cards()[:self.max_results],
+            'search_query': search_query,
+        })
+        return context
+
+
+class ProductReviewListView(View):
+    """
+    Следующая страница отзывов товара после курсора (кнопка «Показать ещё»).
+    """
+
+    def get(self, request, *args, **kwargs):
+        product = get_object_or_404(Product.objects.only('id', 'slug'), slug=kwargs['slug'])
+        try:
+            context = build_product_reviews_page(product, request.GET.get('cursor'))
+        except InvalidCursor as exc:
+            raise Http404(str(exc)) from exc
+        context['product'] = product
+        return TemplateResponse(request, 'main/partials/_product_reviews_more.html', context)
 
 
 class ProductReviewCreateView(View):
@@ -407,7 +559,9 @@ class ProductReviewCreateView(View):
         if form.is_valid():
             review = form.save(commit=False)
             review.product = self.product
+            # Счётчики на товаре сдвигает сигнал post_save (add_review_to_stats).
             review.save()
+            self.product.refresh_from_db(fields=REVIEW_STATS_FIELDS)
             context = build_product_reviews_context(self.product)
             response = TemplateResponse(request, 'main/partials/_product_reviews.html', context)
             response['HX-Trigger'] = 'close-review-modal'
@@ -451,38 +605,150 @@ class ProductStockNotifyView(View):
 
 
 class ProductAIReviewView(View):
+    """
+    Ставит генерацию рецензии в очередь и сразу отвечает: готовой рецензией,
+    если она сохранена, или заглушкой, которая опрашивает статус задания.
+    Сам DeepSeek вызывает воркер process_ai_reviews.
+    """
     template_name = 'main/partials/_product_ai_review.html'
+    pending_template_name = 'main/partials/_product_ai_review_pending.html'
 
     def dispatch(self, request, *args, **kwargs):
-        self.product = get_object_or_404(Product, slug=kwargs['slug'])
+        self.product = get_object_or_404(Product.objects.select_related('genre'), slug=kwargs['slug'])
         return super().dispatch(request, *args, **kwargs)
 
     def post(self, request, *args, **kwargs):
-        context = {
+        try:
+            review, job = enqueue_ai_review(
+                self.product,
+                build_review_service(),
+                regenerate=request.POST.get('regenerate') == '1',
+            )
+        except DeepSeekConfigurationError:
+            return self.render_error('Интеграция DeepSeek не настроена.')
+        if review is not None:
+            return self.render_review(review)
+        return self.render_pending(job, stream=getattr(settings, 'DEEPSEEK_STREAM_REVIEWS', False))
+
+    def review_context(self, review):
+        return {
+            'product': self.product,
+            'initial': False,
+            'review': review,
+            'review_text': review.text,
+        }
+
+    def error_context(self, error):
+        return {
             'product': self.product,
             'initial': False,
+            'error': error,
         }
+
+    def render_review(self, review):
+        return TemplateResponse(self.request, self.template_name, self.review_context(review))
+
+    def render_error(self, error):
+        return TemplateResponse(self.request, self.template_name, self.error_context(error))
+
+    def get_job(self):
         try:
-            service = self._build_service()
-            context['review_text'] = service.generate_review(
-                title=self.product.name,
-                authors=self.product.authors,
-                year=self.product.year,
-                genre=self.product.genre.name if self.product.genre else None,
-            )
+            service = build_review_service()
         except DeepSeekConfigurationError:
-            context['error'] = 'Интеграция DeepSeek не настроена.'
-        except DeepSeekAPIError as exc:
-            context['error'] = str(exc) or 'Не удалось получить рецензию. Попробуйте позже.'
-        return TemplateResponse(request, self.template_name, context)
+            raise Http404('DeepSeek is not configured')
+        job = find_product_job(self.product, self.kwargs['job_id'], service)
+        if job is None:
+            raise Http404('No such job for this product')
+        return job
+
+    def render_pending(self, job, stream=False):
+        return TemplateResponse(self.request, self.pending_template_name, {
+            'product': self.product,
+            'job': job,
+            'stream': stream,
+            'poll_interval': getattr(settings, 'DEEPSEEK_POLL_INTERVAL', 2),
+        })
+
+
+class ProductAIReviewStatusView(ProductAIReviewView):
+    """
+    Статус задания для опроса из заглушки: рецензия, ошибка или та же
+    заглушка, пока воркер не закончил.
+    """
+    http_method_names = ['get']
+
+    def get(self, request, *args, **kwargs):
+        job = self.get_job()
+        if job.status == AIReviewJob.STATUS_DONE:
+            review = get_job_review(job, self.product)
+            if review is not None:
+                return self.render_review(review)
+            return self.render_error('Не удалось получить рецензию. Попробуйте позже.')
+        if job.status == AIReviewJob.STATUS_FAILED:
+            return self.render_error(job.error or 'Не удалось получить рецензию. Попробуйте позже.')
+        return self.render_pending(job)
+
+
+class ProductAIReviewStreamView(ProductAIReviewView):
+    """
+    Пересылает браузеру текст, который воркер публикует в задании, как
+    server-sent events: chunk — новый фрагмент, done — готовый фрагмент
+    рецензии, failure — фрагмент с ошибкой. DeepSeek здесь не вызывается.
+    Если за relay_timeout секунд задание не закончилось, отвечает pending,
+    и страница переходит на опрос статуса.
+
+    Ожидание асинхронное и не занимает поток только под ASGI. Под WSGI
+    (синхронные воркеры gunicorn) представление сразу отвечает pending.
+    """
+    http_method_names = ['get']
+    relay_interval = 0.5
+    relay_timeout = 60
+
+    def get(self, request, *args, **kwargs):
+        job = self.get_job()
+        if isinstance(request, ASGIRequest):
+            events = self.events(job)
+        elif job.status in (AIReviewJob.STATUS_DONE, AIReviewJob.STATUS_FAILED):
+            events = [self.final_event(job)]
+        else:
+            events = [sse_event('pending')]
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Не даём nginx копить ответ в буфере.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def events(self, job):
+        deadline = time.monotonic() + self.relay_timeout
+        shown = ''
+        while True:
+            if job.status in (AIReviewJob.STATUS_DONE, AIReviewJob.STATUS_FAILED):
+                yield await sync_to_async(self.final_event)(job)
+                return
+            if not job.partial_text.startswith(shown):
+                # Задание повторяется и текст начался заново: показанное
+                # уже не стереть, пусть страница перейдёт на опрос статуса.
+                yield sse_event('pending')
+                return
+            if len(job.partial_text) > len(shown):
+                yield sse_event('chunk', job.partial_text[len(shown):])
+                shown = job.partial_text
+            if time.monotonic() >= deadline:
+                yield sse_event('pending')
+                return
+            await asyncio.sleep(self.relay_interval)
+            await sync_to_async(job.refresh_from_db)()
+
+    def final_event(self, job):
+        review = get_job_review(job, self.product)
+        if review is not None:
+            return sse_event('done', self.render_fragment(self.review_context(review)))
+        error = job.error or 'Не удалось получить рецензию. Попробуйте позже.'
+        return sse_event('failure', self.render_fragment(self.error_context(error)))
+
+    def render_fragment(self, context):
+        return render_to_string(self.template_name, context, request=self.request)
 
-    def _build_service(self) -> DeepSeekReviewService:
-        return DeepSeekReviewService(
-            api_key=getattr(settings, 'DEEPSEEK_API_KEY', ''),
-            api_url=getattr(settings, 'DEEPSEEK_API_URL', 'https://api.deepseek.com/chat/completions'),
-            model=getattr(settings, 'DEEPSEEK_MODEL', 'deepseek-chat'),
-            timeout=getattr(settings, 'DEEPSEEK_TIMEOUT', 30),
-        )
 
 class AuthorSuggestView(View):
     """
@@ -492,45 +758,5 @@ class AuthorSuggestView(View):
 
     def get(self, request, *args, **kwargs):
         query = (request.GET.get('q') or '').strip()
-        products = get_published_products_queryset().exclude(authors='')
-        if query:
-            products = products.filter(authors__icontains=query)
-        raw_authors = products.values_list('authors', flat=True).distinct()
-        suggestions = []
-        normalized_query = query.lower()
-        separators = [',', ';', '/']
-        for entry in raw_authors:
-            if not entry:
-                continue
-            normalized_entry = entry
-            for separator in separators[1:]:
-                normalized_entry = normalized_entry.replace(separator, separators[0])
-            parts = [part.strip() for part in normalized_entry.split(separators[0])]
-            for part in parts:
-                if not part:
-                    continue
-                if query and normalized_query not in part.lower():
-                    continue
-                if part not in suggestions:
-                    suggestions.append(part)
-                if len(suggestions) >= self.max_results:
-                    break
-            if len(suggestions) >= self.max_results:
-                break
+        suggestions = suggest_authors(query, self.max_results)
         return JsonResponse({'results': suggestions})
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        query = self.request.GET.get('q', '').strip()
-        products_queryset = get_published_products_queryset()
-        filtered_products, _, search_query, _, _ = apply_catalog_filters(
-            products_queryset,
-            self.request.GET,
-        )
-        if not search_query:
-            filtered_products = products_queryset.none()
-        limited_products = filtered_products[:12]
-        context.update({
-            'products': limited_products,
-            'search_query': search_query,
-        })
-        return context
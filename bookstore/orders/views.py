@@ -14,6 +14,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.views.generic import View
 
+from cart.services import invalidate_cart_summary
 from cart.views import CartMixin
 from integrations.erp import push_order_to_erp
 from integrations.youkassa import (
@@ -110,6 +111,7 @@ class CheckoutView(CartMixin, View):
                     )
 
                 cart.clear_cart_items()
+                invalidate_cart_summary(request, cart)
 
             # Create YooKassa payment after the DB transaction is committed
             if payment_provider == 'youkassa':
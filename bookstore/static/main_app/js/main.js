@@ -866,3 +866,66 @@ document.body.addEventListener('htmx:afterSwap', function (event) {
 		}
 	}
 });
+
+function replaceWithFragment(element, html) {
+	const parent = element.parentElement;
+	element.outerHTML = html;
+	if (parent) {
+		htmx.process(parent);
+	}
+}
+
+function pollAIReviewStatus(container) {
+	const statusUrl = container.dataset.aiReviewStatus;
+	if (statusUrl) {
+		htmx.ajax('GET', statusUrl, { target: container, swap: 'outerHTML' });
+	}
+}
+
+function startAIReviewStream(container) {
+	const streamUrl = container.dataset.aiReviewStream;
+	if (!streamUrl || container.dataset.aiReviewStarted) {
+		return;
+	}
+	container.dataset.aiReviewStarted = '1';
+	if (!window.EventSource) {
+		pollAIReviewStatus(container);
+		return;
+	}
+	const textNode = container.querySelector('[data-ai-review-text]');
+	const source = new EventSource(streamUrl);
+	let finished = false;
+	const finish = function (callback) {
+		finished = true;
+		source.close();
+		callback();
+	};
+	source.addEventListener('chunk', function (event) {
+		if (textNode) {
+			textNode.classList.remove('hidden');
+			textNode.textContent += event.data;
+		}
+	});
+	source.addEventListener('done', function (event) {
+		finish(() => replaceWithFragment(container, event.data));
+	});
+	source.addEventListener('failure', function (event) {
+		finish(() => replaceWithFragment(container, event.data));
+	});
+	source.addEventListener('pending', function () {
+		finish(() => pollAIReviewStatus(container));
+	});
+	source.onerror = function () {
+		// Соединение оборвалось: задание доделает воркер, переходим на опрос.
+		if (!finished) {
+			finish(() => pollAIReviewStatus(container));
+		}
+	};
+}
+
+htmx.onLoad(function (element) {
+	const containers = element.matches && element.matches('[data-ai-review-stream]')
+		? [element]
+		: element.querySelectorAll ? element.querySelectorAll('[data-ai-review-stream]') : [];
+	containers.forEach(startAIReviewStream);
+});